@@ -16,7 +16,7 @@ def get_url():
 
 
 from app.core.db import Base
-from app.models import user, adventure, stats  # ensure models are imported
+from app.models import user, adventure, stats, events  # ensure models are imported
 
 target_metadata = Base.metadata
 
@@ -0,0 +1,75 @@
+"""add submission_events (append-only, partitioned by month)
+
+Revision ID: b3e1c9d4f2a6
+Revises: a5b8d2e7c9f0
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision id for this new script
+revision: str = 'b3e1c9d4f2a6'
+
+# id of the migration this script is "on top of"
+down_revision: str | None = 'a5b8d2e7c9f0'
+
+branch_labels: str | None = None
+depends_on: str | None = None
+
+
+def upgrade() -> None:
+    # --- commands manually created ---
+    op.create_table(
+        'submission_events',
+        sa.Column('id', sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('adventure_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('adventures.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('kc_id', sa.Integer(), nullable=False),
+        sa.Column('is_correct', sa.Boolean(), nullable=False),
+        sa.Column('is_practice', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('p_know', sa.SmallInteger(), nullable=True),
+        sa.Column('source', sa.String(length=16), nullable=True),
+        sa.Column('backend', sa.String(length=32), nullable=True),
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        postgresql_partition_by='RANGE (created_at)',
+    )
+    op.create_index(
+        'ix_submission_events_user_kc_time',
+        'submission_events',
+        ['user_id', 'kc_id', 'created_at'],
+    )
+    # anything outside the monthly partitions lands here; the app creates
+    # upcoming months at startup (app.services.event_log.ensure_partitions)
+    op.execute(
+        "CREATE TABLE IF NOT EXISTS submission_events_default "
+        "PARTITION OF submission_events DEFAULT"
+    )
+    op.execute(
+        """
+        DO $$
+        DECLARE m date := date_trunc('month', now())::date;
+        BEGIN
+            FOR i IN 0..2 LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF submission_events FOR VALUES FROM (%L) TO (%L)',
+                    'submission_events_' || to_char(m + make_interval(months => i), 'YYYYMM'),
+                    m + make_interval(months => i),
+                    m + make_interval(months => i + 1)
+                );
+            END LOOP;
+        END $$;
+        """
+    )
+    # --- end commands ---
+
+
+def downgrade() -> None:
+    # --- commands manually created ---
+    # dropping the parent drops every partition
+    op.drop_index('ix_submission_events_user_kc_time', table_name='submission_events')
+    op.drop_table('submission_events')
+    # --- end commands ---
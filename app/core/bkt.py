@@ -0,0 +1,184 @@
+# app/core/bkt.py
+"""
+Exact BKT transition tables.
+
+p_know is stored as an integer 0..100, so one BKT step (the adaptive update
+in services.bkt_service) is just a map from 101 states x {incorrect, correct}
+to a new state. We build that map once per parameter set and every update,
+in Python, in SQL or on the client, becomes a table lookup that matches the
+float implementation exactly (same rounding, same clamping).
+"""
+from __future__ import annotations
+import json
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import Integer, cast, func, literal_column
+from sqlalchemy.dialects.postgresql import array
+
+from app.core.config import settings
+from app.services.bkt_service import update_pknow
+
+logger = logging.getLogger("bkt")
+
+STATES = 101  # p_know 0..100
+
+Table = Tuple[Tuple[int, ...], Tuple[int, ...]]  # [incorrect][state], [correct][state]
+
+
+@dataclass(frozen=True)
+class BKTParams:
+    slip: float = 0.1
+    guess: float = 0.2
+    transit: float = 0.15
+
+
+def default_params() -> BKTParams:
+    return BKTParams(settings.BKT_SLIP, settings.BKT_GUESS, settings.BKT_TRANSIT)
+
+
+# ---------------- fitted parameters ----------------
+# Written by app.tools.fit_bkt; loaded once per process.
+_fitted: Optional[Dict[int, BKTParams]] = None
+_fitted_version: Optional[str] = None
+
+
+def load_fitted_params(path: str | None = None) -> None:
+    """(Re)load the fitted table. A missing or broken file means defaults."""
+    global _fitted, _fitted_version
+    path = path or settings.BKT_PARAMS_PATH
+    _fitted, _fitted_version = {}, None
+    if not path:
+        return
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        _fitted = {
+            int(kc): BKTParams(float(p["slip"]), float(p["guess"]), float(p["transit"]))
+            for kc, p in raw.get("kcs", {}).items()
+        }
+        _fitted_version = raw.get("version")
+    except Exception as exc:
+        logger.warning("Could not load BKT params from %s: %s", path, exc)
+        _fitted, _fitted_version = {}, None
+        return
+    logger.info("Loaded BKT params %s for %d KCs", _fitted_version, len(_fitted))
+
+
+def params_version() -> Optional[str]:
+    if _fitted is None:
+        load_fitted_params()
+    return _fitted_version
+
+
+def params_for_kc(kc_id: int | None) -> BKTParams:
+    """
+    BKT_KC_PARAMS override, else the fitted table (BKT_PARAMS_PATH), else
+    the defaults.
+    """
+    if _fitted is None:
+        load_fitted_params()
+    base = default_params()
+    if kc_id is not None and kc_id in _fitted:  # type: ignore[operator]
+        base = _fitted[kc_id]  # type: ignore[index]
+    over = settings.BKT_KC_PARAMS.get(kc_id) if kc_id is not None else None
+    if not over:
+        return base
+    return BKTParams(
+        slip=float(over.get("slip", base.slip)),
+        guess=float(over.get("guess", base.guess)),
+        transit=float(over.get("transit", base.transit)),
+    )
+
+
+@lru_cache(maxsize=256)
+def table(params: BKTParams) -> Table:
+    def row(is_correct: bool) -> Tuple[int, ...]:
+        return tuple(
+            int(round(update_pknow(s / 100.0, is_correct, params.slip, params.guess, params.transit) * 100))
+            for s in range(STATES)
+        )
+    return row(False), row(True)
+
+
+def _clamp(state) -> int:
+    return max(0, min(100, int(round(state))))
+
+
+def step(state, is_correct: bool, params: BKTParams | None = None) -> int:
+    return table(params or default_params())[bool(is_correct)][_clamp(state)]
+
+
+def first_state(is_correct: bool, params: BKTParams | None = None) -> int:
+    """p_know after a KC's very first submission (one step from the prior)."""
+    return step(settings.BKT_PRIOR, is_correct, params)
+
+
+@lru_cache(maxsize=1024)
+def _run(params: BKTParams, is_correct: bool, k: int) -> Tuple[int, ...]:
+    # k identical outcomes in a row, by doubling: run(2k) = run(k) . run(k)
+    if k == 1:
+        return table(params)[is_correct]
+    half = _run(params, is_correct, k // 2)
+    out = tuple(half[s] for s in half)
+    if k % 2:
+        one = table(params)[is_correct]
+        out = tuple(one[s] for s in out)
+    return out
+
+
+def apply_outcomes(state, outcomes: Iterable[bool], params: BKTParams | None = None) -> int:
+    """
+    Apply a sequence of outcomes. Runs of the same outcome are a single hop
+    through a cached k-step table, so streaks cost O(1) after the first time.
+    """
+    params = params or default_params()
+    s = _clamp(state)
+    prev, k = None, 0
+    for o in outcomes:
+        o = bool(o)
+        if o == prev:
+            k += 1
+            continue
+        if k:
+            s = _run(params, prev, k)[s]
+        prev, k = o, 1
+    if k:
+        s = _run(params, prev, k)[s]
+    return s
+
+
+def compose(outcomes: Iterable[bool], params: BKTParams | None = None) -> Tuple[int, ...]:
+    """One 101-entry table for a whole outcome sequence (state -> final state)."""
+    params = params or default_params()
+    out = tuple(range(STATES))
+    for o in outcomes:
+        row = table(params)[bool(o)]
+        out = tuple(row[s] for s in out)
+    return out
+
+
+# ---------------- SQL ----------------
+
+def sql_step(state_col, is_correct: bool, params: BKTParams | None = None):
+    """`ARRAY[...][state + 1]` — the table row inlined as an int[] literal."""
+    row = table(params or default_params())[bool(is_correct)]
+    idx = func.greatest(0, func.least(100, cast(func.round(state_col), Integer))) + 1
+    return array([literal_column(str(v), Integer) for v in row])[idx]
+
+
+# ---------------- export ----------------
+
+def export(params: BKTParams) -> Dict[str, Any]:
+    incorrect, correct = table(params)
+    return {
+        "slip": params.slip,
+        "guess": params.guess,
+        "transit": params.transit,
+        "prior": settings.BKT_PRIOR,
+        "version": params_version(),
+        "incorrect": list(incorrect),
+        "correct": list(correct),
+    }
@@ -3,11 +3,80 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     DATABASE_URL: str | None = None
     DATABASE_URL_SYNC: str | None = None
+    DB_LONG_HOLD_SECONDS: float = 2.0   # pooled connection checkouts longer than this are logged
     REDIS_URL: str | None = None          
     FIREBASE_CREDENTIALS: str | None = None
+    FIREBASE_PROJECT_ID: str | None = None    # defaults to the project in FIREBASE_CREDENTIALS
+    FIREBASE_REVOCATION_TTL_SECONDS: int = 30
+    FIREBASE_CLAIMS_CACHE_SIZE: int = 10000
+    SESSION_TOKEN_SECRET: str | None = None
+    SESSION_TOKEN_TTL_SECONDS: int = 60 * 60
+    INTERNAL_API_TOKEN: str | None = None  # X-Internal-Token for /metrics; unset disables it
+    SESSION_GENERATION_REFRESH_SECONDS: int = 5
+    IDENTITY_CACHE_TTL_SECONDS: int = 300
+    IDENTITY_CACHE_LOCAL_TTL_SECONDS: int = 5
+    IDENTITY_CACHE_LOCAL_SIZE: int = 50000
     T5_API_KEY: str | None = None
     T5_API_URL: str | None = None
+    T5_MODEL_VERSION: str = "v1"   # part of the t5 sentence cache keys; bump on model rollout
+    T5_CONNECT_TIMEOUT: float = 3.0
+    T5_READ_TIMEOUT: float = 15.0
+    T5_POOL_TIMEOUT: float = 5.0
+    T5_HTTP2: bool = False                # needs the optional 'h2' package
+    T5_MAX_CONNECTIONS: int = 100
+    T5_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    T5_KEEPALIVE_EXPIRY: float = 30.0
+    T5_BATCH_API_URL: str | None = None   # set to enable micro-batching
+    T5_BATCH_WINDOW_MS: float = 10.0
+    T5_BATCH_MAX_SIZE: int = 32
+    T5_BATCH_MAX_QUEUE: int = 1000
+    T5_BATCH_MAX_INFLIGHT: int = 4
+    GRAMMAR_BACKEND: str = "t5"                    # see app.services.grammar_backends
+    GRAMMAR_FALLBACK_BACKEND: str | None = None    # e.g. "rules": used when the primary is down/slow
+    GRAMMAR_SHADOW_BACKEND: str | None = None     # compare against this backend on sampled traffic
+    GRAMMAR_SHADOW_SAMPLE_RATE: float = 0.0
+    GRAMMAR_SHADOW_MAX_INFLIGHT: int = 4
+    GRAMMARBOT_API_URL: str = "https://grammarbot.p.rapidapi.com/check"
+    GRAMMARBOT_API_HOST: str = "grammarbot.p.rapidapi.com"
+    GRAMMARBOT_API_KEY: str | None = None
+    GRAMMARBOT_VERSION: str = "v1"  # part of its sentence cache keys; bump if its answers change
+    RULES_BACKEND_WORKERS: int = 2
+    RULES_BATCH_WINDOW_MS: float = 2.0
+    RULES_BATCH_MAX_SIZE: int = 64
+    RULES_BATCH_MAX_QUEUE: int = 2000
+    GRAMMAR_BUDGET_SECONDS: float = 4.0   # max wait on the backend per submission
+    T5_BREAKER_FAILURE_RATE: float = 0.5
+    T5_BREAKER_SLOW_CALL_SECONDS: float = 3.0
+    T5_BREAKER_MIN_CALLS: int = 10
+    T5_BREAKER_WINDOW: int = 50
+    T5_BREAKER_OPEN_SECONDS: float = 15.0
+    T5_HEDGE_ENABLED: bool = False
+    T5_HEDGE_MIN_DELAY_MS: float = 50.0
+    PRECHECK_RATE_LIMIT: int = 30             # prechecks per user per window
+    PRECHECK_RATE_WINDOW_SECONDS: int = 60
+    PRECHECK_MAX_INFLIGHT: int = 8            # per worker; extra prechecks are dropped
+    KC_ANSWERS_PATH: str | None = None   # defaults to app/content/answers.json
+    SENTENCE_CACHE_L1_MAX_ITEMS: int = 50_000
+    SENTENCE_CACHE_L1_MAX_BYTES: int = 32 * 1024 * 1024
+    SENTENCE_CACHE_L1_TTL_SECONDS: int = 6 * 60 * 60
+    SENTENCE_LOCK_WAIT_SECONDS: float = 5.0   # wait for another worker's grading
+    SENTENCE_CACHE_NEGATIVE_TTL_SECONDS: int = 30   # backend errors are only remembered briefly
+    SENTENCE_CACHE_REFRESH_AFTER_SECONDS: int = 7 * 24 * 60 * 60   # older hits are re-graded in the background
+    BKT_SLIP: float = 0.1
+    BKT_GUESS: float = 0.2
+    BKT_TRANSIT: float = 0.15
+    BKT_PRIOR: int = 50                   # p_know (0..100) before a KC's first submission
+    BKT_KC_PARAMS: dict[int, dict[str, float]] = {}   # per-KC overrides, JSON in env
+    BKT_PARAMS_PATH: str | None = None    # fitted per-KC table from app.tools.fit_bkt
+    EVENT_LOG_ENABLED: bool = True
+    EVENT_LOG_BATCH_SIZE: int = 500       # rows per bulk INSERT
+    EVENT_LOG_FLUSH_SECONDS: float = 1.0
+    EVENT_LOG_MAX_BUFFER: int = 50_000    # beyond this, new events are dropped (and counted)
+    EVENT_LOG_PARTITION_MONTHS_AHEAD: int = 2
     DEBUG: bool = False
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: dict[str, str] = {}       # per-logger overrides, JSON in env
+    LOG_SAMPLING: dict[str, float] = {}   # per-logger keep rate for < WARNING
     GEMINI_API_KEY: str | None = None
     
 
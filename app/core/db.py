@@ -1,9 +1,15 @@
-from typing import AsyncGenerator
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, AsyncIterator, Dict
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import declarative_base
 from app.core.config import settings
 import ssl
 
+logger = logging.getLogger("db")
+
 ssl_context = ssl.create_default_context()
 
 engine = create_async_engine(
@@ -19,4 +25,63 @@ Base = declarative_base()
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+# ---------------- Connection hold tracking ----------------
+# How long each pooled connection stays checked out. A long hold almost
+# always means a session kept its transaction open across slow non-DB I/O.
+_pool_counters: Dict[str, Any] = {
+    "checkouts": 0, "long_holds": 0, "max_hold_seconds": 0.0, "released_for_io": 0, "pending_at_io": 0,
+}
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _on_checkout(dbapi_conn, record, proxy):
+    record.info["checked_out_at"] = time.monotonic()
+    _pool_counters["checkouts"] += 1
+
+@event.listens_for(engine.sync_engine, "checkin")
+def _on_checkin(dbapi_conn, record):
+    started = record.info.pop("checked_out_at", None)
+    if started is None:
+        return
+    held = time.monotonic() - started
+    if held > _pool_counters["max_hold_seconds"]:
+        _pool_counters["max_hold_seconds"] = round(held, 3)
+    if held >= settings.DB_LONG_HOLD_SECONDS:
+        _pool_counters["long_holds"] += 1
+        logger.warning("DB connection held for %.2fs", held)
+
+def db_pool_stats() -> Dict[str, Any]:
+    pool = engine.sync_engine.pool
+    out = dict(_pool_counters)
+    for name in ("size", "checkedout", "overflow"):
+        fn = getattr(pool, name, None)
+        if callable(fn):
+            out[name] = fn()
+    return out
+
+@asynccontextmanager
+async def external_io(db: AsyncSession, label: str) -> AsyncIterator[None]:
+    """
+    Wrap awaits on non-DB I/O (model calls, HTTP, ...). Ends the session's
+    open transaction first so its pooled connection goes back to the pool;
+    the session transparently checks one out again on its next query.
+
+    The rollback expires every loaded instance: touching an attribute
+    afterwards lazy-loads, which fails under asyncio. Copy the primitives
+    you need (ids, ...) before entering, or re-read the objects after.
+
+    Only for read-only transactions: the transaction is rolled back, never
+    committed. Unflushed changes are a bug in the caller and raise.
+    """
+    if db.in_transaction():
+        if db.new or db.dirty or db.deleted:
+            # the caller should have finished (and committed) its writes
+            # before starting external I/O; don't persist half-done work
+            _pool_counters["pending_at_io"] += 1
+            await db.rollback()
+            raise RuntimeError(f"Session has pending changes before {label}; rolled back")
+        await db.rollback()
+        _pool_counters["released_for_io"] += 1
+    yield
@@ -1,40 +1,161 @@
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from typing import Any, Dict, Optional
+
 import firebase_admin
+import httpx
+import jwt
+from cryptography.x509 import load_pem_x509_certificate
 from firebase_admin import credentials, auth
 from app.core.config import settings
+from app.utils.ttl_cache import TTLCache
 from fastapi import HTTPException, status
 
+logger = logging.getLogger("auth")
+
+# Google's rotating x509 certs for Firebase ID tokens. The response carries a
+# Cache-Control max-age that tells us how long the set stays valid.
+_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+_CLOCK_SKEW_SECONDS = 5
+_MIN_FORCED_REFRESH_SECONDS = 60  # unknown `kid` may not hammer Google
+
+_signing_keys: Dict[str, Any] = {}
+_keys_expire_at = 0.0
+_keys_last_forced = 0.0
+_keys_lock = asyncio.Lock()
+
+_project_id: Optional[str] = None
+
+# sha256(token) -> verified claims, expiring at the token's own `exp`
+_claims_cache: TTLCache[dict] = TTLCache(settings.FIREBASE_CLAIMS_CACHE_SIZE)
+# uid -> (tokens_valid_after in ms, disabled), expiring after a short TTL
+_revocation_cache: TTLCache[tuple] = TTLCache(settings.FIREBASE_CLAIMS_CACHE_SIZE)
+
+
 def init_firebase():
+    global _project_id
     if not firebase_admin._apps:
         if not settings.FIREBASE_CREDENTIALS:
             raise RuntimeError("FIREBASE_CREDENTIALS is not set in env")
         cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS)
         firebase_admin.initialize_app(cred)
+    if _project_id is None:
+        _project_id = settings.FIREBASE_PROJECT_ID or firebase_admin.get_app().project_id
+        if not _project_id:
+            raise RuntimeError("Firebase project id could not be determined")
+
+
+def set_signing_keys(pem_by_kid: Dict[str, str], max_age: int = 3600) -> None:
+    """Install a signing-key set (kid -> PEM certificate) directly."""
+    global _signing_keys, _keys_expire_at
+    _signing_keys = {
+        kid: load_pem_x509_certificate(pem.encode("utf-8")).public_key()
+        for kid, pem in pem_by_kid.items()
+    }
+    _keys_expire_at = time.time() + max_age
+
+
+def _max_age(cache_control: str) -> int:
+    m = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(m.group(1)) if m else 3600
+
+
+async def _refresh_signing_keys(force: bool = False) -> None:
+    global _keys_last_forced
+    async with _keys_lock:
+        now = time.time()
+        if not force and _keys_expire_at > now:
+            return  # another request refreshed while we waited
+        if force:
+            if now - _keys_last_forced < _MIN_FORCED_REFRESH_SECONDS:
+                return
+            _keys_last_forced = now
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            resp = await client.get(_CERTS_URL)
+            resp.raise_for_status()
+        set_signing_keys(resp.json(), _max_age(resp.headers.get("cache-control", "")))
 
-def verify_id_token(id_token: str) -> dict:
+
+async def _signing_key(kid: str):
+    if _keys_expire_at <= time.time():
+        await _refresh_signing_keys()
+    key = _signing_keys.get(kid)
+    if key is None:
+        # Google rotated keys before our cached set expired
+        await _refresh_signing_keys(force=True)
+        key = _signing_keys.get(kid)
+    if key is None:
+        raise jwt.InvalidTokenError(f"Unknown signing key id: {kid}")
+    return key
+
+
+async def _decode(id_token: str) -> dict:
+    header = jwt.get_unverified_header(id_token)
+    if header.get("alg") != "RS256":
+        raise jwt.InvalidAlgorithmError("Firebase ID tokens must use RS256")
+    key = await _signing_key(header.get("kid", ""))
+    claims = jwt.decode(
+        id_token,
+        key,
+        algorithms=["RS256"],
+        audience=_project_id,
+        issuer=f"https://securetoken.google.com/{_project_id}",
+        leeway=_CLOCK_SKEW_SECONDS,
+        options={"require": ["exp", "iat", "sub"]},
+    )
+    sub = claims.get("sub")
+    if not isinstance(sub, str) or not sub or len(sub) > 128:
+        raise jwt.InvalidTokenError("Invalid subject")
+    if claims.get("auth_time", 0) > time.time() + _CLOCK_SKEW_SECONDS:
+        raise jwt.InvalidTokenError("auth_time is in the future")
+    claims["uid"] = sub
+    return claims
+
+
+async def _check_revoked(claims: dict) -> None:
+    uid = claims["uid"]
+    state = _revocation_cache.get(uid)
+    if state is None:
+        # get_user is a blocking HTTP call; keep it off the event loop
+        user = await asyncio.to_thread(auth.get_user, uid)
+        state = (user.tokens_valid_after_timestamp or 0, bool(user.disabled))
+        _revocation_cache.set(uid, state, time.time() + settings.FIREBASE_REVOCATION_TTL_SECONDS)
+    valid_after_ms, disabled = state
+    if disabled:
+        raise auth.UserDisabledError("The user record is disabled.")
+    if claims["iat"] * 1000 < valid_after_ms:
+        raise auth.RevokedIdTokenError("The Firebase ID token has been revoked.")
+
+
+async def verify_id_token(id_token: str) -> dict:
     init_firebase()
+    token_hash = hashlib.sha256(id_token.encode("utf-8")).hexdigest()
     try:
-        # --- MODIFICATION ---
-        # Add check_revoked=True
-        decoded = auth.verify_id_token(id_token, check_revoked=True)
-        # --- END MODIFICATION ---
-        
-        print("Decoded token:", decoded)
+        decoded = _claims_cache.get(token_hash)
+        if decoded is None:
+            decoded = await _decode(id_token)
+            _claims_cache.set(token_hash, decoded, float(decoded["exp"]))
+
+        await _check_revoked(decoded)
+
+        logger.debug("Token verified", extra={"uid": decoded["uid"]})
         return decoded
-        
-    # --- MODIFICATION ---
-    # Catch this specific error
+
     except auth.RevokedIdTokenError as exc:
-        print("Token was revoked:", exc)
+        logger.info("Token was revoked")
+        _claims_cache.pop(token_hash)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="SESSION_TERMINATED", # Send specific "kicked" error
             headers={"WWW-Authenticate": "Bearer"},
         ) from exc
-    # --- END MODIFICATION ---
-        
-    except Exception as exc:  
-        print("Token verification failed:", exc)
+
+    except Exception as exc:
+        logger.warning("Token verification failed: %s", type(exc).__name__)
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, 
+            status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid Firebase token"
-        ) from exc
\ No newline at end of file
+        ) from exc
@@ -0,0 +1,106 @@
+# app/core/http.py
+"""
+Process-wide httpx client for the grammar backend.
+
+Created once in the FastAPI lifespan (or lazily on first use, e.g. from CLI
+jobs) so connections, DNS and TLS sessions are reused across requests.
+"""
+from __future__ import annotations
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger("http")
+
+_client: Optional[httpx.AsyncClient] = None
+_transport: Optional["_CountingTransport"] = None
+_counters: Dict[str, int] = {"requests": 0, "errors": 0, "in_flight": 0}
+
+
+class _CountingTransport(httpx.AsyncHTTPTransport):
+    """The stock transport, counting requests through public API only."""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        _counters["requests"] += 1
+        _counters["in_flight"] += 1
+        try:
+            return await super().handle_async_request(request)
+        except Exception:
+            _counters["errors"] += 1
+            raise
+        finally:
+            _counters["in_flight"] -= 1
+
+
+def _http2_enabled() -> bool:
+    if not settings.T5_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401  (httpx needs it for HTTP/2)
+        return True
+    except ImportError:
+        logger.warning("T5_HTTP2 is set but the 'h2' package is missing; using HTTP/1.1")
+        return False
+
+
+def init_http_client() -> httpx.AsyncClient:
+    global _client, _transport
+    if _client is None or _client.is_closed:
+        # with an explicit transport, pool limits and http2 are set on it
+        _transport = _CountingTransport(
+            http2=_http2_enabled(),
+            limits=httpx.Limits(
+                max_connections=settings.T5_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.T5_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.T5_KEEPALIVE_EXPIRY,
+            ),
+        )
+        _client = httpx.AsyncClient(
+            transport=_transport,
+            timeout=httpx.Timeout(
+                connect=settings.T5_CONNECT_TIMEOUT,
+                read=settings.T5_READ_TIMEOUT,
+                write=settings.T5_READ_TIMEOUT,
+                pool=settings.T5_POOL_TIMEOUT,
+            ),
+        )
+    return _client
+
+
+def get_http_client() -> httpx.AsyncClient:
+    return init_http_client()
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def pool_stats() -> Dict[str, Any]:
+    """
+    Request counts of the shared client. Per-connection numbers come from
+    httpcore internals and are only added while those still look the same.
+    """
+    stats: Dict[str, Any] = {
+        **_counters,
+        "open": False,
+        "max_connections": settings.T5_MAX_CONNECTIONS,
+        "max_keepalive": settings.T5_MAX_KEEPALIVE_CONNECTIONS,
+    }
+    if _client is None or _client.is_closed:
+        return stats
+    stats["open"] = True
+    conns = getattr(getattr(_transport, "_pool", None), "connections", None)
+    if not isinstance(conns, list):
+        return stats
+    try:
+        idle = sum(1 for c in conns if c.is_idle())
+    except Exception:
+        return stats
+    stats.update(connections=len(conns), idle=idle, active=len(conns) - idle)
+    return stats
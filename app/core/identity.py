@@ -0,0 +1,67 @@
+# app/core/identity.py
+"""
+Two-level cache of the user identity snapshot that auth needs on every
+request: firebase_uid -> (users.id, active_session_auth_time).
+
+L1 is an in-process LRU with a short TTL (bounds how long another worker can
+serve a stale auth_time after a new login); L2 is Redis. Writers that touch
+the users row call `invalidate_identity`.
+"""
+from __future__ import annotations
+import time, uuid
+from typing import Optional
+
+from app.core.config import settings
+from app.core.redis import redis
+from app.core.session import UserIdentity
+from app.utils.ttl_cache import TTLCache
+
+_local: TTLCache[UserIdentity] = TTLCache(settings.IDENTITY_CACHE_LOCAL_SIZE)
+
+
+def _key(firebase_uid: str) -> str:
+    return f"gh:ident:{firebase_uid}"
+
+
+def _encode(ident: UserIdentity) -> str:
+    at = ident.active_session_auth_time
+    return f"{ident.id.hex}:{'' if at is None else at}"
+
+
+def _decode(raw: str) -> UserIdentity:
+    uid_hex, at = raw.split(":", 1)
+    return UserIdentity(id=uuid.UUID(hex=uid_hex), active_session_auth_time=int(at) if at else None)
+
+
+async def get_identity(firebase_uid: str) -> Optional[UserIdentity]:
+    ident = _local.get(firebase_uid)
+    if ident is not None:
+        return ident
+    try:
+        raw = await redis.get(_key(firebase_uid))
+    except Exception:
+        return None
+    if not raw:
+        return None
+    try:
+        ident = _decode(raw)
+    except Exception:
+        return None
+    _local.set(firebase_uid, ident, time.time() + settings.IDENTITY_CACHE_LOCAL_TTL_SECONDS)
+    return ident
+
+
+async def set_identity(firebase_uid: str, ident: UserIdentity) -> None:
+    _local.set(firebase_uid, ident, time.time() + settings.IDENTITY_CACHE_LOCAL_TTL_SECONDS)
+    try:
+        await redis.set(_key(firebase_uid), _encode(ident), ex=settings.IDENTITY_CACHE_TTL_SECONDS)
+    except Exception:
+        pass
+
+
+async def invalidate_identity(firebase_uid: str) -> None:
+    _local.pop(firebase_uid)
+    try:
+        await redis.delete(_key(firebase_uid))
+    except Exception:
+        pass
@@ -0,0 +1,96 @@
+# app/core/log.py
+"""
+Non-blocking logging setup.
+
+Request code only formats a record and drops it on an in-memory queue; a
+QueueListener thread does the JSON encoding and the actual stream writes.
+Per-logger levels and sampling rates come from Settings, e.g.
+
+    LOG_LEVEL=INFO
+    LOG_LEVELS={"grammar_cache": "WARNING"}
+    LOG_SAMPLING={"grammar_cache": 0.05}
+
+Sampling only ever drops records below WARNING.
+"""
+from __future__ import annotations
+import atexit, json, logging, queue, random, sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+# Attributes every LogRecord has; anything else came in through `extra=`.
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for k, v in record.__dict__.items():
+            if k not in _RESERVED and not k.startswith("_"):
+                out[k] = v
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of sub-WARNING records for the configured loggers."""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def _rate(self, name: str) -> float:
+        # most specific configured prefix wins ("a.b.c" -> "a.b" -> "a")
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+def setup_logging() -> None:
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+
+    q: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    qh = QueueHandler(q)
+    qh.addFilter(SamplingFilter(settings.LOG_SAMPLING))
+
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(qh)
+    root.setLevel(settings.LOG_LEVEL.upper())
+    for name, level in settings.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = QueueListener(q, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flushes whatever is still queued. Safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,9 +1,17 @@
 from fastapi import Depends, HTTPException, status, Header
 from app.core.firebase import verify_id_token
-from app.core.db import get_db
+from app.core.identity import get_identity, set_identity
+from app.core.session import (
+    UserIdentity, SessionTerminated, SessionTokenError,
+    is_session_token, verify_session_token, bump_session_generation,
+)
+from app.core.db import get_db, AsyncSessionLocal
 from sqlalchemy.ext.asyncio import AsyncSession
 from app import crud
-from typing import Optional
+from typing import Dict, Optional, Tuple
+import asyncio
+import hmac
+from app.core.config import settings
 from app.models.user import User # Import your User model
 from firebase_admin import auth # Import firebase_admin.auth
 
@@ -103,10 +111,49 @@ from firebase_admin import auth # Import firebase_admin.auth
 #     # Failsafe, though one of the above should always catch
 #     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid session")
 
+_SESSION_TERMINATED = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="SESSION_TERMINATED",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+# (firebase_uid, auth_time) -> in-flight provisioning, so parallel first
+# requests from one client (/auth/sync + /bootstrap) share one statement.
+_provisioning: Dict[Tuple[str, int], "asyncio.Future[UserIdentity]"] = {}
+
+
+async def _provision_once(uid: str, email: Optional[str], token_auth_time: int) -> UserIdentity:
+    # Own session: the connection goes back to the pool as soon as the
+    # statement commits, independent of which request started it.
+    async with AsyncSessionLocal() as db:
+        user_id, db_auth_time = await crud.user.provision_from_firebase(
+            db, uid, email, token_auth_time
+        )
+    ident = UserIdentity(id=user_id, active_session_auth_time=db_auth_time)
+    await set_identity(uid, ident)
+    if db_auth_time == token_auth_time:
+        await bump_session_generation(user_id, token_auth_time)
+    return ident
+
+
+async def _provision(uid: str, email: Optional[str], token_auth_time: int) -> UserIdentity:
+    key = (uid, token_auth_time)
+    fut = _provisioning.get(key)
+    if fut is None:
+        fut = asyncio.ensure_future(_provision_once(uid, email, token_auth_time))
+        _provisioning[key] = fut
+        fut.add_done_callback(lambda _: _provisioning.pop(key, None))
+    return await asyncio.shield(fut)
+
+
 async def get_current_user(
     authorization: Optional[str] = Header(None), 
-    db: AsyncSession = Depends(get_db)
-) -> User:
+) -> UserIdentity:
+    """
+    Verifies the Firebase token and enforces "last login wins". Returns the
+    cached identity snapshot (id + active_session_auth_time); routes that need
+    profile fields depend on `get_current_user_profile` instead.
+    """
     
     if not authorization:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing Authorization header")
@@ -117,58 +164,79 @@ async def get_current_user(
     token = authorization.split(" ", 1)[1]
     
     # 1. Verify token
-    decoded = verify_id_token(token)
+    decoded = await verify_id_token(token)
     
     uid = decoded.get("uid")
     token_auth_time = decoded.get("auth_time")
     
     if not uid or not token_auth_time:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
-    
-    # 2. Get or Create User
-    user = await crud.user.get_by_firebase_uid(db, uid)
-    
-    if not user:
-        # --- NEW USER (FIRST LOGIN) ---
-        user = await crud.user.create_from_firebase(
-            db, 
-            uid, 
-            decoded.get("email"), 
-            decoded.get("name"),
-            token_auth_time
-        )
-        return user
 
-    # --- EXISTING USER: PERFORM SESSION CHECK ---
-    
-    db_auth_time = user.active_session_auth_time
-    
-    if db_auth_time is None:
-        # User exists, but from before you deployed this feature.
-        user.active_session_auth_time = token_auth_time
-        await db.commit()
-        await db.refresh(user)
-        return user
-
-    if token_auth_time > db_auth_time:
-        # --- NEW LOGIN DETECTED ---
-        # Just update the DB time. This is the only action needed.
-        user.active_session_auth_time = token_auth_time
-        await db.commit()
-        await db.refresh(user)
-        return user
-
-    elif token_auth_time == db_auth_time:
-        # --- VALID, EXISTING SESSION ---
-        return user
-
-    elif token_auth_time < db_auth_time:
+    # 2. Cached snapshot covers the common case (same session, no DB)
+    ident = await get_identity(uid)
+    if ident is not None and ident.active_session_auth_time is not None:
+        if token_auth_time == ident.active_session_auth_time:
+            return ident
+        if token_auth_time < ident.active_session_auth_time:
+            raise _SESSION_TERMINATED
+        # newer login: let the DB decide below
+
+    # 3. Get-or-create + session upgrade/compare, one statement
+    ident = await _provision(uid, decoded.get("email"), token_auth_time)
+
+    if token_auth_time < (ident.active_session_auth_time or 0):
         # --- STALE SESSION DETECTED ---
-        # This correctly kicks the OLD device (Device 1).
+        # A newer login is already recorded; this kicks the OLD device.
+        raise _SESSION_TERMINATED
+
+    return ident
+
+
+async def get_current_user_profile(
+    me: UserIdentity = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> User:
+    """Loads the full `User` row, for routes that read profile fields."""
+    user = await crud.user.get_by_id(db, me.id)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    return user
+
+
+async def get_current_session_user(
+    authorization: Optional[str] = Header(None),
+):
+    """
+    Fast-path auth for hot endpoints. Accepts a session token from
+    POST /auth/session (verified in memory) and falls back to the full
+    Firebase check for anything else.
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        return await get_current_user(authorization)
+
+    token = authorization.split(" ", 1)[1]
+    if not is_session_token(token):
+        return await get_current_user(authorization)
+
+    try:
+        return await verify_session_token(token)
+    except SessionTerminated:
+        raise _SESSION_TERMINATED
+    except (SessionTokenError, RuntimeError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="SESSION_TERMINATED",
+            detail="Invalid session token",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid session")
\ No newline at end of file
+
+
+async def require_internal(x_internal_token: Optional[str] = Header(None)) -> None:
+    """
+    Guard for operator-only routes (metrics, ...). Needs INTERNAL_API_TOKEN
+    in X-Internal-Token; without the setting the routes don't exist.
+    """
+    expected = settings.INTERNAL_API_TOKEN
+    if not expected:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_internal_token or not hmac.compare_digest(x_internal_token, expected):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
@@ -0,0 +1,131 @@
+# app/core/session.py
+"""
+Server-issued session tokens.
+
+A client trades its Firebase ID token once (POST /auth/session) for a short
+HMAC-signed token carrying the user id and the `active_session_auth_time` of
+that login. Hot endpoints verify it in memory only.
+
+"Last login wins" is kept through a per-user session generation: the newest
+login's auth_time, stored in Redis and mirrored in a short-lived in-process
+cache. Tokens minted for an older login fail against a newer generation.
+"""
+from __future__ import annotations
+import base64, hashlib, hmac, struct, time, uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from app.core.config import settings
+from app.core.redis import redis
+from app.utils.ttl_cache import TTLCache
+
+TOKEN_PREFIX = "ghs1."
+_PAYLOAD = struct.Struct(">16sQQ")  # user id, auth_time, exp
+
+# Only ever raise the stored generation; a late writer must not roll it back.
+_BUMP_SCRIPT = """
+local cur = tonumber(redis.call('GET', KEYS[1]) or '0')
+local new = tonumber(ARGV[1])
+if new > cur then
+  redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+  return new
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return cur
+"""
+
+_generations: TTLCache[int] = TTLCache(50_000)
+
+
+@dataclass(frozen=True)
+class UserIdentity:
+    id: uuid.UUID
+    active_session_auth_time: Optional[int]
+
+
+class SessionTokenError(Exception):
+    pass
+
+
+class SessionTerminated(SessionTokenError):
+    pass
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _unb64(s: str) -> bytes:
+    return base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+
+
+def _secret() -> bytes:
+    if not settings.SESSION_TOKEN_SECRET:
+        raise RuntimeError("SESSION_TOKEN_SECRET is not set in env")
+    return settings.SESSION_TOKEN_SECRET.encode("utf-8")
+
+
+def _sign(body: str) -> str:
+    return _b64(hmac.new(_secret(), body.encode("ascii"), hashlib.sha256).digest())
+
+
+def _gen_key(user_id: uuid.UUID) -> str:
+    return f"gh:sessgen:{user_id}"
+
+
+def issue_session_token(user_id: uuid.UUID, auth_time: int) -> tuple[str, int]:
+    """Returns (token, expires_at)."""
+    exp = int(time.time()) + settings.SESSION_TOKEN_TTL_SECONDS
+    body = _b64(_PAYLOAD.pack(user_id.bytes, int(auth_time), exp))
+    return f"{TOKEN_PREFIX}{body}.{_sign(body)}", exp
+
+
+def is_session_token(token: str) -> bool:
+    return token.startswith(TOKEN_PREFIX)
+
+
+def decode_session_token(token: str) -> UserIdentity:
+    """Checks signature and expiry. Pure CPU, no I/O."""
+    try:
+        body, sig = token[len(TOKEN_PREFIX):].split(".", 1)
+        if not hmac.compare_digest(sig, _sign(body)):
+            raise SessionTokenError("Bad signature")
+        raw_id, auth_time, exp = _PAYLOAD.unpack(_unb64(body))
+    except SessionTokenError:
+        raise
+    except Exception as exc:
+        raise SessionTokenError("Malformed session token") from exc
+    if exp <= time.time():
+        raise SessionTokenError("Session token expired")
+    return UserIdentity(id=uuid.UUID(bytes=raw_id), active_session_auth_time=auth_time)
+
+
+async def current_generation(user_id: uuid.UUID) -> Optional[int]:
+    gen = _generations.get(user_id)
+    if gen is not None:
+        return gen
+    try:
+        raw = await redis.get(_gen_key(user_id))
+    except Exception:
+        return None  # Redis down: fall back to signature + expiry only
+    gen = int(raw) if raw else 0
+    _generations.set(user_id, gen, time.time() + settings.SESSION_GENERATION_REFRESH_SECONDS)
+    return gen
+
+
+async def bump_session_generation(user_id: uuid.UUID, auth_time: int) -> None:
+    """Record a (possibly) newer login so older session tokens stop working."""
+    ttl = settings.SESSION_TOKEN_TTL_SECONDS + 60
+    try:
+        gen = await redis.eval(_BUMP_SCRIPT, 1, _gen_key(user_id), int(auth_time), ttl)
+    except Exception:
+        gen = max(int(auth_time), _generations.get(user_id) or 0)
+    _generations.set(user_id, int(gen), time.time() + settings.SESSION_GENERATION_REFRESH_SECONDS)
+
+
+async def verify_session_token(token: str) -> UserIdentity:
+    ident = decode_session_token(token)
+    gen = await current_generation(ident.id)
+    if gen and (ident.active_session_auth_time or 0) < gen:
+        raise SessionTerminated("A newer login replaced this session")
+    return ident
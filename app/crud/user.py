@@ -1,7 +1,9 @@
 import uuid
-from sqlalchemy import select, update
+from sqlalchemy import select, update, case, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.user import User
+from app.core.identity import invalidate_identity
 
 async def get_by_id(db: AsyncSession, user_id: uuid.UUID) -> User | None:
     res = await db.execute(select(User).where(User.id == user_id))
@@ -15,25 +17,41 @@ async def get_by_display_name(db: AsyncSession, name: str) -> User | None:
     res = await db.execute(select(User).where(User.display_name == name))
     return res.scalar_one_or_none()
 
-async def create_from_firebase(
-    db: AsyncSession, 
-    uid: str, 
-    email: str | None, 
-    name: str | None,
-    auth_time: int  # <-- MODIFICATION: Added auth_time
-) -> User:
-    
-    user = User(
-        firebase_uid=uid, 
+async def provision_from_firebase(
+    db: AsyncSession,
+    uid: str,
+    email: str | None,
+    auth_time: int,
+) -> tuple[uuid.UUID, int]:
+    """
+    Get-or-create the user for a Firebase login in one statement.
+
+    INSERT ... ON CONFLICT (firebase_uid) DO UPDATE raises
+    `active_session_auth_time` to `auth_time` only when the stored value is
+    NULL (pre-session-management users) or older ("last login wins"), and
+    RETURNING hands back the stored value. If it is greater than `auth_time`
+    the caller's session is stale.
+    """
+    stmt = pg_insert(User).values(
+        firebase_uid=uid,
         email=email or f"uid-{uid}@unknown.local",
-        # <-- MODIFICATION: Store the auth_time
-        active_session_auth_time=auth_time 
+        active_session_auth_time=auth_time,
     )
-    
-    db.add(user)
+    current = User.__table__.c.active_session_auth_time
+    incoming = stmt.excluded.active_session_auth_time
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.firebase_uid],
+        set_={
+            "active_session_auth_time": case(
+                (or_(current.is_(None), current < incoming), incoming),
+                else_=current,
+            ),
+        },
+    ).returning(User.id, User.active_session_auth_time)
+
+    row = (await db.execute(stmt)).one()
     await db.commit()
-    await db.refresh(user)
-    return user
+    return row.id, row.active_session_auth_time
 
 async def set_display_name(db: AsyncSession, user: User, display_name: str) -> User:
     await db.execute(
@@ -41,4 +59,5 @@ async def set_display_name(db: AsyncSession, user: User, display_name: str) -> U
     )
     await db.commit()
     await db.refresh(user)
+    await invalidate_identity(user.firebase_uid)
     return user
\ No newline at end of file
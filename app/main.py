@@ -1,10 +1,38 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import auth, users, bootstrap, adventures, submissions
 from app.routers import stats as stats_router
-from app.core.db import engine, Base
+from app.core.db import engine, Base, db_pool_stats
+from app.core.log import setup_logging, shutdown_logging
+from app.core.http import init_http_client, close_http_client, pool_stats
+from app.core.security import require_internal
+from app.core.bkt import load_fitted_params
+from app.services.kc_answer_bank import load_answer_bank, bank_stats
+from app.services.grammar_backends import backends_stats, close_backends
+from app.services.grammar_service import resilience_stats, precheck_stats
+from app.services.shadow import shadow_report
+from app.services.event_log import ensure_partitions, stop_event_log, event_log_stats
+from app.utils.redis_cache import sentence_cache_stats
+
+setup_logging()
+
 
-app = FastAPI(title="Grammar Heroes API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_http_client()
+    load_answer_bank()
+    load_fitted_params()
+    await ensure_partitions()
+    yield
+    await stop_event_log()
+    await close_backends()
+    await close_http_client()
+    shutdown_logging()
+
+
+app = FastAPI(title="Grammar Heroes API", version="1.0.0", lifespan=lifespan)
 
 # ─────────────────────────────
 # CORS CONFIG
@@ -40,4 +68,19 @@ async def health():
     Lightweight health check for Render warm-up.
     Does not touch the database. Used by Unity warm-up ping.
     """
-    return {"status": "ok", "uptime_check": True}
\ No newline at end of file
+    return {"status": "ok", "uptime_check": True}
+
+@app.get("/metrics", dependencies=[Depends(require_internal)], include_in_schema=False)
+async def metrics():
+    """In-process counters for this worker. Does not touch the database."""
+    return {
+        "t5_http_pool": pool_stats(),
+        "db_pool": db_pool_stats(),
+        "grammar_backends": backends_stats(),
+        "grammar_resilience": resilience_stats(),
+        "grammar_shadow": shadow_report(),
+        "sentence_cache": sentence_cache_stats(),
+        "answer_bank": bank_stats(),
+        "precheck": precheck_stats(),
+        "event_log": event_log_stats(),
+    }
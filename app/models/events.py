@@ -0,0 +1,33 @@
+import uuid
+from datetime import datetime
+from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, Identity, Index, Integer, SmallInteger, String, func
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+from app.core.db import Base
+
+
+class SubmissionEvent(Base):
+    """
+    Append-only log of graded submissions, one row per /submissions call.
+    Range-partitioned by month on created_at (see the migration); rows are
+    never updated, so mastery can be re-derived from them (app.tools.replay_bkt).
+    """
+    __tablename__ = "submission_events"
+    __table_args__ = (
+        Index("ix_submission_events_user_kc_time", "user_id", "kc_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    # the partition key has to be part of the primary key
+    id: Mapped[int] = mapped_column(BigInteger, Identity(), primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"))
+    # practice submissions have no adventure; a deleted adventure keeps its
+    # events as user-level history
+    adventure_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), ForeignKey("adventures.id", ondelete="SET NULL"), nullable=True)
+    kc_id: Mapped[int] = mapped_column(Integer)
+    is_correct: Mapped[bool] = mapped_column(Boolean)
+    is_practice: Mapped[bool] = mapped_column(Boolean, default=False)
+    p_know: Mapped[int | None] = mapped_column(SmallInteger, nullable=True)  # user-level value written, 0..100
+    source: Mapped[str | None] = mapped_column(String(16), nullable=True)    # bank | cache | model | fallback
+    backend: Mapped[str | None] = mapped_column(String(32), nullable=True)   # grammar backend that graded it
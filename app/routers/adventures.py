@@ -1,11 +1,12 @@
 from __future__ import annotations
 
+import logging
 import uuid
 from fastapi import APIRouter, Depends, HTTPException, status, Header, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
-from app.core.security import get_current_user
+from app.core.security import get_current_user, get_current_user_profile, get_current_session_user
 from app.core.db import get_db
 from app.schemas.adventure import AdventureOut, AdventureStartIn, AdventureProgressIn, AdventureFinishIn
 from app.crud import adventure as adv_crud
@@ -13,6 +14,7 @@ from app.models.enums import AdventureState
 from app.models.stats import AdventureSummary, AdventureKCStat
 from app.utils.idempotency import ensure_idempotent
 
+logger = logging.getLogger("adventures")
 router = APIRouter()
 
 # ──────────────────────────────────────────────
@@ -29,9 +31,14 @@ async def start(
 
     if existing and force_new:
         await adv_crud.abandon_active_for_user(db, me.id)
+        logger.info("Abandoned active adventure", extra={"user_id": str(me.id), "adventure_id": str(existing.id)})
         existing = None
 
     adv = existing or await adv_crud.create(db, me.id, payload.is_practice, seed=payload.seed)
+    logger.info(
+        "Adventure resumed" if existing else "Adventure started",
+        extra={"user_id": str(me.id), "adventure_id": str(adv.id), "is_practice": adv.is_practice},
+    )
 
     return AdventureOut(
         id=str(adv.id),
@@ -73,7 +80,7 @@ async def start(
 @router.patch("/progress", response_model=AdventureOut)
 async def progress(
     payload: AdventureProgressIn,
-    me = Depends(get_current_user),
+    me = Depends(get_current_session_user),
     db: AsyncSession = Depends(get_db),
 ):
     adv = await adv_crud.get_active_for_user(db, me.id)
@@ -123,7 +130,7 @@ async def progress(
 @router.post("/finish")
 async def finish(
     payload: AdventureFinishIn,
-    me = Depends(get_current_user),
+    me = Depends(get_current_user_profile),
     db: AsyncSession = Depends(get_db),
     idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"),
 ):
@@ -132,6 +139,7 @@ async def finish(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No active adventure")
 
     if idempotency_key and not await ensure_idempotent(f"finish:{adv.id}:{idempotency_key}"):
+        logger.info("Duplicate finish ignored", extra={"user_id": str(me.id), "adventure_id": str(adv.id)})
         return {"message": "duplicate"}
 
     adv = await adv_crud.finish(db, adv, payload.status)
@@ -181,4 +189,8 @@ async def finish(
         me.total_adventures_cleared += 1
 
     await db.commit()
+    logger.info(
+        "Adventure finished",
+        extra={"user_id": str(me.id), "adventure_id": str(adv.id), "status": payload.status},
+    )
     return {"ok": True}
\ No newline at end of file
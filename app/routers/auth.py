@@ -1,17 +1,32 @@
+import logging
+
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.security import get_current_user
+from app.core.security import get_current_user, get_current_user_profile
+from app.core.session import issue_session_token, bump_session_generation
 from app.core.db import get_db
-from app.schemas.auth import SyncOut
+from app.schemas.auth import SyncOut, SessionTokenOut
 
+logger = logging.getLogger("auth")
 router = APIRouter()
 
 @router.post("/sync", response_model=SyncOut)
-async def sync(me=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def sync(me=Depends(get_current_user_profile), db: AsyncSession = Depends(get_db)):
     first_time = me.display_name is None
+    if first_time:
+        logger.info("First login", extra={"user_id": str(me.id)})
     return {
         "user_id": str(me.id),
         "email": me.email,
         "display_name": me.display_name,
         "first_time_login": first_time,
-    }
\ No newline at end of file
+    }
+
+@router.post("/session", response_model=SessionTokenOut)
+async def session(me=Depends(get_current_user)):
+    """Trade a Firebase ID token for a short-lived server session token."""
+    auth_time = int(me.active_session_auth_time or 0)
+    await bump_session_generation(me.id, auth_time)
+    token, expires_at = issue_session_token(me.id, auth_time)
+    logger.debug("Session token issued", extra={"user_id": str(me.id), "expires_at": expires_at})
+    return SessionTokenOut(session_token=token, expires_at=expires_at, user_id=str(me.id))
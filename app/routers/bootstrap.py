@@ -4,7 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 import json
 
-from app.core.security import get_current_user
+from app.core.security import get_current_user_profile
 from app.core.db import get_db
 from app.schemas.bootstrap import BootstrapOut, HelperData
 from app.schemas.user import UserOut
@@ -87,7 +87,7 @@ def _parse_node_types(raw: str | None) -> list[int]:
 
 
 @router.get("", response_model=BootstrapOut)
-async def bootstrap(me=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def bootstrap(me=Depends(get_current_user_profile), db: AsyncSession = Depends(get_db)):
     adv = await adv_crud.get_active_for_user(db, me.id)
 
     helper = HelperData(
@@ -9,7 +9,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.db import get_db
-from app.core.security import get_current_user
+from app.core.security import get_current_session_user
 from app.models.stats import UserKCMastery, AdventureKCStat, AdventureSummary
 
 from app.schemas.stats import (
@@ -17,14 +17,16 @@ from app.schemas.stats import (
     AdventureKCStatOut, AdventureKCStatPatchIn,
     AdventureSummaryOut, AdventureSummaryPatchIn,
     AdventureSummaryWithIdOut,        # ← add this
+    BKTTableOut,
 )
+from app.core import bkt
 
 router = APIRouter()
 
 # ---------- User KC Mastery ----------
 
 @router.get("/mastery", response_model=UserKCMasteryListOut)
-async def get_user_mastery(me=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def get_user_mastery(me=Depends(get_current_session_user), db: AsyncSession = Depends(get_db)):
     res = await db.execute(select(UserKCMastery).where(UserKCMastery.user_id == me.id))
     rows = res.scalars().all()
     by_kc: Dict[int, UserKCMastery] = {r.kc_id: r for r in rows}
@@ -44,7 +46,7 @@ async def get_user_mastery(me=Depends(get_current_user), db: AsyncSession = Depe
     return UserKCMasteryListOut(mastery=out)
 
 @router.patch("/mastery", response_model=UserKCMasteryListOut)
-async def upsert_user_mastery(payload: UserKCMasteryPatchIn, me=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def upsert_user_mastery(payload: UserKCMasteryPatchIn, me=Depends(get_current_session_user), db: AsyncSession = Depends(get_db)):
     res = await db.execute(select(UserKCMastery).where(UserKCMastery.user_id == me.id))
     existing = {r.kc_id: r for r in res.scalars().all()}
 
@@ -65,7 +67,7 @@ async def upsert_user_mastery(payload: UserKCMasteryPatchIn, me=Depends(get_curr
 # ---------- Adventure KC Stats ----------
 
 @router.get("/adventures/{adventure_id}/kc", response_model=list[AdventureKCStatOut])
-async def get_adventure_kc_stats(adventure_id: str, me=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def get_adventure_kc_stats(adventure_id: str, me=Depends(get_current_session_user), db: AsyncSession = Depends(get_db)):
     try:
         adv_id = uuid.UUID(adventure_id)
     except Exception:
@@ -81,7 +83,7 @@ async def get_adventure_kc_stats(adventure_id: str, me=Depends(get_current_user)
     ]
 
 @router.patch("/adventures/{adventure_id}/kc", response_model=list[AdventureKCStatOut])
-async def upsert_adventure_kc_stats(adventure_id: str, payload: AdventureKCStatPatchIn, me=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def upsert_adventure_kc_stats(adventure_id: str, payload: AdventureKCStatPatchIn, me=Depends(get_current_session_user), db: AsyncSession = Depends(get_db)):
     try:
         adv_id = uuid.UUID(adventure_id)
     except Exception:
@@ -106,7 +108,7 @@ async def upsert_adventure_kc_stats(adventure_id: str, payload: AdventureKCStatP
 # ---------- Adventure Summary ----------
 
 @router.get("/adventures/{adventure_id}/summary", response_model=AdventureSummaryOut)
-async def get_adventure_summary(adventure_id: str, me=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def get_adventure_summary(adventure_id: str, me=Depends(get_current_session_user), db: AsyncSession = Depends(get_db)):
     try:
         adv_id = uuid.UUID(adventure_id)
     except Exception:
@@ -138,7 +140,7 @@ async def get_adventure_summary(adventure_id: str, me=Depends(get_current_user),
 
 
 @router.patch("/adventures/{adventure_id}/summary", response_model=AdventureSummaryOut)
-async def patch_adventure_summary(adventure_id: str, payload: AdventureSummaryPatchIn, me=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def patch_adventure_summary(adventure_id: str, payload: AdventureSummaryPatchIn, me=Depends(get_current_session_user), db: AsyncSession = Depends(get_db)):
     try:
         adv_id = uuid.UUID(adventure_id)
     except Exception:
@@ -170,7 +172,7 @@ async def patch_adventure_summary(adventure_id: str, payload: AdventureSummaryPa
 
 
 @router.get("/history", response_model=list[AdventureSummaryWithIdOut])
-async def list_adventure_history(me=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def list_adventure_history(me=Depends(get_current_session_user), db: AsyncSession = Depends(get_db)):
     q = (
         select(AdventureSummary)
         .join(AdventureSummary.adventure)
@@ -200,4 +202,12 @@ async def list_adventure_history(me=Depends(get_current_user), db: AsyncSession
             total_damage_received=r.total_damage_received,
         )
         for r in rows
-    ]
\ No newline at end of file
+    ]
+
+
+# ---------- BKT ----------
+
+@router.get("/bkt/table", response_model=BKTTableOut)
+async def get_bkt_table(kc_id: int | None = None, me=Depends(get_current_session_user)):
+    """Transition table the server applies, so the client can predict p_know."""
+    return BKTTableOut(kc_id=kc_id, **bkt.export(bkt.params_for_kc(kc_id)))
@@ -1,47 +1,57 @@
 from __future__ import annotations
 
+import logging
 import uuid
 from fastapi import APIRouter, Depends, HTTPException, Header
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, insert
 
-from app.models.user import User
-from app.core.db import get_db
-from app.core.security import get_current_user
-from app.schemas.submission import SubmissionIn, SubmissionOut
+from app.core.config import settings
+from app.core.db import get_db, external_io
+from app.core.security import get_current_session_user
+from app.schemas.submission import SubmissionIn, SubmissionOut, PrecheckIn, PrecheckOut
 from app.crud import adventure as adv_crud
-from app.models.stats import UserKCMastery, AdventureKCStat
-from app.models.adventure import Adventure
-from app.services.grammar_service import check_sentence
-from app.utils.idempotency import ensure_idempotent
-from app.services.mastery import apply_submission_side_effects
+from app.services.grammar_service import check_sentence, schedule_precheck
+from app.utils.idempotency import ensure_idempotent, release_idempotent
+from app.utils.rate_limit import within_quota
+from app.services.mastery import apply_submission_side_effects, apply_practice_submission
+from app.services.event_log import record_submission
 
 router = APIRouter()
+logger = logging.getLogger("submissions")
+
+def _backend_unavailable() -> HTTPException:
+    # The grammar backend was skipped or ran out of budget. Nothing was graded,
+    # so mastery stays untouched and the client should simply retry.
+    return HTTPException(
+        status_code=503,
+        detail="GRAMMAR_BACKEND_UNAVAILABLE",
+        headers={"Retry-After": str(int(settings.T5_BREAKER_OPEN_SECONDS))},
+    )
 
-# BKT parameters
-BKT_GUESS = 0.20
-BKT_SLIP = 0.10
-BKT_LEARN = 0.15
-
-
-def _bkt_update(prior: float, is_correct: bool) -> float:
-    """Return posterior probability using standard BKT."""
-    p = prior
-    if is_correct:
-        numer = p * (1 - BKT_SLIP)
-        denom = numer + (1 - p) * BKT_GUESS
-    else:
-        numer = p * BKT_SLIP
-        denom = numer + (1 - p) * (1 - BKT_GUESS)
-    p_evidence = 0.0 if denom == 0 else numer / denom
-    return min(1.0, max(0.0, p_evidence + (1 - p_evidence) * BKT_LEARN))
 
+@router.post("/precheck", response_model=PrecheckOut, status_code=202)
+async def precheck(
+    payload: PrecheckIn,
+    me = Depends(get_current_session_user),
+):
+    """
+    Speculative grading while the kid is still arranging cards: warms the
+    sentence cache so the real submission is usually a hit. Ack only; no
+    result, no mastery update. Has its own per-user quota.
+    """
+    if len(payload.sentence) > 500:
+        raise HTTPException(status_code=422, detail="Sentence too long")
+    if not await within_quota(
+        f"precheck:{me.id}", settings.PRECHECK_RATE_LIMIT, settings.PRECHECK_RATE_WINDOW_SECONDS
+    ):
+        return PrecheckOut(queued=False)
+    return PrecheckOut(queued=schedule_precheck(payload.sentence, payload.kc_id, payload.tier_id))
 
 
 @router.post("", response_model=SubmissionOut)
 async def submit(
     payload: SubmissionIn,
-    me: User = Depends(get_current_user),
+    me = Depends(get_current_session_user),
     db: AsyncSession = Depends(get_db),
     idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"),
 ):
@@ -56,8 +66,11 @@ async def submit(
     # (This section is unchanged)
     # ─────────────────────────────────────────────
     if payload.is_practice:
-        # Grammar scoring
-        res = await check_sentence(payload.sentence, payload.kc_id)
+        # Grammar scoring (no connection held while the model runs)
+        async with external_io(db, "grammar"):
+            res = await check_sentence(payload.sentence, payload.kc_id, payload.tier_id)
+        if res.get("degraded"):
+            raise _backend_unavailable()
         is_correct = bool(res.get("is_correct", False))
         feedback = list(res.get("feedback", []))
         error_indices = list(res.get("error_indices", []))
@@ -65,57 +78,17 @@ async def submit(
         # Note: sentence_power from res is ignored here, as practice mode
         # doesn't update adventure-level stats.
 
-        # Read existing user-level mastery
-        user_prior = 0.5
-        q = await db.execute(
-            select(UserKCMastery).where(
-                UserKCMastery.user_id == me.id,
-                UserKCMastery.kc_id == payload.kc_id,
-            )
-        )
-        mastery = q.scalar_one_or_none()
-        if mastery:
-            user_prior = mastery.p_know / 100.0
-
-        # Compute updated p_know
-        next_p = _bkt_update(user_prior, is_correct)
-
+        # One UPSERT; the BKT step runs against the locked row
         try:
-            if mastery is None:
-                await db.execute(
-                    insert(UserKCMastery).values(
-                        user_id=me.id,
-                        kc_id=payload.kc_id,
-                        p_know=int(round(next_p * 100)),
-                        correct=1 if is_correct else 0,
-                        incorrect=0 if is_correct else 1,
-                        best_sentence=payload.sentence if is_correct else None,
-                        best_sentence_power=None, # UserKCMastery might not track power, or could use res.get("sentence_power")
-                    )
-                )
-            else:
-                await db.execute(
-                    update(UserKCMastery)
-                    .where(
-                        UserKCMastery.user_id == me.id,
-                        UserKCMastery.kc_id == payload.kc_id,
-                    )
-                    .values(
-                        p_know=int(round(next_p * 100)),
-                        correct=UserKCMastery.correct + (1 if is_correct else 0),
-                        incorrect=UserKCMastery.incorrect + (0 if is_correct else 1),
-                        best_sentence=(
-                            payload.sentence
-                            if is_correct
-                            else UserKCMastery.best_sentence
-                        ),
-                        # best_sentence_power could also be updated here if needed
-                    )
-                )
+            p_know = await apply_practice_submission(
+                db, me.id, payload.kc_id, is_correct, payload.sentence
+            )
             await db.commit()
         except Exception as ex:
             await db.rollback()
+            logger.exception("Practice update failed", extra={"kc_id": payload.kc_id})
             raise HTTPException(status_code=500, detail=f"Practice update failed: {ex}")
+        record_submission(me.id, payload.kc_id, is_correct, p_know=p_know, result=res)
 
         # Adventure p_know stays unused in practice
         return SubmissionOut(
@@ -123,8 +96,9 @@ async def submit(
             error_indices=error_indices,
             feedback=feedback,
             p_know_adventure=0.5,  # irrelevant in practice mode
-            p_know_overall=next_p,
+            p_know_overall=p_know / 100.0,
             from_cache=from_cache,
+            hint=res.get("hint"),
         )
 
     # ─────────────────────────────────────────────
@@ -142,13 +116,21 @@ async def submit(
     if adv.state != "in_progress":
         raise HTTPException(status_code=409, detail="Adventure not active")
 
+    key = None
     if idempotency_key:
-        key = f"submit:{adv.id}:{idempotency_key}"
+        key = f"submit:{adv_id}:{idempotency_key}"
         if not await ensure_idempotent(key):
             raise HTTPException(status_code=409, detail="Duplicate submission")
 
-    # Grammar check
-    res = await check_sentence(payload.sentence, payload.kc_id)
+    # Grammar check: release the connection used for the adventure lookup
+    # first, the mastery write below checks one out again. The rollback
+    # expires `adv`, so only adv_id is used from here on.
+    async with external_io(db, "grammar"):
+        res = await check_sentence(payload.sentence, payload.kc_id, payload.tier_id)
+    if res.get("degraded"):
+        if key:
+            await release_idempotent(key)
+        raise _backend_unavailable()
     is_correct = bool(res.get("is_correct", False))
     feedback = list(res.get("feedback", []))
     error_indices = list(res.get("error_indices", []))
@@ -161,86 +143,32 @@ async def submit(
     # --- END OF FIX ---
 
 
-    # Read priors
-    adv_prior = 0.5
-    user_prior = 0.5
-
-    q1 = await db.execute(
-        select(AdventureKCStat).where(
-            AdventureKCStat.adventure_id == adv.id,
-            AdventureKCStat.kc_id == payload.kc_id,
-        )
-    )
-    adv_stat = q1.scalar_one_or_none()
-    if adv_stat:
-        adv_prior = adv_stat.p_know / 100.0
-
-    q2 = await db.execute(
-        select(UserKCMastery).where(
-            UserKCMastery.user_id == me.id,
-            UserKCMastery.kc_id == payload.kc_id,
-        )
-    )
-    mastery = q2.scalar_one_or_none()
-    if mastery:
-        user_prior = mastery.p_know / 100.0
-
-    # Apply full adventure effects
+    # Mastery rows + adventure counters: one statement, one commit
     try:
-        await apply_submission_side_effects(
+        p_user, p_adv = await apply_submission_side_effects(
             db=db,
             user_id=me.id,
-            adventure_id=adv.id,
+            adventure_id=adv_id,
             kc_id=payload.kc_id,
             is_correct=is_correct,
             best_sentence=payload.sentence,
             best_power=sentence_power,  # <-- Pass the server-calculated power
         )
-
-        # Increment attempt counters
-        if is_correct:
-            await db.execute(
-                update(Adventure)
-                .where(Adventure.id == adv.id)
-                .values(correct_submissions=Adventure.correct_submissions + 1)
-            )
-        else:
-            await db.execute(
-                update(Adventure)
-                .where(Adventure.id == adv.id)
-                .values(incorrect_submissions=Adventure.incorrect_submissions + 1)
-            )
-
         await db.commit()
-        await db.refresh(adv)
     except Exception as ex:
         await db.rollback()
+        logger.exception("Mastery update failed", extra={"kc_id": payload.kc_id})
         raise HTTPException(status_code=500, detail=f"Mastery update failed: {ex}")
-
-    # Re-read final values
-    q1b = await db.execute(
-        select(AdventureKCStat).where(
-            AdventureKCStat.adventure_id == adv.id,
-            AdventureKCStat.kc_id == payload.kc_id,
-        )
+    record_submission(
+        me.id, payload.kc_id, is_correct, adventure_id=adv_id, p_know=p_user, result=res
     )
-    adv_stat = q1b.scalar_one_or_none()
-    q2b = await db.execute(
-        select(UserKCMastery).where(
-            UserKCMastery.user_id == me.id,
-            UserKCMastery.kc_id == payload.kc_id,
-        )
-    )
-    mastery = q2b.scalar_one_or_none()
-
-    p_adv = (adv_stat.p_know / 100.0) if adv_stat else adv_prior
-    p_user = (mastery.p_know / 100.0) if mastery else user_prior
 
     return SubmissionOut(
         is_correct=is_correct,
         error_indices=error_indices,
         feedback=feedback,
-        p_know_adventure=p_adv,
-        p_know_overall=p_user,
+        p_know_adventure=p_adv / 100.0,
+        p_know_overall=p_user / 100.0,
         from_cache=from_cache,
+        hint=res.get("hint"),
     )
\ No newline at end of file
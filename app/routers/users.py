@@ -1,17 +1,21 @@
+import logging
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from app.core.security import get_current_user
+from app.core.security import get_current_user, get_current_user_profile
+from app.core.identity import invalidate_identity
 from app.core.db import get_db
 from app.schemas.user import DisplayNameIn, UserOut, NameAvailabilityOut, UserUpdateIn
 from app.utils.validators import valid_display_name
 from app.crud import user as user_crud
 from app.models.user import User
 
+logger = logging.getLogger("users")
 router = APIRouter()
 
 @router.get("/me", response_model=UserOut)
-async def me_route(me=Depends(get_current_user)):
+async def me_route(me=Depends(get_current_user_profile)):
     return {
         "id": str(me.id),
         "email": me.email,
@@ -48,7 +52,7 @@ async def display_name_availability(name: str, db: AsyncSession = Depends(get_db
 @router.patch("/display-name", response_model=UserOut)
 async def set_display_name(
     payload: DisplayNameIn,
-    me=Depends(get_current_user),
+    me=Depends(get_current_user_profile),
     db: AsyncSession = Depends(get_db),
 ):
     if me.display_name is not None:
@@ -58,20 +62,23 @@ async def set_display_name(
 
     existing = await user_crud.get_by_display_name(db, payload.display_name)
     if existing:
+        logger.info("Display name taken", extra={"user_id": str(me.id)})
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Display name taken")
 
     me = await user_crud.set_display_name(db, me, payload.display_name)
+    logger.info("Display name set", extra={"user_id": str(me.id)})
     return await me_route(me)  # type: ignore
 
 @router.patch("/me", response_model=UserOut)
 async def update_user_me(
     payload: UserUpdateIn,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user = Depends(get_current_user),
 ):
     result = await db.execute(select(User).where(User.id == current_user.id))
     user = result.scalar_one_or_none()
     if not user:
+        logger.warning("Profile update for missing user", extra={"user_id": str(current_user.id)})
         raise HTTPException(status_code=404, detail="User not found")
 
     update_fields = [
@@ -93,13 +100,17 @@ async def update_user_me(
         "powerpedia_unlocked",
         "tutorials_recorded"
     ]
+    changed = []
     for field in update_fields:
         value = getattr(payload, field, None)
         if value is not None:
             setattr(user, field, value)
+            changed.append(field)
 
     await db.commit()
     await db.refresh(user)
+    await invalidate_identity(user.firebase_uid)
+    logger.debug("Profile updated", extra={"user_id": str(user.id), "fields": changed})
 
     return {
         "id": str(user.id),
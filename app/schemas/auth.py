@@ -4,4 +4,10 @@ class SyncOut(BaseModel):
     user_id: str
     email: str
     display_name: str | None
-    first_time_login: bool
\ No newline at end of file
+    first_time_login: bool
+
+class SessionTokenOut(BaseModel):
+    session_token: str
+    token_type: str = "Bearer"
+    expires_at: int
+    user_id: str
@@ -58,4 +58,14 @@ class AdventureSummaryPatchIn(BaseModel):
     enemies_defeated: Optional[int] = None
     best_kc_id: Optional[int] = None
     worst_kc_id: Optional[int] = None
-    best_sentence: Optional[str] = None
\ No newline at end of file
+    best_sentence: Optional[str] = None
+# ---------- BKT ----------
+class BKTTableOut(BaseModel):
+    kc_id: Optional[int] = None
+    slip: float
+    guess: float
+    transit: float
+    prior: int                  # p_know before the first submission
+    version: Optional[str] = None   # fitted parameter table, None = defaults
+    incorrect: List[int]        # incorrect[p_know] -> next p_know
+    correct: List[int]          # correct[p_know] -> next p_know
@@ -5,15 +5,26 @@ class SubmissionIn(BaseModel):
     kc_id: int
     sentence: str
     is_practice: bool = False
+    tier_id: int | None = None
     # for new system
-    # tier_id: int | None = None           # <— add
     # prompt_uid: str | None = None  
 
 
+class PrecheckIn(BaseModel):
+    kc_id: int
+    sentence: str
+    tier_id: int | None = None
+
+
+class PrecheckOut(BaseModel):
+    queued: bool
+
+
 class SubmissionOut(BaseModel):
     is_correct: bool
     error_indices: list[int]
     feedback: list[str]
     p_know_adventure: float
     p_know_overall: float
-    from_cache: bool | None = None
\ No newline at end of file
+    from_cache: bool | None = None
+    hint: str | None = None
\ No newline at end of file
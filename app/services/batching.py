@@ -0,0 +1,165 @@
+# app/services/batching.py
+"""
+Asyncio micro-batcher.
+
+Callers `submit()` single items; a background task collects them for up to
+`window_ms` (or until `max_batch` items are waiting) and hands the whole list
+to `send_batch`, which must return one result per item, in order.
+
+`submit(item, low_priority=True)` puts an item in a separate, smaller lane
+that only fills the room left in a batch once the normal queue is drained,
+so speculative work never delays or displaces real requests.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, Set, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+logger = logging.getLogger("batching")
+
+
+class BatchQueueFull(Exception):
+    pass
+
+
+class MicroBatcher(Generic[T, R]):
+    def __init__(
+        self,
+        send_batch: Callable[[List[T]], Awaitable[List[R]]],
+        *,
+        name: str,
+        max_batch: int = 32,
+        window_ms: float = 10.0,
+        max_queue: int = 1000,
+        max_low_queue: Optional[int] = None,
+        item_timeout: float = 15.0,
+        max_inflight: int = 4,
+    ):
+        self.name = name
+        self._send_batch = send_batch
+        self.max_batch = max(1, max_batch)
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_queue = max(1, max_queue)
+        self.max_low_queue = max(1, self.max_queue // 4 if max_low_queue is None else max_low_queue)
+        self.item_timeout = item_timeout
+        self._inflight = asyncio.Semaphore(max(1, max_inflight))
+        self._full = asyncio.Event()
+        self._ready = asyncio.Event()  # set on every submit, for the low lane
+        self._queue: Optional["asyncio.Queue[Tuple[T, asyncio.Future]]"] = None
+        self._low: Optional["asyncio.Queue[Tuple[T, asyncio.Future]]"] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._flushes: Set[asyncio.Task] = set()
+        self.counters: Dict[str, int] = {
+            "items": 0, "batches": 0, "rejected": 0, "timeouts": 0, "failed_batches": 0,
+            "low_items": 0, "low_rejected": 0,
+        }
+
+    def _ensure_running(self) -> None:
+        if self._runner is None or self._runner.done():
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._low = asyncio.Queue(maxsize=self.max_low_queue)
+            self._runner = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item: T, low_priority: bool = False) -> R:
+        self._ensure_running()
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        lane = self._low if low_priority else self._queue
+        try:
+            lane.put_nowait((item, fut))  # type: ignore[union-attr]
+        except asyncio.QueueFull:
+            self.counters["low_rejected" if low_priority else "rejected"] += 1
+            raise BatchQueueFull(self.name)
+        self._ready.set()
+        if not low_priority and self._queue.qsize() >= self.max_batch:  # type: ignore[union-attr]
+            self._full.set()
+        try:
+            return await asyncio.wait_for(fut, self.item_timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        q, low = self._queue, self._low
+        assert q is not None and low is not None
+        while True:
+            while q.empty() and low.empty():
+                self._ready.clear()
+                await self._ready.wait()
+            if self.window and q.qsize() < self.max_batch:
+                # hold the window open unless a full batch is already waiting
+                self._full.clear()
+                waiter = loop.create_task(self._full.wait())
+                try:
+                    await asyncio.wait({waiter}, timeout=self.window)
+                finally:
+                    waiter.cancel()
+            # built after the window, so late normal items still go first
+            batch: List[Tuple[T, asyncio.Future]] = []
+            while len(batch) < self.max_batch and not q.empty():
+                batch.append(q.get_nowait())
+            while len(batch) < self.max_batch and not low.empty():
+                batch.append(low.get_nowait())
+                self.counters["low_items"] += 1
+            batch = [(i, f) for i, f in batch if not f.done()]  # drop timed-out callers
+            if not batch:
+                continue
+            try:
+                await self._inflight.acquire()
+            except asyncio.CancelledError:
+                # close() while waiting for a slot: this batch is in no queue
+                # any more, so fail it here rather than leave callers hanging
+                for _, f in batch:
+                    if not f.done():
+                        f.set_exception(BatchQueueFull(f"{self.name} closed"))
+                raise
+            task = loop.create_task(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[Tuple[T, asyncio.Future]]) -> None:
+        try:
+            self.counters["batches"] += 1
+            self.counters["items"] += len(batch)
+            try:
+                results = await self._send_batch([i for i, _ in batch])
+                if len(results) != len(batch):
+                    raise ValueError(f"{self.name}: got {len(results)} results for {len(batch)} items")
+            except Exception as exc:
+                self.counters["failed_batches"] += 1
+                logger.warning("%s batch of %d failed: %s", self.name, len(batch), exc)
+                for _, f in batch:
+                    if not f.done():
+                        f.set_exception(exc)
+                return
+            for (_, f), r in zip(batch, results):
+                if not f.done():
+                    f.set_result(r)
+        finally:
+            self._inflight.release()
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = dict(self.counters)
+        out["queue_depth"] = self._queue.qsize() if self._queue else 0
+        out["low_queue_depth"] = self._low.qsize() if self._low else 0
+        out["avg_batch"] = round(out["items"] / out["batches"], 2) if out["batches"] else 0.0
+        return out
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._runner = None
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        for lane in (self._queue, self._low):
+            while lane is not None and not lane.empty():
+                _, f = lane.get_nowait()
+                if not f.done():
+                    f.set_exception(BatchQueueFull(f"{self.name} closed"))
@@ -0,0 +1,126 @@
+# app/services/bkt_fit.py
+"""
+Per-KC BKT parameter fitting by grid search.
+
+The model being fitted is exactly the live one: p_know is an integer 0..100
+stepped through core.bkt's tables, starting from BKT_PRIOR, and a response
+is correct with probability p(1 - slip) + (1 - p) guess. So each candidate
+parameter set also gets a (2, 101) log-likelihood table, and scoring a
+candidate over every learner is the same longest-group-first scan that
+bkt_replay uses, with a batch of candidates advanced side by side.
+
+Search is a coarse grid followed by a few rounds of refinement around the
+best point, halving the step each round.
+"""
+from __future__ import annotations
+from itertools import product
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from app.core import bkt
+from app.services.bkt_replay import transition_array
+
+SLIPS = np.linspace(0.02, 0.40, 6)
+GUESSES = np.linspace(0.02, 0.40, 6)
+TRANSITS = np.linspace(0.02, 0.50, 7)
+_EPS = 1e-6
+
+
+def _valid(p: bkt.BKTParams) -> bool:
+    # slip/guess >= 0.5 lets "knows it" and "doesn't" swap meaning
+    return 0.0 < p.slip < 0.5 and 0.0 < p.guess < 0.5 and 0.0 < p.transit < 1.0
+
+
+def candidates(slips: Iterable[float], guesses: Iterable[float], transits: Iterable[float]) -> List[bkt.BKTParams]:
+    out = {
+        bkt.BKTParams(round(float(s), 4), round(float(g), 4), round(float(t), 4))
+        for s, g, t in product(slips, guesses, transits)
+    }
+    return sorted((p for p in out if _valid(p)), key=lambda p: (p.slip, p.guess, p.transit))
+
+
+def loglik_tables(params: Sequence[bkt.BKTParams]) -> np.ndarray:
+    """(C, 2, 101) float64: log P(outcome | state) per candidate."""
+    p = np.arange(bkt.STATES) / 100.0
+    out = np.empty((len(params), 2, bkt.STATES))
+    for i, c in enumerate(params):
+        correct = np.clip(p * (1 - c.slip) + (1 - p) * c.guess, _EPS, 1 - _EPS)
+        out[i, 1] = np.log(correct)
+        out[i, 0] = np.log1p(-correct)
+    return out
+
+
+def log_likelihood(
+    starts: np.ndarray,
+    lengths: np.ndarray,
+    outcomes: np.ndarray,
+    params: Sequence[bkt.BKTParams],
+    prior: int,
+    batch: int = 16,
+) -> np.ndarray:
+    """Total log-likelihood of all sequences under each candidate, shape (C,)."""
+    total = np.zeros(len(params))
+    if len(starts) == 0 or not params:
+        return total
+    order = np.argsort(-lengths, kind="stable")
+    s_starts, s_len = starts[order], lengths[order]
+    steps = int(s_len[0])
+    active = np.searchsorted(-s_len, -np.arange(steps), side="left")
+    outcomes = outcomes.astype(np.intp)
+
+    for lo in range(0, len(params), batch):
+        chunk = params[lo:lo + batch]
+        table = transition_array(tuple(chunk))
+        ll_table = loglik_tables(chunk)
+        ci = np.arange(len(chunk))[:, None]
+        state = np.full((len(chunk), len(starts)), prior, dtype=np.uint8)
+        ll = np.zeros(len(chunk))
+        for r in range(steps):
+            n = active[r]
+            o = outcomes[s_starts[:n] + r][None, :]
+            st = state[:, :n]
+            ll += ll_table[ci, o, st].sum(axis=1)
+            state[:, :n] = table[ci, o, st]
+        total[lo:lo + len(chunk)] = ll
+    return total
+
+
+def _around(value: float, step: float) -> Tuple[float, float, float]:
+    return value - step, value, value + step
+
+
+def fit(
+    starts: np.ndarray,
+    lengths: np.ndarray,
+    outcomes: np.ndarray,
+    prior: int,
+    refine_rounds: int = 3,
+) -> Tuple[bkt.BKTParams, float, int]:
+    """Returns (best params, its log-likelihood, candidates evaluated)."""
+    grid = candidates(SLIPS, GUESSES, TRANSITS)
+    ll = log_likelihood(starts, lengths, outcomes, grid, prior)
+    best_i = int(np.argmax(ll))
+    best, best_ll = grid[best_i], float(ll[best_i])
+    seen = set(grid)
+
+    steps = [
+        (SLIPS[1] - SLIPS[0]) / 2,
+        (GUESSES[1] - GUESSES[0]) / 2,
+        (TRANSITS[1] - TRANSITS[0]) / 2,
+    ]
+    for _ in range(refine_rounds):
+        grid = [
+            p for p in candidates(
+                _around(best.slip, steps[0]), _around(best.guess, steps[1]), _around(best.transit, steps[2])
+            )
+            if p not in seen
+        ]
+        seen.update(grid)
+        if grid:
+            ll = log_likelihood(starts, lengths, outcomes, grid, prior)
+            i = int(np.argmax(ll))
+            if ll[i] > best_ll:
+                best, best_ll = grid[i], float(ll[i])
+        steps = [s / 2 for s in steps]
+    return best, best_ll, len(seen)
@@ -0,0 +1,143 @@
+# app/services/bkt_replay.py
+"""
+Vectorized BKT replay over the submission_events log.
+
+Events come in as flat NumPy arrays sorted by (user, kc, time). Every
+(user, kc) group is one independent chain of table lookups (core.bkt), so
+instead of walking events one by one we advance all groups together: step r
+applies the r-th event of every group that has one. That's one fancy-index
+per step, and the number of steps is the longest group, not the number of
+events.
+
+Adventure-level stats follow the live rules: a new (adventure, kc) row
+starts from the user's p_know right after that first submission, later
+submissions step it with the same table.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core import bkt
+from app.core.config import settings
+
+
+@dataclass
+class GroupStats:
+    owner: np.ndarray      # user or adventure code per group
+    kc: np.ndarray
+    p_know: np.ndarray     # uint8, 0..100
+    correct: np.ndarray
+    incorrect: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.kc)
+
+
+@dataclass
+class ReplayResult:
+    users: GroupStats
+    adventures: GroupStats
+
+
+def transition_array(params: Tuple[bkt.BKTParams, ...]) -> np.ndarray:
+    """(P, 2, 101) uint8: [param set, outcome, state] -> next state."""
+    return np.array([bkt.table(p) for p in params], dtype=np.uint8).reshape(len(params), 2, bkt.STATES)
+
+
+def group_starts(*keys: np.ndarray) -> np.ndarray:
+    """Start offsets of runs of equal keys (arrays must already be sorted)."""
+    n = len(keys[0])
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    change = np.zeros(n, dtype=bool)
+    change[0] = True
+    for k in keys:
+        change[1:] |= k[1:] != k[:-1]
+    return np.flatnonzero(change)
+
+
+def scan(
+    starts: np.ndarray,
+    lengths: np.ndarray,
+    pidx: np.ndarray,
+    outcomes: np.ndarray,
+    init: np.ndarray,
+    table: np.ndarray,
+    after: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Run every group's outcomes through `table` from `init`. Groups are
+    sorted longest first so the ones still running at step r are a prefix.
+    With `after`, the state after each event is written at its position.
+    """
+    if len(starts) == 0:
+        return init.astype(np.uint8)
+    order = np.argsort(-lengths, kind="stable")
+    s_starts, s_len, s_p = starts[order], lengths[order], pidx[order]
+    state = init.astype(np.uint8)[order]
+    steps = int(s_len[0])
+    active = np.searchsorted(-s_len, -np.arange(steps), side="left")  # groups with len > r
+    for r in range(steps):
+        n = active[r]
+        pos = s_starts[:n] + r
+        state[:n] = table[s_p[:n], outcomes[pos], state[:n]]
+        if after is not None:
+            after[pos] = state[:n]
+    out = np.empty_like(state)
+    out[order] = state
+    return out
+
+
+def _param_index(kc: np.ndarray, params_for: Callable[[int], bkt.BKTParams]):
+    kcs = np.unique(kc)
+    sets: Dict[bkt.BKTParams, int] = {}
+    lut = np.zeros(int(kcs.max()) + 1 if len(kcs) else 1, dtype=np.int32)
+    for k in kcs.tolist():
+        lut[k] = sets.setdefault(params_for(k), len(sets))
+    return lut, tuple(sets)
+
+
+def replay(
+    user: np.ndarray,
+    adventure: np.ndarray,
+    kc: np.ndarray,
+    is_correct: np.ndarray,
+    params_for: Callable[[int], bkt.BKTParams] = bkt.params_for_kc,
+    prior: int | None = None,
+) -> ReplayResult:
+    """
+    user/adventure are integer codes (adventure -1 for practice), all arrays
+    sorted by (user, kc, time). Returns final mastery per (user, kc) and
+    per (adventure, kc).
+    """
+    prior = settings.BKT_PRIOR if prior is None else prior
+    n = len(kc)
+    outcomes = is_correct.astype(np.intp)
+    lut, params = _param_index(kc, params_for)
+    table = transition_array(params) if params else np.zeros((1, 2, bkt.STATES), dtype=np.uint8)
+
+    # ----- user level -----
+    starts = group_starts(user, kc)
+    lengths = np.diff(np.append(starts, n))
+    after = np.empty(n, dtype=np.uint8)
+    p_user = scan(
+        starts, lengths, lut[kc[starts]], outcomes,
+        np.full(len(starts), prior, dtype=np.uint8), table, after,
+    )
+    ok = np.add.reduceat(outcomes, starts) if n else np.zeros(0, dtype=np.intp)
+    users = GroupStats(user[starts], kc[starts], p_user, ok, lengths - ok)
+
+    # ----- adventure level -----
+    idx = np.flatnonzero(adventure >= 0)
+    ev = idx[np.lexsort((idx, kc[idx], adventure[idx]))]  # idx keeps time order
+    a_adv, a_kc, a_out = adventure[ev], kc[ev], outcomes[ev]
+    a_starts = group_starts(a_adv, a_kc)
+    a_len = np.diff(np.append(a_starts, len(ev)))
+    # first submission copies the user's value, the rest are steps
+    p_adv = scan(a_starts + 1, a_len - 1, lut[a_kc[a_starts]], a_out, after[ev[a_starts]], table)
+    a_ok = np.add.reduceat(a_out, a_starts) if len(ev) else np.zeros(0, dtype=np.intp)
+    adventures = GroupStats(a_adv[a_starts], a_kc[a_starts], p_adv, a_ok, a_len - a_ok)
+
+    return ReplayResult(users, adventures)
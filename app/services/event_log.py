@@ -0,0 +1,194 @@
+# app/services/event_log.py
+"""
+Buffered writer for the submission_events log.
+
+The request path only appends a dict to an in-process buffer; a background
+task drains it every EVENT_LOG_FLUSH_SECONDS (or as soon as a batch is full)
+with one multi-row INSERT per batch on its own session. created_at is taken
+when the submission is recorded, not when the batch lands, so replay order
+is the real order.
+
+Events still buffered when a worker dies are lost; the log is for
+re-deriving mastery, not the source of truth for it.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert, text
+
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.models.events import SubmissionEvent
+
+logger = logging.getLogger("event_log")
+
+_buffer: List[Dict[str, Any]] = []
+_wakeup: Optional[asyncio.Event] = None
+_task: Optional[asyncio.Task] = None
+_stopping = False
+_STOP_TIMEOUT_SECONDS = 10.0
+_PARTITION_CHECK_SECONDS = 24 * 60 * 60
+_partitions_checked_at: Optional[float] = None  # time.monotonic()
+_counters: Dict[str, int] = {"recorded": 0, "written": 0, "dropped": 0, "batches": 0, "failed_batches": 0}
+
+
+def record_submission(
+    user_id,
+    kc_id: int,
+    is_correct: bool,
+    *,
+    adventure_id=None,
+    p_know: int | None = None,
+    result: Dict[str, Any] | None = None,
+) -> None:
+    """Queue one event. Never blocks and never raises into the request."""
+    if not settings.EVENT_LOG_ENABLED:
+        return
+    if len(_buffer) >= settings.EVENT_LOG_MAX_BUFFER:
+        _counters["dropped"] += 1
+        return
+    source = (result or {}).get("source")
+    if source == "fallback":
+        backend = settings.GRAMMAR_FALLBACK_BACKEND
+    elif source in ("model", "cache"):
+        # cache keys are scoped to GRAMMAR_BACKEND, so a hit came from it too
+        backend = settings.GRAMMAR_BACKEND
+    else:
+        backend = None
+    _buffer.append({
+        "created_at": datetime.now(timezone.utc),
+        "user_id": user_id,
+        "adventure_id": adventure_id,
+        "kc_id": kc_id,
+        "is_correct": bool(is_correct),
+        "is_practice": adventure_id is None,
+        "p_know": p_know,
+        "source": source,
+        "backend": backend,
+    })
+    _counters["recorded"] += 1
+    _ensure_running()
+    if len(_buffer) >= settings.EVENT_LOG_BATCH_SIZE and _wakeup is not None:
+        _wakeup.set()
+
+
+def _ensure_running() -> None:
+    global _task, _wakeup
+    if _task is None or _task.done():
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # no loop (CLI/sync caller): the next flush_events() picks it up
+        _wakeup = asyncio.Event()
+        _task = loop.create_task(_run())
+
+
+async def _run() -> None:
+    assert _wakeup is not None
+    while not _stopping:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), settings.EVENT_LOG_FLUSH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        await flush_events()
+        await _maybe_ensure_partitions()
+
+
+async def flush_events() -> int:
+    """Write everything buffered so far, one INSERT per batch. Returns rows written."""
+    written = 0
+    while _buffer:
+        batch = _buffer[: settings.EVENT_LOG_BATCH_SIZE]
+        del _buffer[: len(batch)]
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(SubmissionEvent).values(batch))
+                await db.commit()
+        except asyncio.CancelledError:
+            _buffer[:0] = batch  # not committed: keep it for the next flush
+            raise
+        except Exception as exc:
+            _counters["failed_batches"] += 1
+            _counters["dropped"] += len(batch)
+            logger.warning("Dropped %d submission events: %s", len(batch), exc)
+            continue
+        _counters["batches"] += 1
+        _counters["written"] += len(batch)
+        written += len(batch)
+    return written
+
+
+async def stop_event_log() -> None:
+    """Let the flush loop finish its current batch and exit, then drain the rest."""
+    global _task, _stopping
+    _stopping = True
+    if _task is not None:
+        if _wakeup is not None:
+            _wakeup.set()
+        try:
+            # a batch interrupted by the timeout goes back into the buffer
+            await asyncio.wait_for(_task, _STOP_TIMEOUT_SECONDS)
+        except (asyncio.TimeoutError, asyncio.CancelledError, Exception):
+            pass
+        _task = None
+    await flush_events()
+    if _buffer:
+        _counters["dropped"] += len(_buffer)
+        logger.warning("Dropped %d submission events at shutdown", len(_buffer))
+        _buffer.clear()
+
+
+def event_log_stats() -> Dict[str, Any]:
+    return {**_counters, "buffered": len(_buffer)}
+
+
+# ---------------- Partitions ----------------
+
+def _month(d: date, ahead: int) -> date:
+    m = d.month - 1 + ahead
+    return date(d.year + m // 12, m % 12 + 1, 1)
+
+
+async def ensure_partitions(months_ahead: int | None = None) -> None:
+    """
+    Create this month's partition and the next few. Runs at startup and
+    then once a day from the flush loop. Rows outside them go to the
+    DEFAULT partition, so a missed run never loses writes.
+    """
+    global _partitions_checked_at
+    _partitions_checked_at = time.monotonic()
+    ahead = settings.EVENT_LOG_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    today = datetime.now(timezone.utc).date()
+    async with AsyncSessionLocal() as db:
+        for i in range(ahead + 1):
+            start, end = _month(today, i), _month(today, i + 1)
+            name = f"submission_events_{start:%Y%m}"
+            try:
+                await db.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF submission_events "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                ))
+                await db.commit()
+            except Exception as exc:
+                # e.g. the DEFAULT partition already holds rows for that month
+                await db.rollback()
+                logger.warning("Could not create partition %s: %s", name, exc)
+
+
+async def _maybe_ensure_partitions() -> None:
+    # long-lived workers must keep creating months ahead, or rows end up in
+    # DEFAULT and that month's partition can no longer be attached
+    if (
+        _partitions_checked_at is not None
+        and time.monotonic() - _partitions_checked_at < _PARTITION_CHECK_SECONDS
+    ):
+        return
+    try:
+        await ensure_partitions()
+    except Exception as exc:
+        logger.warning("Partition check failed: %s", exc)
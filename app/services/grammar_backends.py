@@ -0,0 +1,265 @@
+# app/services/grammar_backends.py
+"""
+Grammar backends behind one interface.
+
+Every backend takes a sentence and answers in the Sapling/T5 shape
+({"edits": [...]} or {"error": "..."}), so grammar_service doesn't care
+which one produced it. Pick them with GRAMMAR_BACKEND and
+GRAMMAR_FALLBACK_BACKEND; new ones are added with @register("name").
+"""
+from __future__ import annotations
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Protocol
+
+from app.core.config import settings
+from app.core.http import get_http_client
+from app.services import rules_engine
+from app.services.batching import BatchQueueFull, MicroBatcher
+
+logger = logging.getLogger("grammar_backends")
+
+
+class GrammarBackend(Protocol):
+    name: str
+    version: str  # bump when verdicts change; part of the sentence cache key
+
+    async def check(self, sentence: str, low_priority: bool = False) -> Dict[str, Any]:
+        """
+        Never raises; failures come back as {"error": ...}. low_priority work
+        (pre-checks) yields to everything else and is dropped when busy.
+        """
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+    async def close(self) -> None:
+        ...
+
+
+_REGISTRY: Dict[str, Callable[[], GrammarBackend]] = {}
+_instances: Dict[str, GrammarBackend] = {}
+
+
+def register(name: str):
+    def deco(factory: Callable[[], GrammarBackend]):
+        _REGISTRY[name] = factory
+        return factory
+    return deco
+
+
+def get_backend(name: str) -> GrammarBackend:
+    backend = _instances.get(name)
+    if backend is None:
+        if name not in _REGISTRY:
+            raise ValueError(f"Unknown grammar backend {name!r}; known: {sorted(_REGISTRY)}")
+        backend = _instances[name] = _REGISTRY[name]()
+    return backend
+
+
+def backends_stats() -> Dict[str, Any]:
+    return {name: b.stats() for name, b in _instances.items()}
+
+
+async def close_backends() -> None:
+    for backend in list(_instances.values()):
+        try:
+            await backend.close()
+        except Exception as e:
+            logger.warning("Closing backend %s failed: %s", backend.name, e)
+    _instances.clear()
+
+
+# ---------------- T5 (remote) ----------------
+@register("t5")
+class T5Backend:
+    name = "t5"
+    version = settings.T5_MODEL_VERSION
+
+    def __init__(self) -> None:
+        self._batcher: Optional[MicroBatcher[str, Dict[str, Any]]] = (
+            MicroBatcher(
+                self._send_batch,
+                name="t5",
+                max_batch=settings.T5_BATCH_MAX_SIZE,
+                window_ms=settings.T5_BATCH_WINDOW_MS,
+                max_queue=settings.T5_BATCH_MAX_QUEUE,
+                item_timeout=settings.T5_READ_TIMEOUT,
+                max_inflight=settings.T5_BATCH_MAX_INFLIGHT,
+            )
+            if settings.T5_BATCH_API_URL
+            else None
+        )
+
+    async def _single(self, sentence: str) -> Dict[str, Any]:
+        try:
+            resp = await get_http_client().post(
+                settings.T5_API_URL,
+                json={
+                    "key": settings.T5_API_KEY,
+                    "text": sentence,
+                    "session_id": "grammar_heroes",
+                },
+            )
+            if resp.status_code < 300:
+                return resp.json()
+            logger.error("T5 error %s: %s", resp.status_code, resp.text[:200])
+            return {"error": "T5 error"}
+        except Exception as e:
+            logger.exception("T5 check failed: %s", e)
+            return {"error": f"T5 check failed: {e}"}
+
+    async def _send_batch(self, sentences: List[str]) -> List[Dict[str, Any]]:
+        """
+        One request for many sentences. The batch endpoint takes
+        {"texts": [...]} and answers {"results": [...]}, one single-sentence
+        response per text, in order.
+        """
+        resp = await get_http_client().post(
+            settings.T5_BATCH_API_URL,
+            json={
+                "key": settings.T5_API_KEY,
+                "texts": sentences,
+                "session_id": "grammar_heroes",
+            },
+        )
+        if resp.status_code >= 300:
+            raise RuntimeError(f"T5 batch error {resp.status_code}: {resp.text[:200]}")
+        return list(resp.json().get("results", []))
+
+    async def check(self, sentence: str, low_priority: bool = False) -> Dict[str, Any]:
+        if self._batcher is None:
+            return await self._single(sentence)
+        try:
+            return await self._batcher.submit(sentence, low_priority)
+        except BatchQueueFull:
+            if low_priority:
+                return {"error": "T5 busy"}
+            # batch queue is saturated; don't make this caller wait behind it
+            return await self._single(sentence)
+        except asyncio.TimeoutError:
+            logger.error("T5 batch item timed out")
+            return {"error": "T5 timeout"}
+        except Exception as e:
+            return {"error": f"T5 check failed: {e}"}
+
+    def queue_depth_ratio(self) -> float:
+        if self._batcher is None:
+            return 0.0
+        return self._batcher.stats()["queue_depth"] / self._batcher.max_queue
+
+    def stats(self) -> Dict[str, Any]:
+        return {"batching": self._batcher.stats() if self._batcher else None}
+
+    async def close(self) -> None:
+        if self._batcher is not None:
+            await self._batcher.close()
+
+
+# ---------------- GrammarBot (remote) ----------------
+def _grammarbot_error_type(rule_id: str) -> str:
+    if "MORFOLOGIK" in rule_id or "SPELL" in rule_id:
+        return "R:SPELL"
+    if "PUNCT" in rule_id:
+        return "R:PUNCT"
+    if "NON3PRS_VERB" in rule_id or "VERB_SVA" in rule_id or "SUBJ_VERB_AGR" in rule_id:
+        return "R:VERB:SVA"
+    if "EN_A_VS_AN" in rule_id:
+        return "R:DET:ART"
+    return f"R:{rule_id}"  # unknown rules fall back to the default message
+
+
+@register("grammarbot")
+class GrammarBotBackend:
+    name = "grammarbot"
+    version = settings.GRAMMARBOT_VERSION
+
+    async def check(self, sentence: str, low_priority: bool = False) -> Dict[str, Any]:
+        if not settings.GRAMMARBOT_API_KEY:
+            return {"error": "GrammarBot is not configured"}
+        try:
+            resp = await get_http_client().post(
+                settings.GRAMMARBOT_API_URL,
+                # GrammarBot takes form data, not JSON
+                data={"text": sentence, "language": "en-US"},
+                headers={
+                    "x-rapidapi-key": settings.GRAMMARBOT_API_KEY,
+                    "x-rapidapi-host": settings.GRAMMARBOT_API_HOST,
+                },
+            )
+            if resp.status_code >= 300:
+                logger.error("GrammarBot error %s: %s", resp.status_code, resp.text[:200])
+                return {"error": "GrammarBot error"}
+            edits = []
+            for match in resp.json().get("matches", []):
+                start = match.get("offset", 0)
+                edits.append({
+                    "start": start,
+                    "end": start + match.get("length", 0),
+                    "error_type": _grammarbot_error_type(match.get("rule", {}).get("id", "OTHER")),
+                    "replacements": [r["value"] for r in match.get("replacements", []) if "value" in r],
+                })
+            return {"edits": edits}
+        except Exception as e:
+            logger.exception("GrammarBot check failed: %s", e)
+            return {"error": f"GrammarBot check failed: {e}"}
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    async def close(self) -> None:
+        pass
+
+
+# ---------------- Rules (local CPU) ----------------
+@register("rules")
+class RulesBackend:
+    """
+    app.services.rules_engine in a process pool. Sentences are micro-batched
+    so one pool task grades many of them, and the event loop only ever
+    awaits the future.
+    """
+    name = "rules"
+    version = rules_engine.RULES_VERSION
+
+    def __init__(self) -> None:
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._batcher: MicroBatcher[str, Dict[str, Any]] = MicroBatcher(
+            self._send_batch,
+            name="rules",
+            max_batch=settings.RULES_BATCH_MAX_SIZE,
+            window_ms=settings.RULES_BATCH_WINDOW_MS,
+            max_queue=settings.RULES_BATCH_MAX_QUEUE,
+            item_timeout=settings.GRAMMAR_BUDGET_SECONDS,
+            max_inflight=settings.RULES_BACKEND_WORKERS,
+        )
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=settings.RULES_BACKEND_WORKERS)
+        return self._pool
+
+    async def _send_batch(self, sentences: List[str]) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor(), rules_engine.check_many, sentences)
+
+    async def check(self, sentence: str, low_priority: bool = False) -> Dict[str, Any]:
+        try:
+            return await self._batcher.submit(sentence, low_priority)
+        except BatchQueueFull:
+            return {"error": "Rules backend busy"}
+        except asyncio.TimeoutError:
+            return {"error": "Rules backend timeout"}
+        except Exception as e:
+            return {"error": f"Rules check failed: {e}"}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"batching": self._batcher.stats(), "workers": settings.RULES_BACKEND_WORKERS}
+
+    async def close(self) -> None:
+        await self._batcher.close()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -1,95 +1,139 @@
+import asyncio
 import logging
 import re
-from typing import Dict, List, Optional, Any
-
-import httpx
-
-from app.utils.normalize import normalize_sentence
-from app.utils.redis_cache import get_sentence_cache, set_sentence_cache
+import time
+from typing import Dict, List, Optional, Any, Set, Tuple
+
+from app.services import kc_answer_bank
+from app.services.grammar_backends import GrammarBackend, get_backend
+from app.services.resilience import CLOSED, CircuitBreaker, LatencyTracker, hedged
+from app.services.shadow import maybe_shadow
+from app.utils.error_codes import ERROR_FRIENDLY, DEFAULT_FRIENDLY
+from app.utils.normalize import canonicalize, remap_span
+from app.utils.redis_cache import (
+    get_sentence_cache, set_sentence_cache,
+    acquire_sentence_lock, release_sentence_lock, wait_for_sentence_cache,
+    STATUS_OK, STATUS_ERROR,
+)
 from app.core.config import settings
 
 
 logger = logging.getLogger("grammar_cache")
 
-T5_API_URL = settings.T5_API_URL
-T5_API_KEY = settings.T5_API_KEY
-
-# ---------------- Kid-Friendly Error Messages ----------------
-ERROR_FRIENDLY: Dict[str, str] = {
-
-    "M:PART": "A word is missing.",
-    "M:PUNCT": "You forgot punctuation.",
-    "M:CONJ": "A joining word is missing.",
-    "M:DET": "A helper word is missing.",
-    "M:DET:ART": "You need a, an, or the.",
-    "M:PREP": "A place word is missing.",
-    "M:PRON": "A name word is missing.",
-    "M:VERB": "An action word is missing.",
-    "M:ADJ": "A describing word is missing.",
-    "M:NOUN": "A thing word is missing.",
-    "M:NOUN:POSS": "You need 's here.",
-    "M:OTHER": "Something is missing.",
-
-    "R:PART": "This word doesn’t fit.",
-    "R:PUNCT": "The punctuation needs fixing.",
-    "R:ORTH": "This spelling looks wrong.",
-    "R:SPELL": "Spelling mistake here.",
-    "R:WO": "Words are in the wrong order.",
-    "R:MORPH": "This word sounds wrong.",
-    "R:ADV": "Use a word ending in -ly.",
-    "R:CONTR": "The shortened word is wrong.",
-    "R:CONJ": "The joining word is wrong.",
-    "R:DET": "The helper word is wrong.",
-    "R:DET:ART": "Use a, an, or the correctly.",
-    "R:PREP": "The place word is wrong.",
-    "R:PRON": "The name word is wrong.",
-    "R:VERB:FORM": "The action word needs changing.",
-    "R:VERB:TENSE": "The time of the action is wrong.",
-    "R:VERB:SVA": "This verb doesn’t match the subject.",
-    "R:ADJ:FORM": "The describing word needs fixing.",
-    "R:NOUN:INFL": "The plural is wrong.",
-    "R:NOUN:NUM": "The number word is wrong.",
-    "R:OTHER": "This part needs fixing.",
-
-    "U:PART": "There’s an extra word.",
-    "U:PUNCT": "There’s extra punctuation.",
-    "U:ADV": "There’s an extra -ly word.",
-    "U:CONTR": "There’s an extra shortened word.",
-    "U:CONJ": "There’s an extra joining word.",
-    "U:DET": "There’s an extra helper word.",
-    "U:DET:ART": "There’s an extra a, an, or the.",
-    "U:PREP": "There’s an extra place word.",
-    "U:PRON": "There’s an extra name word.",
-    "U:VERB": "There’s an extra action word.",
-    "U:ADJ": "There’s an extra describing word.",
-    "U:NOUN": "There’s an extra thing word.",
-    "U:NOUN:POSS": "There’s an extra 's.",
-    "U:OTHER": "There’s something extra here.",
+# canonical sentence -> grading in flight in this worker
+_inflight: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+_inflight_low: Set[str] = set()  # ...of which these are pre-checks
+
+
+# ---------------- Backends ----------------
+# The primary backend sits behind the breaker/budget/hedging below; the
+# optional fallback (typically the local "rules" backend) answers when the
+# primary can't.
+_backend: GrammarBackend = get_backend(settings.GRAMMAR_BACKEND)
+_fallback: Optional[GrammarBackend] = (
+    get_backend(settings.GRAMMAR_FALLBACK_BACKEND) if settings.GRAMMAR_FALLBACK_BACKEND else None
+)
+
+
+# ---------------- Resilience ----------------
+# What check_sentence gets when the backend is skipped (breaker open) or the
+# latency budget runs out. Never cached; routers turn it into a 503.
+DEGRADED_RESULT: Dict[str, Any] = {"error": "GRAMMAR_BACKEND_UNAVAILABLE", "degraded": True}
+
+_breaker = CircuitBreaker(
+    settings.GRAMMAR_BACKEND,
+    failure_rate=settings.T5_BREAKER_FAILURE_RATE,
+    slow_call_seconds=settings.T5_BREAKER_SLOW_CALL_SECONDS,
+    min_calls=settings.T5_BREAKER_MIN_CALLS,
+    window=settings.T5_BREAKER_WINDOW,
+    open_seconds=settings.T5_BREAKER_OPEN_SECONDS,
+)
+_latency = LatencyTracker()
+_backend_counters: Dict[str, int] = {
+    "calls": 0, "hedged": 0, "budget_exceeded": 0, "short_circuited": 0, "fallback": 0,
 }
 
-DEFAULT_FRIENDLY = "Something needs fixing."
+
+def _backend_ok(data: Dict[str, Any]) -> bool:
+    return bool(data) and "error" not in data
+
+
+def _hedge_delay() -> Optional[float]:
+    if not settings.T5_HEDGE_ENABLED or len(_latency) < 20:
+        return None
+    p95 = _latency.percentile(95) or 0.0
+    return max(p95, settings.T5_HEDGE_MIN_DELAY_MS / 1000.0)
 
 
-# ---------------- T5 API Call ----------------
-async def _t5_check(sentence: str) -> Dict[str, Any]:
-    """Calls the external grammar model."""
+async def _backend_guarded(sentence: str) -> Dict[str, Any]:
+    """Primary backend behind the circuit breaker, latency budget and hedging."""
+    if not _breaker.allow():
+        _backend_counters["short_circuited"] += 1
+        return dict(DEGRADED_RESULT)
+
+    _backend_counters["calls"] += 1
+    start = time.monotonic()
+    try:
+        data, was_hedged = await asyncio.wait_for(
+            hedged(lambda: _backend.check(sentence), _hedge_delay(), _backend_ok),
+            settings.GRAMMAR_BUDGET_SECONDS,
+        )
+    except asyncio.TimeoutError:
+        _backend_counters["budget_exceeded"] += 1
+        _breaker.record(False, time.monotonic() - start)
+        return dict(DEGRADED_RESULT)
+    except BaseException:
+        # cancelled: still settle the breaker so a half-open trial can't stick
+        _breaker.record(False, time.monotonic() - start)
+        raise
+
+    elapsed = time.monotonic() - start
+    ok = _backend_ok(data)
+    _breaker.record(ok, elapsed)
+    if ok:
+        _latency.add(elapsed)
+    if was_hedged:
+        _backend_counters["hedged"] += 1
+    return data
+
+
+async def _backend_low_priority(sentence: str) -> Dict[str, Any]:
+    """
+    Pre-checks: the backend's low-priority lane, no hedging, and outside the
+    breaker and latency stats, so optional load can neither trip the breaker
+    nor take a half-open trial slot from a real submission.
+    """
+    if _breaker.state != CLOSED:
+        return dict(DEGRADED_RESULT)
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.post(
-                T5_API_URL,
-                json={
-                    "key": T5_API_KEY,
-                    "text": sentence,
-                    "session_id": "grammar_heroes",
-                },
-            )
-            if resp.status_code < 300:
-                return resp.json()
-            logger.error("T5 error %s: %s", resp.status_code, resp.text)
-            return {"error": "T5 error"}
-    except Exception as e:
-        logger.exception("T5 check failed: %s", e)
-        return {"error": f"T5 check failed: {e}"}
+        return await asyncio.wait_for(
+            _backend.check(sentence, low_priority=True), settings.GRAMMAR_BUDGET_SECONDS
+        )
+    except asyncio.TimeoutError:
+        return dict(DEGRADED_RESULT)
+
+
+async def _backend_check(sentence: str, low_priority: bool = False) -> Dict[str, Any]:
+    if low_priority:
+        return await _backend_low_priority(sentence)  # fallback verdicts aren't cached anyway
+    data = await _backend_guarded(sentence)
+    if "error" in data and _fallback is not None:
+        fb = await _fallback.check(sentence)
+        if "error" not in fb:
+            _backend_counters["fallback"] += 1
+            return {**fb, "fallback": True}
+    return data
+
+
+def resilience_stats() -> Dict[str, Any]:
+    p50, p95, p99 = (_latency.percentile(p) for p in (50, 95, 99))
+    return {
+        **_backend_counters,
+        "breaker": _breaker.stats(),
+        "latency_p50": p50,
+        "latency_p95": p95,
+        "latency_p99": p99,
+    }
 
 
 # ---------------- Feedback Extraction ----------------
@@ -134,496 +178,254 @@ def _is_correct(data: Dict[str, Any]) -> bool:
 
 
 # ---------------- Public Entry ----------------
-async def check_sentence(
+def _bank_result(sentence: str, answer: "kc_answer_bank.Answer") -> Dict[str, Any]:
+    """A submission that is a known-correct bank answer: no cache, no model."""
+    return {
+        "is_correct": True,
+        "error_indices": [],
+        "feedback": [],
+        "scores": {"t5_edits": 0},
+        "sentence_power": len(sentence),
+        "candidates": [],
+        "best_candidate": answer.text,
+        "from_cache": True,
+        "source": "bank",
+    }
+
+
+def _respond(
     sentence: str,
-    kc_id: Optional[int] = None,
-    tier_id: Optional[int] = None,
+    spans: List[Tuple[int, int]],
+    verdict: Dict[str, Any],
+    from_cache: bool,
 ) -> Dict[str, Any]:
-    """Main API: caching, model call, result shaping."""
-    normalized = normalize_sentence(sentence)
-    cached = await get_sentence_cache(normalized, kc_id)
-
-    if cached:
-        logger.info("[CACHE HIT] %s", normalized)
-        cached["from_cache"] = True
-        
-        # Ensure 'sentence_power' exists for older cache entries,
-        # otherwise default to None or recalculate.
-        if "sentence_power" not in cached:
-             # Simple recalculation to be safe
-             cached_correct = cached.get("is_correct", False)
-             cached["sentence_power"] = len(cached.get("best_candidate", "")) if cached_correct else None
-
-        return cached
-
-    t5_response = await _t5_check(sentence)
-
-    feedback = _extract_feedback(t5_response)
-    correct = _is_correct(t5_response)
-    edits = t5_response.get("edits", []) if t5_response else []
-    indices = _extract_error_indices(sentence, edits)
-
-    # --- NEW LOGIC ---
-    # Define "power" here.
-    # We only care about the power if the sentence is correct.
-    sentence_power: Optional[int] = None
-    if correct:
-        sentence_power = len(sentence)
-    # --- END NEW LOGIC ---
+    """
+    Builds the per-submission result from a verdict on the canonical form.
+    Edit offsets are mapped back onto the submitted string, so error_indices
+    refer to the tokens the player actually typed.
+    """
+    flat = verdict.get("spans") or []
+    edits = [
+        dict(zip(("start", "end"), remap_span(spans, flat[i], flat[i + 1], len(sentence))))
+        for i in range(0, len(flat) - 1, 2)
+    ]
+    correct = bool(verdict.get("is_correct", False))
 
     result = {
         "is_correct": correct,
-        "error_indices": indices,
-        "feedback": feedback,
-        "scores": {"t5_edits": len(edits)},
-        "sentence_power": sentence_power,  # <-- ADDED FIELD
+        "error_indices": _extract_error_indices(sentence, edits),
+        "feedback": list(verdict.get("feedback", [])),
+        "scores": dict(verdict.get("scores") or {"t5_edits": len(edits)}),
+        # We only care about the power if the sentence is correct.
+        "sentence_power": len(sentence) if correct else None,
         "candidates": [],
-        "best_candidate": sentence,  # placeholder until KC bank returns
-        "from_cache": False,
+        "best_candidate": sentence,  # replaced by the nearest bank answer if wrong
+        "from_cache": from_cache,
+        "source": "cache" if from_cache else ("fallback" if verdict.get("fallback") else "model"),
     }
+    if verdict.get("degraded") or verdict.get("status") == STATUS_ERROR:
+        result["degraded"] = True  # nothing was graded (live or negative-cached)
+    return result
+
 
-    # The new 'sentence_power' field will now be saved in the cache
-    await set_sentence_cache(normalized, kc_id, result)
+async def grade_uncached(canonical: str, low_priority: bool = False) -> Dict[str, Any]:
+    """One backend grading of a canonical sentence -> verdict. No cache, no lock."""
+    start = time.monotonic()
+    response = await _backend_check(canonical, low_priority)
+    if "error" not in response and not response.get("fallback") and not low_priority:
+        maybe_shadow(canonical, response, time.monotonic() - start)
+
+    edits = response.get("edits", []) if response else []
+    verdict: Dict[str, Any] = {
+        "is_correct": _is_correct(response),
+        # edit offsets in canonical coordinates, flattened [s0, e0, s1, e1, ...]
+        "spans": [int(x) for e in edits for x in (e.get("start", 0), e.get("end", 0))],
+        "feedback": _extract_feedback(response),
+        "scores": {"t5_edits": len(edits)},
+    }
+    if response.get("fallback"):
+        verdict["fallback"] = True  # good enough to answer with, not to cache
+    if "error" in response:
+        # Nothing was graded: never let an outage look like a wrong answer.
+        verdict["degraded"] = True
+        if response.get("degraded"):
+            verdict["skipped"] = True  # breaker open / over budget: don't even negative-cache
+    return verdict
+
+
+async def _grade(
+    canonical: str, refresh: bool = False, ttl_days: int = 30, low_priority: bool = False
+) -> Dict[str, Any]:
+    """
+    Model call + verdict + cache write, at most once across workers.
+    With `refresh` (stale-while-revalidate) a failure leaves the old entry alone.
+    `low_priority` (pre-check) takes no lock, so a real submission never waits
+    on it, and caches nothing but a good verdict.
+    """
+    token = None
+    if not low_priority:
+        token = await acquire_sentence_lock(canonical, settings.GRAMMAR_BUDGET_SECONDS + 1)
+        if token is None:
+            # Another worker/instance is grading this sentence right now.
+            done = await wait_for_sentence_cache(canonical, settings.SENTENCE_LOCK_WAIT_SECONDS)
+            if done:
+                return done
+
+    try:
+        verdict = await grade_uncached(canonical, low_priority)
+
+        if verdict.get("fallback"):
+            return verdict
+        if verdict.get("degraded"):
+            if verdict.pop("skipped", False) or refresh or low_priority:
+                return verdict  # breaker/budget already throttle; keep stale entry
+            await set_sentence_cache(canonical, verdict, status=STATUS_ERROR)
+            return verdict
+
+        await set_sentence_cache(canonical, verdict, ttl_days=ttl_days)
+        return verdict
+    finally:
+        if token is not None:
+            await release_sentence_lock(canonical, token)
+
+
+async def check_sentence(
+    sentence: str,
+    kc_id: Optional[int] = None,
+    tier_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Main API: answer bank, caching, model call, result shaping."""
+    canonical, spans = canonicalize(sentence)
+    if kc_id is not None:
+        answer = kc_answer_bank.match(kc_id, canonical, tier_id)
+        if answer is not None:
+            return _bank_result(sentence, answer)
+
+    cached = await get_sentence_cache(canonical)
+
+    if cached:
+        logger.debug("[CACHE HIT] %s", canonical)
+        age = time.time() - cached.get("cached_at", 0)
+        if (
+            cached.get("status") == STATUS_OK
+            and age > settings.SENTENCE_CACHE_REFRESH_AFTER_SECONDS
+            and _breaker.state == CLOSED
+        ):
+            # serve the stale verdict now, re-grade in the background
+            _start_grading(canonical, refresh=True)
+        verdict, from_cache = cached, True
+    else:
+        verdict, from_cache = await asyncio.shield(_start_grading(canonical)), False
+
+    result = _respond(sentence, spans, verdict, from_cache)
+    if kc_id is not None and not result["is_correct"] and not result.get("degraded"):
+        near = kc_answer_bank.nearest(kc_id, sentence, tier_id, k=3)
+        if near:
+            result["candidates"] = [a.text for a in near]
+            result["best_candidate"] = near[0].text
+            result["hint"] = kc_answer_bank.hint_for(sentence, near[0])
     return result
 
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# # import logging
-# # import json
-# # import re
-# # from typing import Dict, List, Optional, Any
-# # import google.generativeai as genai
-# # from google.ai.generativelanguage_v1beta.types import content
-
-# # from app.utils.normalize import normalize_sentence
-# # from app.utils.redis_cache import get_sentence_cache, set_sentence_cache
-# # from app.core.config import settings
-
-# # logger = logging.getLogger("grammar_cache")
-
-# # # Configure Gemini
-# # genai.configure(api_key=settings.GEMINI_API_KEY)
-
-# # # Use Flash for speed and low latency in a gaming context
-# # MODEL_NAME = "gemini-2.5-flash"
-# # generation_config = {
-# #     "temperature": 0.3,
-# #     "response_mime_type": "application/json",
-# # }
-
-# # model = genai.GenerativeModel(
-# #     model_name=MODEL_NAME,
-# #     generation_config=generation_config,
-# #     system_instruction=(
-# #         "You are a friendly, encouraging elementary school English teacher grading a game "
-# #         "where kids rearrange word cards to form sentences. "
-# #         "Your feedback must be short, simple, and use kid-friendly language (avoid technical grammar terms like 'preposition' or 'auxiliary'). "
-# #         "If the sentence is wrong, gently guide them to the specific error without giving away the full answer immediately."
-# #     )
-# # )
-
-# # async def _gemini_check(sentence: str) -> Dict[str, Any]:
-# #     """Calls Gemini to check grammar and generate kid-friendly feedback."""
-    
-# #     # Pre-tokenize so Gemini refers to the exact same indices your frontend uses
-# #     tokens = [t.group() for t in re.finditer(r"\S+", sentence)]
-# #     token_map = {i: word for i, word in enumerate(tokens)}
-
-# #     prompt = f"""
-# #     Analyze this student sentence constructed from word cards: "{sentence}"
-    
-# #     The word tokens are indexed as follows: {json.dumps(token_map)}
-
-# #     Task:
-# #     1. Is it grammatically correct English? (true/false)
-# #     2. Identify the indices (0-based) of words that are in the wrong place, incorrect, or extra.
-# #     3. Provide ONE short, encouraging, kid-friendly feedback message (max 15 words).
-# #        - BAD feedback: "Missing auxiliary verb."
-# #        - GOOD feedback: "You need a helper word like 'is' here!"
-# #        - GOOD feedback: "Oops! The action word is in the wrong spot."
-
-# #     Respond EXACTLY in this JSON structure:
-# #     {{
-# #         "is_correct": boolean,
-# #         "error_indices": [int], 
-# #         "feedback": "string",
-# #         "corrected_sentence": "string"
-# #     }}
-# #     """
-
-# #     try:
-# #         # Use async generate_content if your wrapping infrastructure supports it, 
-# #         # otherwise standard sync call is okay for low-traffic prototypes.
-# #         # For true async in FastAPI, run this in a threadpool or use Gemini's async client if available in latest versions.
-# #         response = await model.generate_content_async(prompt)
-# #         result = json.loads(response.text)
-# #         return result
-# #     except Exception as e:
-# #         logger.exception("Gemini check failed: %s", e)
-# #         # Fallback safe response so the game doesn't crash
-# #         return {
-# #             "is_correct": False,
-# #             "error_indices": [],
-# #             "feedback": "Something went wrong, try again!",
-# #             "corrected_sentence": sentence
-# #         }
-
-# # # ---------------- Public Entry ----------------
-# # async def check_sentence(
-# #     sentence: str,
-# #     kc_id: Optional[int] = None,
-# #     tier_id: Optional[int] = None,
-# # ) -> Dict[str, Any]:
-# #     """Main API: caching, model call, result shaping."""
-# #     normalized = normalize_sentence(sentence)
-# #     cached = await get_sentence_cache(normalized, kc_id)
-
-# #     if cached:
-# #         logger.info("[CACHE HIT] %s", normalized)
-# #         cached["from_cache"] = True
-# #         return cached
-
-# #     # Call Gemini instead of T5
-# #     gemini_response = await _gemini_check(sentence)
-
-# #     # Shape result to match your frontend's expected contract
-# #     result = {
-# #         "is_correct": gemini_response.get("is_correct", False),
-# #         "error_indices": gemini_response.get("error_indices", []),
-# #         # Ensure feedback is always a list to match old T5 implementation if needed by frontend
-# #         "feedback": [gemini_response.get("feedback", "Try again!")], 
-# #         "scores": {
-# #             # You can ask Gemini for a confidence score if you want, 
-# #             # for now we just use 0 or 1 based on correctness
-# #              "correctness": 1.0 if gemini_response.get("is_correct") else 0.0
-# #         },
-# #         "candidates": [], 
-# #         "best_candidate": gemini_response.get("corrected_sentence", sentence),
-# #         "from_cache": False,
-# #     }
-
-# #     await set_sentence_cache(normalized, kc_id, result)
-# #     return result
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-# #------------------------------------------------------------------------------------------------------------
-
-# import logging
-# import re
-# from typing import Dict, List, Optional, Any
-
-# import httpx
-
-# from app.utils.normalize import normalize_sentence
-# from app.utils.redis_cache import get_sentence_cache, set_sentence_cache
-# from app.core.config import settings
-
-
-# logger = logging.getLogger("grammar_cache")
-
-# # T5_API_URL = settings.T5_API_URL
-# # T5_API_KEY = settings.T5_API_KEY
-
-# # --- START: CORRECTED GRAMMARBOT SETTINGS ---
-# # These values now match your working curl command.
-# GRAMMARBOT_API_URL = "https://grammarbot.p.rapidapi.com/check"
-# GRAMMARBOT_API_HOST = "grammarbot.p.rapidapi.com" # <-- This was the main error
-# GRAMMARBOT_API_KEY = "c0ca6cfb8dmsh971fa50f4c6cba8p1cfef5jsn22529c6f1678" # <-- This is your new, working key
-# # --- END: CORRECTED GRAMMARBOT SETTINGS ---
-
-
-# # ---------------- Kid-Friendly Error Messages ----------------
-# # This list is kept as-is, as our adapter will feed it the error codes it expects.
-# ERROR_FRIENDLY: Dict[str, str] = {
-#     "M:PART": "A word is missing.",
-#     "M:PUNCT": "You forgot punctuation.",
-#     "M:CONJ": "A joining word is missing.",
-#     "M:DET": "A helper word is missing.",
-#     "M:DET:ART": "You need a, an, or the.",
-#     "M:PREP": "A place word is missing.",
-#     "M:PRON": "A name word is missing.",
-#     "M:VERB": "An action word is missing.",
-#     "M:ADJ": "A describing word is missing.",
-#     "M:NOUN": "A thing word is missing.",
-#     "M:NOUN:POSS": "You need 's here.",
-#     "M:OTHER": "Something is missing.",
-
-#     "R:PART": "This word doesn’t fit.",
-#     "R:PUNCT": "The punctuation needs fixing.",
-#     "R:ORTH": "This spelling looks wrong.",
-#     "R:SPELL": "Spelling mistake here.",
-#     "R:WO": "Words are in the wrong order.",
-#     "R:MORPH": "This word sounds wrong.",
-#     "R:ADV": "Use a word ending in -ly.",
-#     "R:CONTR": "The shortened word is wrong.",
-#     "R:CONJ": "The joining word is wrong.",
-#     "R:DET": "The helper word is wrong.",
-#     "R:DET:ART": "Use a, an, or the correctly.",
-#     "R:PREP": "The place word is wrong.",
-#     "R:PRON": "The name word is wrong.",
-#     "R:VERB:FORM": "The action word needs changing.",
-#     "R:VERB:TENSE": "The time of the action is wrong.",
-#     "R:VERB:SVA": "This verb doesn’t match the subject.",
-#     "R:ADJ:FORM": "The describing word needs fixing.",
-#     "R:NOUN:INFL": "The plural is wrong.",
-#     "R:NOUN:NUM": "The number word is wrong.",
-#     "R:OTHER": "This part needs fixing.",
-
-#     "U:PART": "There’s an extra word.",
-#     "U:PUNCT": "There’s extra punctuation.",
-#     "U:ADV": "There’s an extra -ly word.",
-#     "U:CONTR": "There’s an extra shortened word.",
-#     "U:CONJ": "There’s an extra joining word.",
-#     "U:DET": "There’s an extra helper word.",
-#     "U:DET:ART": "There’s an extra a, an, or the.",
-#     "U:PREP": "There’s an extra place word.",
-#     "U:PRON": "There’s an extra name word.",
-#     "U:VERB": "There’s an extra action word.",
-#     "U:ADJ": "There’s an extra describing word.",
-#     "U:NOUN": "There’s an extra thing word.",
-#     "U:NOUN:POSS": "There’s an extra 's.",
-#     "U:OTHER": "There’s something extra here.",
-# }
-
-# DEFAULT_FRIENDLY = "Something needs fixing."
-
-
-# # ---------------- T5 API Call (Replaced) ----------------
-# # (Original function commented out)
-# # ...
-
-
-# # ---------------- NEW: GrammarBot API Call ----------------
-
-# def _transform_grammarbot_response(data: Dict[str, Any]) -> Dict[str, Any]:
-#     """
-#     Transforms GrammarBot's 'matches' into the 'edits' structure
-#     that the rest of our code (e.g., Sapling) expects.
-#     """
-#     edits = []
-#     if "matches" not in data:
-#         return {"edits": []}
-
-#     for match in data.get("matches", []):
-#         start = match.get("offset", 0)
-#         length = match.get("length", 0)
-#         end = start + length
-
-#         # Attempt to map GrammarBot rule ID to our existing ERROR_FRIENDLY map
-#         # e.g., GrammarBot 'VERB_SVA' -> 'R:VERB:SVA'
-#         # e.g., GrammarBot 'MORFOLOGIK_RULE_EN_US' -> 'R:SPELL' (a common one)
-#         rule_id = match.get("rule", {}).get("id", "OTHER")
-        
-#         # This is a guess. We'll prefix with 'R:' (Replace) as it's the most common.
-#         # This allows some rules like 'R:VERB:SVA' to match our ERROR_FRIENDLY map.
-#         error_type = f"R:{rule_id}"
-        
-#         # Handle specific common rules
-#         if "MORFOLOGIK" in rule_id or "SPELL" in rule_id:
-#             error_type = "R:SPELL"
-#         elif "PUNCT" in rule_id:
-#             error_type = "R:PUNCT"
-#         # From your successful test: e.g. "I has..."
-#         elif "NON3PRS_VERB" in rule_id:
-#             error_type = "R:VERB:SVA" 
-#         # From your successful test: e.g. "a apple"
-#         elif "EN_A_VS_AN" in rule_id:
-#             error_type = "R:DET:ART"
-#         # --- NEW RULE ---
-#         # For errors like "there is two problems"
-#         elif "VERB_SVA" in rule_id or "SUBJ_VERB_AGR" in rule_id:
-#             error_type = "R:VERB:SVA"
-#         # --- END NEW RULE ---
-            
-#         edit = {
-#             "start": start,
-#             "end": end,
-#             "error_type": error_type,
-#             # GrammarBot puts replacements in an array of { "value": "..." }
-#             "replacements": [r.get("value") for r in match.get("replacements", []) if "value" in r]
-#         }
-#         edits.append(edit)
-
-#     return {"edits": edits}
-
-
-# async def _grammarbot_check(sentence: str) -> Dict[str, Any]:
-#     """Calls the GrammarBot API and transforms the response."""
-#     try:
-#         headers = {
-#             "x-rapidapi-key": GRAMMARBOT_API_KEY,
-#             "x-rapidapi-host": GRAMMARBOT_API_HOST,
-#             "content-type": "application/x-www-form-urlencoded",
-#         }
-#         # Note: GrammarBot uses form data (text=...&language=...), not JSON
-#         payload = {
-#             "text": sentence,
-#             "language": "en-US" # Defaulting to en-US
-#         }
-        
-#         async with httpx.AsyncClient(timeout=15.0) as client:
-#             resp = await client.post(
-#                 GRAMMARBOT_API_URL,
-#                 data=payload,
-#                 headers=headers
-#             )
-            
-#             if resp.status_code < 300:
-#                 raw_data = resp.json()
-#                 # Transform the response to match the old T5/Sapling structure
-#                 transformed_data = _transform_grammarbot_response(raw_data)
-#                 return transformed_data
-            
-#             # This is the error you were seeing
-#             logger.error("GramZmarBot error %s: %s", resp.status_code, resp.text)
-#             return {"error": "GrammarBot error"}
-            
-#     except Exception as e:
-#         logger.exception("GrammarBot check failed: %s", e)
-#         return {"error": f"GrammarBot check failed: {e}"}
-
-
-# # ---------------- Feedback Extraction (Unchanged) ----------------
-# def _extract_feedback(data: Dict[str, Any]) -> List[str]:
-#     """Turns Sapling/T5-style edits into kid-friendly messages."""
-#     feedback: List[str] = []
-
-#     # Server error case
-#     if not data or ("error" in data and "edits" not in data):
-#         feedback.append(str(data.get("error", "Unknown error")))
-#         return feedback
-
-#     edits = data.get("edits", [])
-#     if not edits and "matches" not in data: # Check if it's an untransformed error
-#         feedback.append(DEFAULT_FRIENDLY)
-#         return feedback
-
-#     for edit in edits:
-#         error_type = edit.get("error_type", "")
-#         message = ERROR_FRIENDLY.get(error_type, DEFAULT_FRIENDLY)
-#         # Add the specific mapped message
-#         feedback.append(message)
-        
-#     # If no messages were added but there were edits, add default
-#     if not feedback and edits:
-#          feedback.append(DEFAULT_FRIENDLY)
-
-#     return feedback
-
-
-# # ---------------- Error Index Extraction (Unchanged) ----------------
-# def _extract_error_indices(sentence: str, edits: List[Dict[str, Any]]) -> List[int]:
-#     """Returns token indices where mistakes are located."""
-#     if not edits:
-#         return []
-#     tokens = list(re.finditer(r"\S+", sentence))
-#     error_indices = set()
-#     sentence_length = len(sentence)
-
-#     for edit in edits:
-#         start, end = edit.get("start", 0), edit.get("end", 0)
-        
-#         # --- NEW LOGIC ---
-#         # Ignore "edits" that span the entire sentence, as they are not
-#         # specific enough to be useful and just highlight everything.
-#         # We give a 3-char buffer for punctuation, etc.
-#         if start == 0 and end >= (sentence_length - 3):
-#             continue # Skip this broad, unhelpful edit
-#         # --- END NEW LOGIC ---
-
-#         for i, tok in enumerate(tokens):
-#             s, e = tok.span()
-#             # Check for overlap
-#             if e > start and s < end:
-#                 error_indices.add(i)
-
-#     return sorted(error_indices)
-
-
-# # ---------------- Correctness Check (Unchanged) ----------------
-# def _is_correct(data: Dict[str, Any]) -> bool:
-#     """Sentence is correct if there are zero edits."""
-#     # Check the transformed 'edits' list
-#     if data and "edits" in data:
-#         return len(data["edits"]) == 0
-#     # Fallback for untransformed data (shouldn't happen)
-#     if data and "matches" in data:
-#          return len(data["matches"]) == 0
-#     # If error or invalid data, assume not correct
-#     return False
-
-
-# # ---------------- Public Entry (Modified) ----------------
-# async def check_sentence(
-#     sentence: str,
-#     kc_id: Optional[int] = None,
-#     tier_id: Optional[int] = None,
-# ) -> Dict[str, Any]:
-#     """Main API: caching, model call, result shaping."""
-#     normalized = normalize_sentence(sentence)
-#     cached = await get_sentence_cache(normalized, kc_id)
-
-#     if cached:
-#         logger.info("[CACHE HIT] %s", normalized)
-#         cached["from_cache"] = True
-        
-#         # Ensure 'sentence_power' exists for older cache entries,
-#         if "sentence_power" not in cached:
-#             cached_correct = cached.get("is_correct", False)
-#             cached["sentence_power"] = len(cached.get("best_candidate", "")) if cached_correct else None
-
-#         return cached
-
-#     # --- MODIFIED LINE ---
-#     # Call GrammarBot instead of T5
-#     api_response = await _grammarbot_check(sentence)
-#     # --- END MODIFICATION ---
-
-#     feedback = _extract_feedback(api_response)
-#     correct = _is_correct(api_response)
-#     edits = api_response.get("edits", []) if api_response else []
-#     indices = _extract_error_indices(sentence, edits)
-
-#     # --- NEW LOGIC (Unchanged) ---
-#     sentence_power: Optional[int] = None
-#     if correct:
-#         sentence_power = len(sentence)
-#     # --- END NEW LOGIC ---
-
-#     result = {
-#         "is_correct": correct,
-#         "error_indices": indices,
-#         "feedback": feedback,
-#         "scores": {"t5_edits": len(edits)}, # Kept key name for compatibility
-#         "sentence_power": sentence_power,
-#         "candidates": [],
-#         "best_candidate": sentence, 
-#         "from_cache": False,
-#     }
-
-#     await set_sentence_cache(normalized, kc_id, result)
-#     return result
\ No newline at end of file
+
+async def grade_many(
+    sentences: List[str], concurrency: int = 8, ttl_days: int = 30
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Bulk path for offline jobs: grades every sentence not already cached and
+    writes the verdicts to the sentence cache. Returns canonical -> verdict.
+    Concurrent calls are coalesced by the T5 micro-batcher when enabled.
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+    out: Dict[str, Dict[str, Any]] = {}
+
+    async def one(canonical: str) -> None:
+        async with sem:
+            cached = await get_sentence_cache(canonical)
+            if cached and cached.get("status") == STATUS_OK:
+                out[canonical] = dict(cached, from_cache=True)
+                return
+            out[canonical] = await _grade(canonical, ttl_days=ttl_days)
+
+    canonicals = {canonicalize(s)[0] for s in sentences}
+    await asyncio.gather(*(one(c) for c in canonicals if c))
+    return out
+
+
+# ---------------- Speculative pre-check ----------------
+_precheck_tasks: Set["asyncio.Task[None]"] = set()
+_precheck_counters: Dict[str, int] = {"scheduled": 0, "dropped": 0, "graded": 0}
+
+
+def _precheck_has_room() -> bool:
+    if len(_precheck_tasks) >= settings.PRECHECK_MAX_INFLIGHT:
+        return False
+    if _breaker.state != CLOSED:
+        return False
+    if getattr(_backend, "queue_depth_ratio", lambda: 0.0)() >= 0.5:
+        return False  # leave the batch queue to real submissions
+    return True
+
+
+async def _precheck(sentence: str, kc_id: Optional[int], tier_id: Optional[int]) -> None:
+    canonical, _ = canonicalize(sentence)
+    if not canonical:
+        return
+    if kc_id is not None and kc_answer_bank.match(kc_id, canonical, tier_id) is not None:
+        return
+    if await get_sentence_cache(canonical):
+        return
+    await _start_grading(canonical, low_priority=True)
+    _precheck_counters["graded"] += 1
+
+
+def schedule_precheck(sentence: str, kc_id: Optional[int] = None, tier_id: Optional[int] = None) -> bool:
+    """
+    Warms the cache for a sentence the player is still arranging. Runs in the
+    background and never touches mastery; dropped (False) whenever the
+    backend is busy, so it can't compete with real submissions.
+    """
+    if not _precheck_has_room():
+        _precheck_counters["dropped"] += 1
+        return False
+    task = asyncio.ensure_future(_precheck(sentence, kc_id, tier_id))
+    _precheck_tasks.add(task)
+
+    def _done(t: "asyncio.Task[None]") -> None:
+        _precheck_tasks.discard(t)
+        if not t.cancelled() and t.exception() is not None:
+            logger.warning("Precheck failed: %s", t.exception())
+
+    task.add_done_callback(_done)
+    _precheck_counters["scheduled"] += 1
+    return True
+
+
+def precheck_stats() -> Dict[str, Any]:
+    return {**_precheck_counters, "inflight": len(_precheck_tasks)}
+
+
+def _start_grading(
+    canonical: str, refresh: bool = False, low_priority: bool = False
+) -> "asyncio.Future[Dict[str, Any]]":
+    # Concurrent misses for the same sentence in this worker share one grading.
+    # A real submission doesn't join a pre-check: it would wait in the low
+    # lane. It starts its own, and the pre-check finishes on the side.
+    fut = _inflight.get(canonical)
+    if fut is None or (canonical in _inflight_low and not low_priority):
+        fut = asyncio.ensure_future(_grade(canonical, refresh=refresh, low_priority=low_priority))
+        _inflight[canonical] = fut
+        if low_priority:
+            _inflight_low.add(canonical)
+        else:
+            _inflight_low.discard(canonical)
+
+        def _done(f: asyncio.Future) -> None:
+            if _inflight.get(canonical) is not f:
+                return  # superseded by a real submission's grading
+            _inflight.pop(canonical, None)
+            _inflight_low.discard(canonical)
+            if refresh and not f.cancelled() and f.exception() is not None:
+                logger.warning("Background re-grade failed: %s", f.exception())
+
+        fut.add_done_callback(_done)
+    return fut
@@ -1,71 +1,201 @@
-# from __future__ import annotations
-# import json, os, re
-# from typing import Dict, Set, Optional, List, Tuple
-
-# _ANSWERS: Dict[int, Dict[int, Set[str]]] = {}
-# _LOADED = False
-
-# def _normalize(s: str) -> str:
-#     s = s.strip()
-#     s = re.sub(r"\s+", " ", s)
-#     if s and not s.endswith("."):
-#         s += "."
-#     if s:
-#         s = s[0].upper() + s[1:]
-#     return s
-
-# def _load_once() -> None:
-#     global _LOADED, _ANSWERS
-#     if _LOADED:
-#         return
-#     path = os.getenv(
-#         "KC_ANSWERS_PATH",
-#         os.path.join(os.path.dirname(__file__), "..", "content", "answers.json"),
-#     )
-#     path = os.path.abspath(path)
-#     if not os.path.exists(path):
-#         _ANSWERS = {}
-#         _LOADED = True
-#         return
-#     with open(path, "r", encoding="utf-8") as f:
-#         raw = json.load(f)
-#     out: Dict[int, Dict[int, Set[str]]] = {}
-#     for kc_str, tiers in raw.items():
-#         kc = int(kc_str)
-#         out[kc] = {}
-#         for tier_str, items in tiers.items():
-#             tier = int(tier_str)
-#             out[kc][tier] = { _normalize(x) for x in items }
-#     _ANSWERS = out
-#     _LOADED = True
-
-# def contains(kc_id: int, sentence: str, tier_id: Optional[int] = None) -> bool:
-#     _load_once()
-#     s = _normalize(sentence)
-#     tiers = _ANSWERS.get(kc_id, {})
-#     if tier_id and tier_id in tiers:
-#         return s in tiers[tier_id]
-#     return any(s in bank for bank in tiers.values())
-
-# def best_match(kc_id: int, sentence: str, tier_id: Optional[int] = None) -> Optional[str]:
-#     _load_once()
-#     tiers = _ANSWERS.get(kc_id, {})
-#     if not tiers:
-#         return None
-#     s = _normalize(sentence)
-#     stoks = s.lower().split()
-#     cands: List[str] = []
-#     if tier_id and tier_id in tiers:
-#         cands = list(tiers[tier_id])
-#     else:
-#         for bank in tiers.values():
-#             cands.extend(list(bank))
-#     if not cands:
-#         return None
-#     def score(c: str) -> Tuple[int, int]:
-#         ct = c.lower().split()
-#         overlap = len(set(ct) & set(stoks))
-#         delta = abs(len(ct) - len(stoks))
-#         return (overlap, -delta)
-#     cands.sort(key=score, reverse=True)
-#     return cands[0]
\ No newline at end of file
+# app/services/kc_answer_bank.py
+"""
+Known-correct answers per KC/tier, compiled once into an immutable index.
+
+Lookups happen on the canonical form (app.utils.normalize.canonicalize), so
+a submission matching a bank answer up to quotes/whitespace is graded
+without touching Redis or the grammar backend.
+"""
+from __future__ import annotations
+import heapq
+import json
+import logging
+import os
+from collections import Counter
+from itertools import chain
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+from app.core.config import settings
+from app.utils.normalize import canonicalize
+
+logger = logging.getLogger("answer_bank")
+
+_DEFAULT_PATH = os.path.join(os.path.dirname(__file__), "..", "content", "answers.json")
+_PUNCT = ".,!?;:\"'()"
+
+
+@dataclass(frozen=True)
+class Answer:
+    text: str                  # as written in the bank
+    tokens: FrozenSet[str]     # lower-cased words without punctuation
+    n_tokens: int
+
+
+@dataclass(frozen=True)
+class Bank:
+    """One searchable answer set (a KC/tier, or a KC across all tiers)."""
+    answers: Tuple[Answer, ...]
+    by_canonical: Mapping[str, int]            # canonical answer -> position
+    postings: Mapping[str, Tuple[int, ...]]    # word -> positions containing it
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+    def nearest(self, words: List[str], k: int = 1) -> List[Tuple[Answer, int]]:
+        """
+        Top-k answers by (shared words, -length difference), earliest answer
+        first on ties -- the same order the brute-force scan gives. Only
+        answers sharing at least one word are scored.
+        """
+        overlap = Counter(chain.from_iterable(self.postings.get(w, ()) for w in set(words)))
+        n = len(words)
+        if not overlap:
+            # nothing in common: fall back to the closest length
+            ranked = sorted(range(len(self.answers)), key=lambda p: (abs(self.answers[p].n_tokens - n), p))
+            return [(self.answers[p], 0) for p in ranked[:k]]
+        kth = heapq.nlargest(k, overlap.values())[-1]
+        best = heapq.nsmallest(
+            k,
+            [(p, c) for p, c in overlap.items() if c >= kth],
+            key=lambda kv: (-kv[1], abs(self.answers[kv[0]].n_tokens - n), kv[0]),
+        )
+        return [(self.answers[p], c) for p, c in best]
+
+
+@dataclass(frozen=True)
+class AnswerIndex:
+    tiers: Mapping[int, Mapping[int, Bank]]    # kc -> tier -> bank
+    any_tier: Mapping[int, Bank]               # kc -> all tiers merged
+
+    def lookup(self, kc_id: int, tier_id: Optional[int] = None) -> Optional[Bank]:
+        if tier_id:
+            bank = self.tiers.get(kc_id, {}).get(tier_id)
+            if bank is not None:
+                return bank
+        return self.any_tier.get(kc_id)
+
+
+_EMPTY = AnswerIndex(MappingProxyType({}), MappingProxyType({}))
+_index: Optional[AnswerIndex] = None
+_counters: Dict[str, int] = {"lookups": 0, "hits": 0}
+
+
+def _words(canonical: str) -> List[str]:
+    return [w.strip(_PUNCT) for w in canonical.lower().split() if w.strip(_PUNCT)]
+
+
+def _build_bank(items: Dict[str, Answer]) -> Bank:
+    answers = tuple(items.values())
+    postings: Dict[str, List[int]] = {}
+    for pos, a in enumerate(answers):
+        for w in a.tokens:
+            postings.setdefault(w, []).append(pos)
+    return Bank(
+        answers=answers,
+        by_canonical=MappingProxyType({c: i for i, c in enumerate(items)}),
+        postings=MappingProxyType({w: tuple(p) for w, p in postings.items()}),
+    )
+
+
+def compile_index(raw: Dict[str, Dict[str, List[str]]]) -> AnswerIndex:
+    """Builds the index from the answers.json layout: {kc: {tier: [answers]}}."""
+    tiers: Dict[int, Mapping[int, Bank]] = {}
+    any_tier: Dict[int, Bank] = {}
+    for kc_str, by_tier in raw.items():
+        kc_tiers: Dict[int, Bank] = {}
+        merged: Dict[str, Answer] = {}
+        for tier_str, items in by_tier.items():
+            bank: Dict[str, Answer] = {}
+            for text in items:
+                if not text or not text.strip():
+                    continue
+                canonical, _ = canonicalize(text)
+                words = _words(canonical)
+                bank.setdefault(canonical, Answer(text=text, tokens=frozenset(words), n_tokens=len(words)))
+            kc_tiers[int(tier_str)] = _build_bank(bank)
+            for c, a in bank.items():
+                merged.setdefault(c, a)
+        tiers[int(kc_str)] = MappingProxyType(kc_tiers)
+        any_tier[int(kc_str)] = _build_bank(merged)
+    return AnswerIndex(MappingProxyType(tiers), MappingProxyType(any_tier))
+
+
+def load_answer_bank(path: Optional[str] = None) -> AnswerIndex:
+    """(Re)builds the index and swaps it in. Called from the app lifespan."""
+    global _index
+    path = os.path.abspath(path or settings.KC_ANSWERS_PATH or _DEFAULT_PATH)
+    if not os.path.exists(path):
+        logger.warning("Answer bank not found at %s; bank lookups disabled", path)
+        _index = _EMPTY
+        return _index
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    _index = compile_index(raw)
+    logger.info(
+        "Answer bank loaded",
+        extra={"kcs": len(_index.any_tier), "answers": sum(len(b) for b in _index.any_tier.values())},
+    )
+    return _index
+
+
+def get_index() -> AnswerIndex:
+    return _index if _index is not None else load_answer_bank()
+
+
+def match(kc_id: int, canonical: str, tier_id: Optional[int] = None) -> Optional[Answer]:
+    """Bank answer equal to an already-canonicalized sentence, if any."""
+    _counters["lookups"] += 1
+    bank = get_index().lookup(kc_id, tier_id)
+    pos = bank.by_canonical.get(canonical) if bank else None
+    if pos is None:
+        return None
+    _counters["hits"] += 1
+    return bank.answers[pos]
+
+
+def contains(kc_id: int, sentence: str, tier_id: Optional[int] = None) -> bool:
+    return match(kc_id, canonicalize(sentence)[0], tier_id) is not None
+
+
+def nearest(kc_id: int, sentence: str, tier_id: Optional[int] = None, k: int = 3) -> List[Answer]:
+    """Up to k closest bank answers by shared words (inverted index)."""
+    bank = get_index().lookup(kc_id, tier_id)
+    if not bank:
+        return []
+    return [a for a, _ in bank.nearest(_words(canonicalize(sentence)[0]), k)]
+
+
+def best_match(kc_id: int, sentence: str, tier_id: Optional[int] = None) -> Optional[str]:
+    """Closest bank answer by word overlap, ties broken by length difference."""
+    top = nearest(kc_id, sentence, tier_id, k=1)
+    return top[0].text if top else None
+
+
+def hint_for(sentence: str, answer: Answer) -> Optional[str]:
+    """One short, kid-friendly nudge towards `answer`."""
+    words = _words(canonicalize(sentence)[0])
+    if not words:
+        return None
+    if set(words) == answer.tokens and len(words) == answer.n_tokens:
+        return "Check the order of your words."
+    target = _words(canonicalize(answer.text)[0])
+    missing = [w for w in target if w not in set(words)]
+    extra = [w for w in words if w not in answer.tokens]
+    if len(missing) == 1 and len(extra) == 1:
+        return f"Try '{missing[0]}' instead of '{extra[0]}'."
+    if missing:
+        return f"Try using the word '{missing[0]}'."
+    if extra:
+        return f"Do you need the word '{extra[0]}'?"
+    return None
+
+
+def bank_stats() -> Dict[str, Any]:
+    idx = get_index()
+    return {
+        **_counters,
+        "kcs": len(idx.any_tier),
+        "answers": sum(len(b) for b in idx.any_tier.values()),
+    }
@@ -1,8 +1,38 @@
 # app/services/mastery.py
-from sqlalchemy import select
+"""
+Mastery writes for a graded submission.
+
+Each submission is persisted with a single statement: the mastery rows are
+UPSERTed (INSERT ... ON CONFLICT DO UPDATE) with the BKT step looked up in
+core.bkt's transition table against the locked row, and RETURNING hands back
+the new p_know values. Two concurrent submissions for the same KC serialize
+on the row lock instead of overwriting each other. The caller commits.
+"""
+from typing import Tuple
+
+from sqlalchemy import Integer, case, cast, func, literal, select, true, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.adventure import Adventure
 from app.models.stats import UserKCMastery, AdventureKCStat
-from app.services import bkt_service as bkt
+from app.core import bkt
+
+
+def _best_sentence_sets(table, excluded):
+    """ON CONFLICT assignments: keep the higher-powered best sentence."""
+    better = (excluded.best_sentence_power.isnot(None)) & (
+        func.coalesce(table.best_sentence_power, -1) < excluded.best_sentence_power
+    )
+    return {
+        "best_sentence_power": case(
+            (better, excluded.best_sentence_power), else_=table.best_sentence_power
+        ),
+        "best_sentence": case(
+            (better, func.coalesce(excluded.best_sentence, table.best_sentence)),
+            else_=table.best_sentence,
+        ),
+    }
+
 
 async def apply_submission_side_effects(
     db: AsyncSession,
@@ -12,77 +42,120 @@ async def apply_submission_side_effects(
     is_correct: bool,
     best_sentence: str | None = None,
     best_power: int | None = None,
-    slip: float = 0.1,
-    guess: float = 0.2,
-    transit: float = 0.15,
-) -> None:
+    params: bkt.BKTParams | None = None,
+) -> Tuple[int, int]:
+    """
+    Adventure mode: user mastery, adventure KC stat and the adventure's
+    submission counters in one statement. Returns (user p_know, adventure
+    p_know), both 0..100.
+    """
+    params = params or bkt.params_for_kc(kc_id)
+    correct, incorrect = (1, 0) if is_correct else (0, 1)
+    power = int(best_power) if best_power is not None else None
+    sentence = best_sentence if power is not None else None
+
     # ----- USER LEVEL -----
-    res = await db.execute(
-        select(UserKCMastery).where(
-            UserKCMastery.user_id == user_id,
-            UserKCMastery.kc_id == kc_id,
-        )
+    ins = pg_insert(UserKCMastery).values(
+        user_id=user_id,
+        kc_id=kc_id,
+        p_know=bkt.first_state(is_correct, params),
+        correct=correct,
+        incorrect=incorrect,
+        best_sentence=sentence,
+        best_sentence_power=power,
     )
-    row = res.scalar_one_or_none()
-    if row is None:
-        row = UserKCMastery(
-            user_id=user_id,
-            kc_id=kc_id,
-            p_know=50,
-            correct=1 if is_correct else 0,
-            incorrect=0 if is_correct else 1,
-        )
-        db.add(row)
-    else:
-        prior = (row.p_know or 0) / 100.0
-        updated = bkt.update_pknow(prior, is_correct, slip=slip, guess=guess, transit=transit)
-        row.p_know = int(round(updated * 100))
-        if is_correct: row.correct += 1
-        else:          row.incorrect += 1
-
-    # best sentence update (for UserKCMastery)
-    if best_power is not None and (row.best_sentence_power or -1) < int(best_power):
-        row.best_sentence_power = int(best_power)
-        if best_sentence:
-            row.best_sentence = best_sentence
-
-    # ensure INSERTs are staged before we read from them
-    await db.flush()
+    t = UserKCMastery.__table__.c
+    user_cte = ins.on_conflict_do_update(
+        index_elements=[t.user_id, t.kc_id],
+        set_={
+            "p_know": bkt.sql_step(t.p_know, is_correct, params),
+            "correct": t.correct + ins.excluded.correct,
+            "incorrect": t.incorrect + ins.excluded.incorrect,
+            **_best_sentence_sets(t, ins.excluded),
+        },
+    ).returning(t.p_know).cte("u")
 
     # ----- ADVENTURE LEVEL -----
-    res = await db.execute(
-        select(AdventureKCStat).where(
-            AdventureKCStat.adventure_id == adventure_id,
-            AdventureKCStat.kc_id == kc_id,
-        )
+    # a new row starts from the user-level value computed just above
+    a = AdventureKCStat.__table__.c
+    ains = pg_insert(AdventureKCStat).from_select(
+        ["adventure_id", "kc_id", "p_know", "correct", "incorrect", "best_sentence", "best_sentence_power"],
+        select(
+            literal(adventure_id, AdventureKCStat.adventure_id.type),
+            literal(kc_id, Integer),
+            cast(user_cte.c.p_know, Integer),
+            literal(correct, Integer),
+            literal(incorrect, Integer),
+            literal(sentence, AdventureKCStat.best_sentence.type),
+            literal(power, Integer),
+        ),
     )
-    arow = res.scalar_one_or_none()
-    if arow is None:
-        arow = AdventureKCStat(
-            adventure_id=adventure_id,
-            kc_id=kc_id,
-            p_know=row.p_know,  # start from user-level prior
-            correct=1 if is_correct else 0,
-            incorrect=0 if is_correct else 1,
-            # Set initial best_sentence if this submission is correct
-            best_sentence=best_sentence if best_power is not None else None,
-            best_sentence_power=best_power if best_power is not None else None,
+    adv_cte = ains.on_conflict_do_update(
+        index_elements=[a.adventure_id, a.kc_id],
+        set_={
+            "p_know": bkt.sql_step(a.p_know, is_correct, params),
+            "correct": a.correct + ains.excluded.correct,
+            "incorrect": a.incorrect + ains.excluded.incorrect,
+            **_best_sentence_sets(a, ains.excluded),
+        },
+    ).returning(a.p_know).cte("a")
+
+    # ----- ADVENTURE COUNTERS -----
+    counters_cte = (
+        update(Adventure)
+        .where(Adventure.id == adventure_id)
+        .values(
+            correct_submissions=Adventure.correct_submissions + correct,
+            incorrect_submissions=Adventure.incorrect_submissions + incorrect,
         )
-        db.add(arow)
-    else:
-        aprior = (arow.p_know or 0) / 100.0
-        anew = bkt.update_pknow(aprior, is_correct, slip=slip, guess=guess, transit=transit)
-        arow.p_know = int(round(anew * 100))
-        if is_correct: arow.correct += 1
-        else:          arow.incorrect += 1
+        .returning(Adventure.id)
+        .cte("adv")
+    )
+
+    stmt = (
+        select(user_cte.c.p_know, adv_cte.c.p_know)
+        .select_from(user_cte)
+        .join(adv_cte, true())
+        .join(counters_cte, true())
+    )
+    res = await db.execute(stmt)
+    p_user, p_adv = res.one()
+    return int(p_user), int(p_adv)
 
-    # --- THIS IS THE FIX ---
-    # You were missing the best sentence update logic for the AdventureKCStat
-    # It was only being applied to UserKCMastery
-    if best_power is not None and (arow.best_sentence_power or -1) < int(best_power):
-        arow.best_sentence_power = int(best_power)
-        if best_sentence:
-            arow.best_sentence = best_sentence
-    # --- END OF FIX ---
 
-    await db.commit()
\ No newline at end of file
+async def apply_practice_submission(
+    db: AsyncSession,
+    user_id,
+    kc_id: int,
+    is_correct: bool,
+    sentence: str,
+    params: bkt.BKTParams | None = None,
+) -> int:
+    """
+    Practice mode: only user mastery, same BKT step as adventure mode.
+    Correct sentences replace the stored best sentence.
+    Returns the new p_know, 0..100.
+    """
+    params = params or bkt.params_for_kc(kc_id)
+    correct, incorrect = (1, 0) if is_correct else (0, 1)
+    t = UserKCMastery.__table__.c
+    ins = pg_insert(UserKCMastery).values(
+        user_id=user_id,
+        kc_id=kc_id,
+        p_know=bkt.first_state(is_correct, params),
+        correct=correct,
+        incorrect=incorrect,
+        best_sentence=sentence if is_correct else None,
+        best_sentence_power=None,
+    )
+    stmt = ins.on_conflict_do_update(
+        index_elements=[t.user_id, t.kc_id],
+        set_={
+            "p_know": bkt.sql_step(t.p_know, is_correct, params),
+            "correct": t.correct + ins.excluded.correct,
+            "incorrect": t.incorrect + ins.excluded.incorrect,
+            "best_sentence": ins.excluded.best_sentence if is_correct else t.best_sentence,
+        },
+    ).returning(t.p_know)
+    res = await db.execute(stmt)
+    return int(res.scalar_one())
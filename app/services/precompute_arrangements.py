@@ -0,0 +1,176 @@
+# app/services/precompute_arrangements.py
+"""
+Offline job: grade every card arrangement of a prompt ahead of time.
+
+Kids build sentences from a fixed set of word cards, so a prompt only has a
+finite set of orderings. This enumerates them (closest to the reference
+order first, capped), grades the ones not yet cached through the normal
+backend path, and stores the verdicts in the sentence cache. Live
+submissions of those arrangements are then plain cache hits.
+
+    python -m app.services.precompute_arrangements --prompts prompts.json
+    python -m app.services.precompute_arrangements --from-bank --kc 3
+
+prompts.json: [{"prompt_id": "kc3-t1-07", "cards": ["The", "boy", "runs", "."]}]
+Cards are taken in reference (correct) order when known.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.http import close_http_client
+from app.core.log import setup_logging, shutdown_logging
+from app.services import kc_answer_bank
+from app.services.grammar_backends import close_backends
+from app.services.grammar_service import grade_many
+
+logger = logging.getLogger("precompute")
+
+# Cards that attach to the previous word when rendered.
+_ATTACH = {".", ",", "!", "?", ";", ":"}
+# Sentence-final cards only ever go last; never permuted.
+_FINAL = {".", "!", "?"}
+
+
+def render(cards: Sequence[str]) -> str:
+    """Cards -> the sentence string the client submits."""
+    out = ""
+    for c in cards:
+        out += c if (c in _ATTACH and out) else (" " + c if out else c)
+    return out
+
+
+def arrangements(cards: Sequence[str], cap: int = 5000) -> Iterator[Tuple[str, ...]]:
+    """
+    Distinct orderings of `cards`, breadth-first by adjacent swaps from the
+    given order. Nearby mistakes (one or two swaps) come first, which are the
+    ones kids actually make, so a cap cuts the least likely orders. Repeated
+    cards are only counted once per distinct ordering, and a trailing
+    full stop / ? / ! stays in place.
+    """
+    cards = list(cards)
+    tail: Tuple[str, ...] = ()
+    if cards and cards[-1] in _FINAL:
+        tail = (cards.pop(),)
+    start = tuple(cards)
+    seen = {start}
+    queue = deque([start])
+    while queue and len(seen) <= cap:
+        cur = queue.popleft()
+        yield cur + tail
+        for i in range(len(cur) - 1):
+            if cur[i] == cur[i + 1]:
+                continue
+            nxt = cur[:i] + (cur[i + 1], cur[i]) + cur[i + 2:]
+            if nxt not in seen and len(seen) < cap:
+                seen.add(nxt)
+                queue.append(nxt)
+
+
+def prompts_from_bank(kc_id: Optional[int] = None, tier_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Uses every bank answer as a prompt, its words as the cards."""
+    idx = kc_answer_bank.get_index()
+    out: List[Dict[str, Any]] = []
+    for kc, tiers in idx.tiers.items():
+        if kc_id is not None and kc != kc_id:
+            continue
+        for tier, bank in tiers.items():
+            if tier_id is not None and tier != tier_id:
+                continue
+            for n, a in enumerate(bank.answers):
+                words = a.text.split()
+                cards: List[str] = []
+                for w in words:
+                    if len(w) > 1 and w[-1] in _ATTACH:
+                        cards += [w[:-1], w[-1]]
+                    else:
+                        cards.append(w)
+                out.append({"prompt_id": f"kc{kc}-t{tier}-{n}", "cards": cards})
+    return out
+
+
+async def precompute(
+    prompts: List[Dict[str, Any]],
+    cap: int = 5000,
+    max_cards: int = 10,
+    concurrency: int = 8,
+    ttl_days: int = 90,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    report: Dict[str, Any] = {"prompts": 0, "arrangements": 0, "graded": 0, "cached": 0, "correct": 0, "errors": 0}
+    started = time.perf_counter()
+    for p in prompts:
+        cards = [c for c in p.get("cards", []) if c]
+        if not cards:
+            continue
+        if len(cards) > max_cards:
+            logger.warning("Skipping %s: %d cards > %d", p.get("prompt_id"), len(cards), max_cards)
+            continue
+        sentences = [render(a) for a in arrangements(cards, cap)]
+        report["prompts"] += 1
+        report["arrangements"] += len(sentences)
+        if dry_run:
+            continue
+        verdicts = await grade_many(sentences, concurrency=concurrency, ttl_days=ttl_days)
+        for v in verdicts.values():
+            if v.get("from_cache"):
+                report["cached"] += 1
+            elif v.get("degraded"):
+                report["errors"] += 1
+            else:
+                report["graded"] += 1
+            report["correct"] += 1 if v.get("is_correct") else 0
+        logger.info("Precomputed %s", p.get("prompt_id"), extra={"arrangements": len(sentences)})
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    return report
+
+
+async def _main(args: argparse.Namespace) -> None:
+    if args.prompts:
+        with open(args.prompts, "r", encoding="utf-8") as f:
+            prompts = json.load(f)
+    else:
+        prompts = prompts_from_bank(args.kc, args.tier)
+    try:
+        report = await precompute(
+            prompts,
+            cap=args.cap,
+            max_cards=args.max_cards,
+            concurrency=args.concurrency,
+            ttl_days=args.ttl_days,
+            dry_run=args.dry_run,
+        )
+    finally:
+        await close_backends()
+        await close_http_client()
+    print(json.dumps(report))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Precompute grading results for card arrangements.")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--prompts", help="JSON list of {prompt_id, cards}")
+    src.add_argument("--from-bank", action="store_true", help="use answer-bank sentences as prompts")
+    ap.add_argument("--kc", type=int, default=None)
+    ap.add_argument("--tier", type=int, default=None)
+    ap.add_argument("--cap", type=int, default=5000, help="max arrangements per prompt")
+    ap.add_argument("--max-cards", type=int, default=10)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--ttl-days", type=int, default=90)
+    ap.add_argument("--dry-run", action="store_true", help="only count arrangements")
+    args = ap.parse_args()
+
+    setup_logging()
+    try:
+        asyncio.run(_main(args))
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# app/services/resilience.py
+"""
+Guards for calls to a remote backend: a rolling latency tracker, a circuit
+breaker, and a hedged call helper.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger("resilience")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class LatencyTracker:
+    """Keeps the last `size` latencies (seconds) for percentile estimates."""
+
+    def __init__(self, size: int = 500):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, max(0, int(round(p / 100.0 * (len(ordered) - 1)))))
+        return ordered[idx]
+
+
+class CircuitBreaker:
+    """
+    Opens when, over the last `window` calls (and at least `min_calls`), the
+    share of failed or slow calls reaches `failure_rate`. After `open_seconds`
+    a single trial call is let through (half-open); its outcome closes or
+    re-opens the breaker.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 3.0,
+        min_calls: int = 10,
+        window: int = 50,
+        open_seconds: float = 15.0,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self._outcomes: Deque[bool] = deque(maxlen=window)  # True = bad call
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.transitions: Dict[str, int] = {}
+        self.rejected = 0
+
+    def _move(self, state: str) -> None:
+        if state == self.state:
+            return
+        key = f"{self.state}->{state}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        logger.warning("Circuit %s: %s", self.name, key)
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state == CLOSED:
+            self._outcomes.clear()
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._move(HALF_OPEN)
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, ok: bool, seconds: float) -> None:
+        bad = (not ok) or seconds >= self.slow_call_seconds
+        if self.state == HALF_OPEN:
+            self._move(OPEN if bad else CLOSED)
+            return
+        self._outcomes.append(bad)
+        if len(self._outcomes) >= self.min_calls:
+            if sum(self._outcomes) / len(self._outcomes) >= self.failure_rate:
+                self._move(OPEN)
+
+    def stats(self) -> Dict[str, Any]:
+        bad = sum(self._outcomes)
+        return {
+            "state": self.state,
+            "window_calls": len(self._outcomes),
+            "window_bad": bad,
+            "rejected": self.rejected,
+            "transitions": dict(self.transitions),
+        }
+
+
+async def hedged(
+    call: Callable[[], Awaitable[Dict[str, Any]]],
+    hedge_after: Optional[float],
+    is_ok: Callable[[Dict[str, Any]], bool],
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Runs `call()`; if it hasn't finished after `hedge_after` seconds, starts
+    a second identical call and returns whichever succeeds first.
+    Returns (result, hedge_was_sent).
+    """
+    first = asyncio.ensure_future(call())
+    if hedge_after is None:
+        return await first, False
+
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if done:
+            return first.result(), False
+
+        tasks.add(asyncio.ensure_future(call()))
+        pending = set(tasks)
+        result: Optional[Dict[str, Any]] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                r = t.result()
+                if is_ok(r):
+                    return r, True
+                result = r
+        return result or {"error": "hedged call failed"}, True
+    finally:
+        # also runs when the caller's deadline cancels us
+        for t in tasks:
+            if not t.done():
+                t.cancel()
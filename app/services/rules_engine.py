@@ -0,0 +1,109 @@
+# app/services/rules_engine.py
+"""
+Rule-based grammar checker for the local CPU backend.
+
+Plain functions over strings with no app imports, so they can be shipped
+to ProcessPoolExecutor workers. Output uses the same shape as the remote
+model: {"edits": [{"start", "end", "error_type", "replacements"}]} with
+ERRANT-style error types (see app.utils.error_codes).
+
+Deliberately conservative: it only flags what it is sure about, so a
+clean result means "no known mistake", not "verified correct".
+"""
+from __future__ import annotations
+import re
+from typing import Any, Dict, List, Optional
+
+# part of the rules backend's sentence cache keys; bump when a rule changes
+RULES_VERSION = "1"
+
+_WORD = re.compile(r"[A-Za-z']+")
+
+_VOWEL_SOUND_EXCEPTIONS = ("hour", "honest", "honor", "honour", "heir")
+_CONSONANT_SOUND_EXCEPTIONS = ("uni", "use", "usu", "one", "once", "eu", "ewe", "ufo")
+
+_DETERMINERS = {"a", "an", "the", "this", "that", "these", "those", "my", "your", "our", "their", "his", "her", "its"}
+
+# subject -> verb forms that never agree with it
+_SVA_WRONG = {
+    "i": {"is", "are", "has", "does", "doesn't"},
+    "he": {"are", "were", "have", "do", "don't", "am"},
+    "she": {"are", "were", "have", "do", "don't", "am"},
+    "it": {"are", "were", "have", "do", "don't", "am"},
+    "we": {"is", "was", "has", "does", "doesn't", "am"},
+    "they": {"is", "was", "has", "does", "doesn't", "am"},
+    "you": {"is", "was", "has", "does", "doesn't", "am"},
+}
+_SVA_FIX = {
+    "i": {"is": "am", "are": "am", "has": "have", "does": "do", "doesn't": "don't"},
+    "he": {"are": "is", "were": "was", "have": "has", "do": "does", "don't": "doesn't", "am": "is"},
+    "we": {"is": "are", "was": "were", "has": "have", "does": "do", "doesn't": "don't", "am": "are"},
+}
+for _s in ("she", "it"):
+    _SVA_FIX[_s] = _SVA_FIX["he"]
+for _s in ("they", "you"):
+    _SVA_FIX[_s] = _SVA_FIX["we"]
+
+
+def _edit(start: int, end: int, error_type: str, replacement: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "start": start,
+        "end": end,
+        "error_type": error_type,
+        "replacements": [replacement] if replacement is not None else [],
+    }
+
+
+def _wants_an(word: str) -> bool:
+    w = word.lower()
+    if w.startswith(_VOWEL_SOUND_EXCEPTIONS):
+        return True
+    if w.startswith(_CONSONANT_SOUND_EXCEPTIONS):
+        return False
+    return w[:1] in "aeiou"
+
+
+def check(sentence: str) -> Dict[str, Any]:
+    edits: List[Dict[str, Any]] = []
+    words = list(_WORD.finditer(sentence))
+    if not words:
+        return {"edits": edits}
+
+    first = words[0]
+    if first.group()[0].islower():
+        edits.append(_edit(first.start(), first.end(), "R:ORTH", first.group().capitalize()))
+
+    stripped = sentence.rstrip()
+    if stripped and stripped[-1] not in ".!?\"'":
+        edits.append(_edit(len(stripped), len(stripped), "M:PUNCT", "."))
+
+    for m in re.finditer(r"\s+([.,!?;:])", sentence):
+        edits.append(_edit(m.start(), m.end(), "R:PUNCT", m.group(1)))
+
+    for prev, cur in zip(words, words[1:]):
+        p, c = prev.group().lower(), cur.group().lower()
+        gap = sentence[prev.end():cur.start()]
+        if gap.strip():
+            continue  # punctuation between them; not adjacent words
+
+        if p == c:
+            kind = "U:DET" if p in _DETERMINERS else "U:OTHER"
+            edits.append(_edit(prev.end(), cur.end(), kind, ""))
+        elif p in ("a", "an") and c.isalpha():
+            if (p == "an") != _wants_an(c):
+                fix = "an" if p == "a" else "a"
+                if prev.group()[0].isupper():
+                    fix = fix.capitalize()
+                edits.append(_edit(prev.start(), prev.end(), "R:DET:ART", fix))
+        elif p in _SVA_WRONG and c in _SVA_WRONG[p]:
+            edits.append(_edit(cur.start(), cur.end(), "R:VERB:SVA", _SVA_FIX.get(p, {}).get(c)))
+
+        if c == "i" and cur.group() == "i":
+            edits.append(_edit(cur.start(), cur.end(), "R:ORTH", "I"))
+
+    edits.sort(key=lambda e: (e["start"], e["end"]))
+    return {"edits": edits}
+
+
+def check_many(sentences: List[str]) -> List[Dict[str, Any]]:
+    return [check(s) for s in sentences]
@@ -0,0 +1,137 @@
+# app/services/shadow.py
+"""
+Shadow traffic: re-grade a sample of live sentences on a second backend
+and aggregate how it compares with the primary (latency, verdicts, and
+which error codes each one reports). Everything runs in background tasks
+with bounded concurrency; the submission never waits on it and never
+sees its failures.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.services.grammar_backends import get_backend
+from app.services.resilience import LatencyTracker
+from app.utils.error_codes import ERROR_FRIENDLY
+
+logger = logging.getLogger("shadow")
+
+_NONE = "-"  # no matching edit on that side
+
+_tasks: Set["asyncio.Task[None]"] = set()
+_counters: Dict[str, int] = {
+    "sampled": 0, "completed": 0, "dropped": 0, "errors": 0, "timeouts": 0, "same_edits": 0,
+}
+_verdicts: Dict[str, int] = {
+    "both_correct": 0, "both_incorrect": 0, "primary_only_correct": 0, "shadow_only_correct": 0,
+}
+# primary code -> shadow code -> count, edits paired by overlapping span
+_codes: Dict[str, Dict[str, int]] = {}
+_latency = {"primary": LatencyTracker(2000), "shadow": LatencyTracker(2000)}
+
+
+def _code(edit: Dict[str, Any]) -> str:
+    code = edit.get("error_type", "")
+    return code if code in ERROR_FRIENDLY else "OTHER"
+
+
+def _overlaps(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    a0, a1, b0, b1 = a.get("start", 0), a.get("end", 0), b.get("start", 0), b.get("end", 0)
+    if a0 == a1 or b0 == b1:
+        return a0 == b0  # insertions only line up at the same point
+    return a0 < b1 and b0 < a1
+
+
+def _pair(primary: List[Dict[str, Any]], shadow: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    pairs: List[Tuple[str, str]] = []
+    unused = list(shadow)
+    for p in primary:
+        match = next((s for s in unused if _overlaps(p, s)), None)
+        if match is None:
+            pairs.append((_code(p), _NONE))
+        else:
+            unused.remove(match)
+            pairs.append((_code(p), _code(match)))
+    pairs.extend((_NONE, _code(s)) for s in unused)
+    return pairs
+
+
+def _record(primary: Dict[str, Any], shadow: Dict[str, Any]) -> None:
+    p_edits, s_edits = primary.get("edits", []), shadow.get("edits", [])
+    p_ok, s_ok = not p_edits, not s_edits
+    key = (
+        "both_correct" if p_ok and s_ok
+        else "both_incorrect" if not p_ok and not s_ok
+        else "primary_only_correct" if p_ok
+        else "shadow_only_correct"
+    )
+    _verdicts[key] += 1
+    pairs = _pair(p_edits, s_edits)
+    if all(p == s for p, s in pairs):
+        _counters["same_edits"] += 1
+    for p, s in pairs:
+        row = _codes.setdefault(p, {})
+        row[s] = row.get(s, 0) + 1
+
+
+async def _run(sentence: str, primary: Dict[str, Any]) -> None:
+    backend = get_backend(settings.GRAMMAR_SHADOW_BACKEND)
+    start = time.monotonic()
+    # every sampled call lands in the shadow latencies, like the primary's
+    # did: timeouts count at the budget, errors at the time they took
+    try:
+        shadow = await asyncio.wait_for(backend.check(sentence), settings.GRAMMAR_BUDGET_SECONDS)
+    except asyncio.TimeoutError:
+        _counters["timeouts"] += 1
+        _latency["shadow"].add(settings.GRAMMAR_BUDGET_SECONDS)
+        return
+    except Exception:
+        _counters["errors"] += 1
+        _latency["shadow"].add(time.monotonic() - start)
+        return
+    _latency["shadow"].add(time.monotonic() - start)
+    if "error" in shadow:
+        _counters["errors"] += 1
+        return
+    _record(primary, shadow)
+    _counters["completed"] += 1
+
+
+def maybe_shadow(sentence: str, primary: Dict[str, Any], primary_seconds: float) -> None:
+    """Samples a graded sentence for the shadow backend. Never raises."""
+    if not settings.GRAMMAR_SHADOW_BACKEND or random.random() >= settings.GRAMMAR_SHADOW_SAMPLE_RATE:
+        return
+    try:
+        if len(_tasks) >= settings.GRAMMAR_SHADOW_MAX_INFLIGHT:
+            _counters["dropped"] += 1
+            return
+        _counters["sampled"] += 1
+        _latency["primary"].add(primary_seconds)
+        task = asyncio.ensure_future(_run(sentence, primary))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+    except Exception as e:
+        logger.warning("Shadow scheduling failed: %s", e)
+
+
+def shadow_report() -> Optional[Dict[str, Any]]:
+    if not settings.GRAMMAR_SHADOW_BACKEND:
+        return None
+    done = _counters["completed"]
+    return {
+        "primary": settings.GRAMMAR_BACKEND,
+        "shadow": settings.GRAMMAR_SHADOW_BACKEND,
+        "sample_rate": settings.GRAMMAR_SHADOW_SAMPLE_RATE,
+        **_counters,
+        "inflight": len(_tasks),
+        "verdict_agreement": round((_verdicts["both_correct"] + _verdicts["both_incorrect"]) / done, 4) if done else None,
+        "verdicts": dict(_verdicts),
+        "latency": {
+            side: {f"p{p}": t.percentile(p) for p in (50, 95, 99)} for side, t in _latency.items()
+        },
+        "codes": {p: dict(row) for p, row in _codes.items()},
+    }
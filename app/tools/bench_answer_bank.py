@@ -0,0 +1,83 @@
+# app/tools/bench_answer_bank.py
+"""
+Benchmark: inverted-index nearest answer vs. the old brute-force scorer.
+
+    python -m app.tools.bench_answer_bank --answers 50000 --queries 2000
+
+Builds a synthetic bank (real answers.json sentences with words swapped),
+checks both methods agree on every query, and prints per-query timings.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.services.kc_answer_bank import Answer, Bank, _DEFAULT_PATH, _words, compile_index
+from app.utils.normalize import canonicalize
+
+
+def brute_force(bank: Bank, sentence: str) -> Optional[str]:
+    """The pre-index best_match: score every answer, take the max."""
+    stoks = _words(canonicalize(sentence)[0])
+    sset = set(stoks)
+
+    def score(a: Answer) -> Tuple[int, int]:
+        return (len(a.tokens & sset), -abs(a.n_tokens - len(stoks)))
+
+    return max(bank.answers, key=score).text if bank.answers else None
+
+
+def _synthetic(seed: List[str], n: int, rng: random.Random) -> List[str]:
+    vocab = sorted({w for s in seed for w in s.rstrip(".!?").split()})
+    out = list(seed)
+    while len(out) < n:
+        words = rng.choice(seed).rstrip(".!?").split()
+        for _ in range(rng.randint(1, 3)):
+            words[rng.randrange(len(words))] = rng.choice(vocab)
+        out.append(" ".join(words) + ".")
+    return out[:n]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--answers", type=int, default=50_000)
+    ap.add_argument("--queries", type=int, default=2_000)
+    ap.add_argument("--path", default=os.environ.get("KC_ANSWERS_PATH", _DEFAULT_PATH))
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    with open(args.path, "r", encoding="utf-8") as f:
+        raw: Dict[str, Dict[str, List[str]]] = json.load(f)
+    seed = [x for tiers in raw.values() for items in tiers.values() for x in items]
+
+    t0 = time.perf_counter()
+    bank = compile_index({"1": {"1": _synthetic(seed, args.answers, rng)}}).any_tier[1]
+    build = time.perf_counter() - t0
+
+    queries = []
+    for _ in range(args.queries):
+        words = rng.choice(bank.answers).text.rstrip(".").split()
+        words[rng.randrange(len(words))] = rng.choice(["go", "goes", "a", "the", "quickly", "cat"])
+        queries.append(" ".join(words))
+
+    t0 = time.perf_counter()
+    fast = [bank.nearest(_words(canonicalize(q)[0]), 1)[0][0].text for q in queries]
+    t_index = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    slow = [brute_force(bank, q) for q in queries]
+    t_brute = time.perf_counter() - t0
+
+    mismatches = sum(a != b for a, b in zip(fast, slow))
+    print(f"answers={len(bank)} queries={len(queries)} build={build * 1000:.0f}ms")
+    print(f"inverted index: {t_index / len(queries) * 1e6:9.1f} us/query")
+    print(f"brute force:    {t_brute / len(queries) * 1e6:9.1f} us/query")
+    print(f"speedup x{t_brute / t_index:.1f}, mismatches={mismatches}")
+
+
+if __name__ == "__main__":
+    main()
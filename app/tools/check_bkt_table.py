@@ -0,0 +1,86 @@
+# app/tools/check_bkt_table.py
+"""
+Check the BKT transition tables against the float implementation.
+
+    python -m app.tools.check_bkt_table --params 500 --sequences 2000
+
+For random parameter sets: every table entry must equal one rounded
+update_pknow step, and apply_outcomes/compose over random outcome
+sequences must equal stepping the float implementation one outcome at a
+time (rounding to the stored 0..100 integer after each step).
+"""
+from __future__ import annotations
+import argparse
+import random
+import sys
+import time
+
+from app.core import bkt
+from app.services.bkt_service import update_pknow
+
+
+def _float_step(state: int, is_correct: bool, p: bkt.BKTParams) -> int:
+    return int(round(update_pknow(state / 100.0, is_correct, p.slip, p.guess, p.transit) * 100))
+
+
+def _random_params(rng: random.Random) -> bkt.BKTParams:
+    return bkt.BKTParams(
+        slip=round(rng.uniform(0.01, 0.4), 3),
+        guess=round(rng.uniform(0.01, 0.4), 3),
+        transit=round(rng.uniform(0.01, 0.5), 3),
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--params", type=int, default=500)
+    ap.add_argument("--sequences", type=int, default=2_000)
+    ap.add_argument("--max-len", type=int, default=60)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    failures = 0
+    sets = [bkt.default_params()] + [_random_params(rng) for _ in range(args.params)]
+
+    for p in sets:
+        inc, cor = bkt.table(p)
+        for s in range(bkt.STATES):
+            if inc[s] != _float_step(s, False, p) or cor[s] != _float_step(s, True, p):
+                failures += 1
+                print(f"table mismatch {p} state={s}")
+
+    t_table = t_float = 0.0
+    for _ in range(args.sequences):
+        p = rng.choice(sets)
+        start = rng.randrange(bkt.STATES)
+        # streaky sequences, like real play
+        outcomes, o = [], rng.random() < 0.5
+        for _ in range(rng.randint(0, args.max_len)):
+            if rng.random() < 0.3:
+                o = not o
+            outcomes.append(o)
+
+        t0 = time.perf_counter()
+        expect = start
+        for o in outcomes:
+            expect = _float_step(expect, o, p)
+        t_float += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        got = bkt.apply_outcomes(start, outcomes, p)
+        t_table += time.perf_counter() - t0
+
+        if got != expect or bkt.compose(outcomes, p)[start] != expect:
+            failures += 1
+            print(f"sequence mismatch {p} start={start} outcomes={outcomes}: {got} != {expect}")
+
+    n = max(1, args.sequences)
+    print(f"param sets={len(sets)} sequences={args.sequences} failures={failures}")
+    print(f"float stepping: {t_float / n * 1e6:8.1f} us/sequence")
+    print(f"table hops:     {t_table / n * 1e6:8.1f} us/sequence")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# app/tools/fit_bkt.py
+"""
+Fit slip/guess/transit per KC from the submission_events log.
+
+    python -m app.tools.fit_bkt --out /srv/bkt/bkt_params.json
+    python -m app.tools.fit_bkt --kc 3 --min-events 2000 --dry-run
+
+One KC at a time is streamed with a server-side cursor, in (user, time)
+order, into flat arrays (so memory is bounded by the largest KC, not the
+log), and scored with services.bkt_fit. KCs with fewer than --min-events
+events are left out of the table and keep the defaults.
+
+The result is written atomically to --out, plus a copy named after its
+version next to it for rollback. Point BKT_PARAMS_PATH at --out; workers
+pick it up on restart (core.bkt.load_fitted_params), and
+`python -m app.tools.replay_bkt` re-derives stored mastery with it.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import numpy as np
+from sqlalchemy import distinct, select
+
+from app.core import bkt
+from app.core.config import settings
+from app.core.log import setup_logging, shutdown_logging
+from app.services.bkt_fit import fit, log_likelihood
+from app.services.bkt_replay import group_starts
+
+logger = logging.getLogger("fit_bkt")
+
+
+async def _kcs(db) -> List[int]:
+    from app.models.events import SubmissionEvent as E
+    rows = await db.execute(select(distinct(E.kc_id)).order_by(E.kc_id))
+    return [k for (k,) in rows]
+
+
+async def load_kc(db, kc_id: int, chunk: int, max_len: int):
+    """(starts, lengths, outcomes) for one KC, sequences capped at max_len."""
+    from app.models.events import SubmissionEvent as E
+
+    users: List[np.ndarray] = []
+    outcomes: List[np.ndarray] = []
+    code, last = -1, None
+    rows = await db.stream(
+        select(E.user_id, E.is_correct)
+        .where(E.kc_id == kc_id)
+        .order_by(E.user_id, E.created_at, E.id)
+        .execution_options(yield_per=chunk)
+    )
+    async for part in rows.partitions():
+        u = np.empty(len(part), dtype=np.int64)
+        for i, (uid, _) in enumerate(part):
+            if uid != last:
+                code, last = code + 1, uid
+            u[i] = code
+        users.append(u)
+        outcomes.append(np.fromiter((c for _, c in part), bool, len(part)))
+
+    if not users:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=bool)
+    user = np.concatenate(users)
+    out = np.concatenate(outcomes)
+    starts = group_starts(user)
+    lengths = np.diff(np.append(starts, len(user)))
+    # the model starts every learner at the prior, so keep the first events
+    return starts, np.minimum(lengths, max_len), out
+
+
+def _version(kcs: Dict[str, Any]) -> str:
+    digest = hashlib.sha256(json.dumps(kcs, sort_keys=True).encode("utf-8")).hexdigest()[:8]
+    return f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{digest}"
+
+
+def write_table(path: str, table: Dict[str, Any]) -> str:
+    base, ext = os.path.splitext(path)
+    versioned = f"{base}.{table['version']}{ext or '.json'}"
+    for target in (versioned, path):
+        tmp = f"{target}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(table, f, indent=2, sort_keys=True)
+        os.replace(tmp, target)
+    return versioned
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from app.core.db import AsyncSessionLocal
+
+    prior = settings.BKT_PRIOR
+    default = bkt.default_params()
+    fitted: Dict[str, Any] = {}
+    report: Dict[str, Any] = {"kcs": {}}
+
+    async with AsyncSessionLocal() as db:
+        kcs = args.kc or await _kcs(db)
+        for kc_id in kcs:
+            t0 = time.perf_counter()
+            starts, lengths, outcomes = await load_kc(db, kc_id, args.chunk, args.max_len)
+            events = int(lengths.sum())
+            info: Dict[str, Any] = {"learners": int(len(starts)), "events": events}
+            if events < args.min_events:
+                info["skipped"] = "too few events"
+                report["kcs"][str(kc_id)] = info
+                continue
+            loaded = time.perf_counter() - t0
+
+            best, best_ll, evaluated = fit(starts, lengths, outcomes, prior)
+            default_ll = float(log_likelihood(starts, lengths, outcomes, [default], prior)[0])
+            info.update(
+                slip=best.slip,
+                guess=best.guess,
+                transit=best.transit,
+                log_likelihood=round(best_ll, 2),
+                default_log_likelihood=round(default_ll, 2),
+                candidates=evaluated,
+                load_seconds=round(loaded, 2),
+                fit_seconds=round(time.perf_counter() - t0 - loaded, 2),
+            )
+            report["kcs"][str(kc_id)] = info
+            fitted[str(kc_id)] = {
+                k: info[k] for k in ("slip", "guess", "transit", "learners", "events", "log_likelihood")
+            }
+            logger.info("KC %s: %s", kc_id, info)
+
+    table = {
+        "version": _version(fitted),
+        "model": "adaptive",
+        "prior": prior,
+        "max_len": args.max_len,
+        "kcs": fitted,
+    }
+    report["version"] = table["version"]
+    if not args.dry_run and fitted:
+        report["written"] = [write_table(args.out, table), args.out]
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Fit per-KC BKT parameters from submission_events.")
+    ap.add_argument("--out", default=settings.BKT_PARAMS_PATH or "bkt_params.json")
+    ap.add_argument("--kc", type=int, action="append", help="only these KCs; repeatable")
+    ap.add_argument("--min-events", type=int, default=500)
+    ap.add_argument("--max-len", type=int, default=500, help="use at most this many events per learner")
+    ap.add_argument("--chunk", type=int, default=50_000, help="rows per fetch")
+    ap.add_argument("--dry-run", action="store_true", help="fit and report, write nothing")
+    args = ap.parse_args()
+
+    setup_logging()
+    try:
+        print(json.dumps(asyncio.run(run(args))))
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# app/tools/replay_bkt.py
+"""
+Re-derive mastery from the submission_events log, e.g. after changing BKT
+parameters (BKT_* / BKT_KC_PARAMS).
+
+    python -m app.tools.replay_bkt --dry-run --check 1000
+    python -m app.tools.replay_bkt --kc 3 --kc 7
+
+Events are streamed in (user, kc, time) order into flat arrays, replayed
+with services.bkt_replay and written back with batched upserts of p_know
+and the correct/incorrect counts. Best sentences are left alone.
+
+A row is only overwritten when its correct + incorrect equals the number of
+events replayed for it. Rows with history from before the log existed, or
+that took a submission while the replay ran, are skipped rather than
+rewound.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core import bkt
+from app.core.config import settings
+from app.core.log import setup_logging, shutdown_logging
+from app.services.bkt_replay import ReplayResult, group_starts, replay
+
+logger = logging.getLogger("replay_bkt")
+
+
+class _Codes:
+    """UUID <-> dense int code."""
+
+    def __init__(self) -> None:
+        self.ids: List[uuid.UUID] = []
+        self._code: Dict[uuid.UUID, int] = {}
+
+    def __call__(self, u: Optional[uuid.UUID]) -> int:
+        if u is None:
+            return -1
+        c = self._code.get(u)
+        if c is None:
+            c = self._code[u] = len(self.ids)
+            self.ids.append(u)
+        return c
+
+
+async def load_events(kcs: Optional[List[int]], chunk: int):
+    from app.core.db import AsyncSessionLocal
+    from app.models.events import SubmissionEvent as E
+
+    users, advs = _Codes(), _Codes()
+    parts: Dict[str, List[np.ndarray]] = {"user": [], "adventure": [], "kc": [], "correct": []}
+    q = select(E.user_id, E.adventure_id, E.kc_id, E.is_correct)
+    if kcs:
+        q = q.where(E.kc_id.in_(kcs))
+    q = q.order_by(E.user_id, E.kc_id, E.created_at, E.id).execution_options(yield_per=chunk)
+
+    async with AsyncSessionLocal() as db:
+        rows = await db.stream(q)
+        async for part in rows.partitions():
+            parts["user"].append(np.fromiter((users(r[0]) for r in part), np.int64, len(part)))
+            parts["adventure"].append(np.fromiter((advs(r[1]) for r in part), np.int64, len(part)))
+            parts["kc"].append(np.fromiter((r[2] for r in part), np.int64, len(part)))
+            parts["correct"].append(np.fromiter((r[3] for r in part), bool, len(part)))
+
+    arrays = {k: (np.concatenate(v) if v else np.zeros(0, np.int64)) for k, v in parts.items()}
+    arrays["correct"] = arrays["correct"].astype(bool)
+    return arrays, users, advs
+
+
+def check_sample(arrays: Dict[str, np.ndarray], result: ReplayResult, n: int) -> int:
+    """Compare n random (user, kc) groups against core.bkt stepping. Returns mismatches."""
+    users = result.users
+    if not len(users) or n <= 0:
+        return 0
+    starts = group_starts(arrays["user"], arrays["kc"])
+    ends = np.append(starts[1:], len(arrays["kc"]))
+    bad = 0
+    for g in random.Random(7).sample(range(len(starts)), min(n, len(starts))):
+        kc = int(arrays["kc"][starts[g]])
+        outcomes = arrays["correct"][starts[g]:ends[g]].tolist()
+        expect = bkt.apply_outcomes(settings.BKT_PRIOR, outcomes, bkt.params_for_kc(kc))
+        bad += int(expect != int(users.p_know[g]))
+    return bad
+
+
+async def write_back(result: ReplayResult, users: _Codes, advs: _Codes, batch: int) -> Dict[str, int]:
+    from app.core.db import AsyncSessionLocal
+    from app.models.stats import AdventureKCStat, UserKCMastery
+
+    sent = {"user_rows": 0, "adventure_rows": 0}
+    targets = (
+        (UserKCMastery, "user_id", result.users, users, "user_rows"),
+        (AdventureKCStat, "adventure_id", result.adventures, advs, "adventure_rows"),
+    )
+    async with AsyncSessionLocal() as db:
+        for model, owner_col, stats, codes, counter in targets:
+            ins = pg_insert(model)
+            t = model.__table__.c
+            stmt = ins.on_conflict_do_update(
+                index_elements=[t[owner_col], t.kc_id],
+                set_={
+                    "p_know": ins.excluded.p_know,
+                    "correct": ins.excluded.correct,
+                    "incorrect": ins.excluded.incorrect,
+                },
+                # only rows whose whole history is in the log
+                where=(t.correct + t.incorrect) == (ins.excluded.correct + ins.excluded.incorrect),
+            )
+            owner = stats.owner.tolist()
+            kc, p, ok, ko = stats.kc.tolist(), stats.p_know.tolist(), stats.correct.tolist(), stats.incorrect.tolist()
+            for i in range(0, len(kc), batch):
+                rows = [
+                    {owner_col: codes.ids[owner[j]], "kc_id": kc[j], "p_know": p[j], "correct": ok[j], "incorrect": ko[j]}
+                    for j in range(i, min(i + batch, len(kc)))
+                ]
+                await db.execute(stmt, rows)
+                await db.commit()
+                sent[counter] += len(rows)
+    return sent
+
+
+async def _main(args: argparse.Namespace) -> None:
+    report: Dict[str, Any] = {}
+    t0 = time.perf_counter()
+    arrays, users, advs = await load_events(args.kc, args.chunk)
+    report["events"] = int(len(arrays["kc"]))
+    report["load_seconds"] = round(time.perf_counter() - t0, 2)
+
+    t0 = time.perf_counter()
+    result = replay(arrays["user"], arrays["adventure"], arrays["kc"], arrays["correct"])
+    report["replay_seconds"] = round(time.perf_counter() - t0, 2)
+    report["user_kc_groups"] = len(result.users)
+    report["adventure_kc_groups"] = len(result.adventures)
+
+    if args.check:
+        report["check_mismatches"] = check_sample(arrays, result, args.check)
+        if report["check_mismatches"]:
+            logger.error("Replay disagrees with core.bkt on %d groups; not writing", report["check_mismatches"])
+            print(json.dumps(report))
+            raise SystemExit(1)
+
+    if not args.dry_run:
+        t0 = time.perf_counter()
+        report.update(await write_back(result, users, advs, args.batch))
+        report["write_seconds"] = round(time.perf_counter() - t0, 2)
+    print(json.dumps(report))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Recompute mastery from submission_events.")
+    ap.add_argument("--kc", type=int, action="append", help="only these KCs; repeatable")
+    ap.add_argument("--dry-run", action="store_true", help="replay and report, write nothing")
+    ap.add_argument("--check", type=int, default=0, help="verify N random groups against core.bkt first")
+    ap.add_argument("--chunk", type=int, default=50_000, help="rows per fetch")
+    ap.add_argument("--batch", type=int, default=5_000, help="rows per upsert batch")
+    args = ap.parse_args()
+
+    setup_logging()
+    try:
+        asyncio.run(_main(args))
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# app/tools/warm_cache.py
+"""
+Bulk-grade sentence corpora into the sentence cache, e.g. after a Redis
+restart or a backend version bump, before the first classroom session.
+
+    python -m app.tools.warm_cache --bank --db --file extra.txt \
+        --progress /tmp/warm.json --resume --concurrency 16
+
+Sources are streamed in a fixed order and deduped on the canonical form.
+Sentences already cached are skipped (one MGET per chunk); the rest are
+graded with bounded concurrency and written back in one pipelined round
+trip per chunk. With --progress the position is saved after every chunk,
+and --resume continues from it.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import distinct, select
+
+from app.core.http import close_http_client
+from app.core.log import setup_logging, shutdown_logging
+from app.services import kc_answer_bank
+from app.services.grammar_backends import close_backends
+from app.services.grammar_service import grade_uncached
+from app.utils.normalize import canonicalize
+from app.utils.redis_cache import STATUS_OK, cached_sentences, set_sentence_cache_many
+
+logger = logging.getLogger("warm_cache")
+
+
+# ---------------- Sources ----------------
+async def _from_files(paths: List[str]) -> AsyncIterator[str]:
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                # answers.json layout ({kc: {tier: [..]}}) or a flat list
+                data = json.load(f)
+                items = data if isinstance(data, list) else [
+                    x for tiers in data.values() for xs in tiers.values() for x in xs
+                ]
+                for x in items:
+                    yield str(x)
+            else:
+                for line in f:
+                    if line.strip():
+                        yield line.rstrip("\n")
+
+
+async def _from_bank() -> AsyncIterator[str]:
+    for bank in kc_answer_bank.get_index().any_tier.values():
+        for a in bank.answers:
+            yield a.text
+
+
+async def _from_db() -> AsyncIterator[str]:
+    from app.core.db import AsyncSessionLocal
+    from app.models.stats import AdventureKCStat, UserKCMastery
+
+    async with AsyncSessionLocal() as db:
+        for model in (UserKCMastery, AdventureKCStat):
+            rows = await db.stream(
+                select(distinct(model.best_sentence))
+                .where(model.best_sentence.is_not(None))
+                .order_by(model.best_sentence)
+                .execution_options(yield_per=1000)
+            )
+            async for (sentence,) in rows:
+                yield sentence
+
+
+async def _sources(args: argparse.Namespace) -> AsyncIterator[str]:
+    if args.file:
+        async for s in _from_files(args.file):
+            yield s
+    if args.bank:
+        async for s in _from_bank():
+            yield s
+    if args.db:
+        async for s in _from_db():
+            yield s
+
+
+# ---------------- Progress ----------------
+def _signature(args: argparse.Namespace) -> str:
+    return json.dumps({"file": args.file or [], "bank": args.bank, "db": args.db})
+
+
+def _load_progress(path: Optional[str], signature: str) -> int:
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path, "r", encoding="utf-8") as f:
+        saved = json.load(f)
+    if saved.get("signature") != signature:
+        logger.warning("Progress file is for other sources; starting over")
+        return 0
+    return int(saved.get("consumed", 0))
+
+
+def _save_progress(path: Optional[str], signature: str, consumed: int, stats: Dict[str, Any]) -> None:
+    if not path:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"signature": signature, "consumed": consumed, "stats": stats}, f)
+    os.replace(tmp, path)
+
+
+# ---------------- Warm ----------------
+async def warm(args: argparse.Namespace) -> Dict[str, Any]:
+    signature = _signature(args)
+    skip = _load_progress(args.progress, signature) if args.resume else 0
+    stats: Dict[str, Any] = {
+        "read": 0, "unique": 0, "already_cached": 0, "graded": 0, "correct": 0, "errors": 0, "fallback": 0,
+    }
+    sem = asyncio.Semaphore(max(1, args.concurrency))
+    seen: set = set()
+    chunk: List[str] = []
+    consumed = 0
+    started = time.perf_counter()
+
+    async def grade(c: str) -> Dict[str, Any]:
+        async with sem:
+            return await grade_uncached(c)
+
+    async def flush() -> bool:
+        present = await cached_sentences(chunk)
+        todo = [c for c, hit in zip(chunk, present) if not hit]
+        stats["already_cached"] += len(chunk) - len(todo)
+        verdicts = await asyncio.gather(*(grade(c) for c in todo))
+        items = []
+        for c, v in zip(todo, verdicts):
+            if v.get("degraded"):
+                stats["errors"] += 1
+                continue
+            if v.get("fallback"):
+                stats["fallback"] += 1  # only the primary backend's verdicts are cached
+                continue
+            items.append((c, v, STATUS_OK))
+            stats["correct"] += 1 if v.get("is_correct") else 0
+        stats["graded"] += await set_sentence_cache_many(items, ttl_days=args.ttl_days)
+        chunk.clear()
+        # a chunk where nothing could be graded means the backend is down
+        return not todo or bool(items)
+
+    async for sentence in _sources(args):
+        consumed += 1
+        if consumed <= skip:
+            continue
+        stats["read"] += 1
+        canonical, _ = canonicalize(sentence)
+        if not canonical or canonical in seen:
+            continue
+        seen.add(canonical)
+        stats["unique"] += 1
+        chunk.append(canonical)
+        if len(chunk) >= args.chunk:
+            if not await flush():
+                logger.error("Backend unavailable; stopping (resume later with --resume)")
+                break
+            _save_progress(args.progress, signature, consumed, stats)
+            elapsed = time.perf_counter() - started
+            logger.info(
+                "Warm progress",
+                extra={**stats, "per_second": round(stats["unique"] / elapsed, 1) if elapsed else 0.0},
+            )
+    else:
+        if chunk:
+            await flush()
+        _save_progress(args.progress, signature, consumed, stats)
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 2)
+    stats["sentences_per_second"] = round(stats["unique"] / elapsed, 1) if elapsed else 0.0
+    stats["graded_per_second"] = round(stats["graded"] / elapsed, 1) if elapsed else 0.0
+    return stats
+
+
+async def _main(args: argparse.Namespace) -> None:
+    try:
+        report = await warm(args)
+    finally:
+        await close_backends()
+        await close_http_client()
+    print(json.dumps(report))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Bulk-grade sentences into the sentence cache.")
+    ap.add_argument("--file", action="append", help="text file (one sentence per line) or .json; repeatable")
+    ap.add_argument("--bank", action="store_true", help="all answer-bank sentences")
+    ap.add_argument("--db", action="store_true", help="historical best_sentence values")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--chunk", type=int, default=200, help="sentences per MGET/pipeline round")
+    ap.add_argument("--ttl-days", type=int, default=30)
+    ap.add_argument("--progress", help="progress file to write after each chunk")
+    ap.add_argument("--resume", action="store_true", help="continue from --progress")
+    args = ap.parse_args()
+    if not (args.file or args.bank or args.db):
+        ap.error("pick at least one source: --file, --bank or --db")
+
+    setup_logging()
+    try:
+        asyncio.run(_main(args))
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# app/utils/error_codes.py
+from typing import Dict, Tuple
+
+# ---------------- Kid-Friendly Error Messages ----------------
+ERROR_FRIENDLY: Dict[str, str] = {
+
+    "M:PART": "A word is missing.",
+    "M:PUNCT": "You forgot punctuation.",
+    "M:CONJ": "A joining word is missing.",
+    "M:DET": "A helper word is missing.",
+    "M:DET:ART": "You need a, an, or the.",
+    "M:PREP": "A place word is missing.",
+    "M:PRON": "A name word is missing.",
+    "M:VERB": "An action word is missing.",
+    "M:ADJ": "A describing word is missing.",
+    "M:NOUN": "A thing word is missing.",
+    "M:NOUN:POSS": "You need 's here.",
+    "M:OTHER": "Something is missing.",
+
+    "R:PART": "This word doesn’t fit.",
+    "R:PUNCT": "The punctuation needs fixing.",
+    "R:ORTH": "This spelling looks wrong.",
+    "R:SPELL": "Spelling mistake here.",
+    "R:WO": "Words are in the wrong order.",
+    "R:MORPH": "This word sounds wrong.",
+    "R:ADV": "Use a word ending in -ly.",
+    "R:CONTR": "The shortened word is wrong.",
+    "R:CONJ": "The joining word is wrong.",
+    "R:DET": "The helper word is wrong.",
+    "R:DET:ART": "Use a, an, or the correctly.",
+    "R:PREP": "The place word is wrong.",
+    "R:PRON": "The name word is wrong.",
+    "R:VERB:FORM": "The action word needs changing.",
+    "R:VERB:TENSE": "The time of the action is wrong.",
+    "R:VERB:SVA": "This verb doesn’t match the subject.",
+    "R:ADJ:FORM": "The describing word needs fixing.",
+    "R:NOUN:INFL": "The plural is wrong.",
+    "R:NOUN:NUM": "The number word is wrong.",
+    "R:OTHER": "This part needs fixing.",
+
+    "U:PART": "There’s an extra word.",
+    "U:PUNCT": "There’s extra punctuation.",
+    "U:ADV": "There’s an extra -ly word.",
+    "U:CONTR": "There’s an extra shortened word.",
+    "U:CONJ": "There’s an extra joining word.",
+    "U:DET": "There’s an extra helper word.",
+    "U:DET:ART": "There’s an extra a, an, or the.",
+    "U:PREP": "There’s an extra place word.",
+    "U:PRON": "There’s an extra name word.",
+    "U:VERB": "There’s an extra action word.",
+    "U:ADJ": "There’s an extra describing word.",
+    "U:NOUN": "There’s an extra thing word.",
+    "U:NOUN:POSS": "There’s an extra 's.",
+    "U:OTHER": "There’s something extra here.",
+}
+
+DEFAULT_FRIENDLY = "Something needs fixing."
+
+# Stable ids for error types, used by the compact sentence-cache encoding.
+# APPEND-ONLY: cached entries refer to these positions, so never reorder or
+# remove an entry; new error types go at the end.
+ERROR_CODES: Tuple[str, ...] = (
+    "",  # 0: DEFAULT_FRIENDLY
+    "M:PART",
+    "M:PUNCT",
+    "M:CONJ",
+    "M:DET",
+    "M:DET:ART",
+    "M:PREP",
+    "M:PRON",
+    "M:VERB",
+    "M:ADJ",
+    "M:NOUN",
+    "M:NOUN:POSS",
+    "M:OTHER",
+    "R:PART",
+    "R:PUNCT",
+    "R:ORTH",
+    "R:SPELL",
+    "R:WO",
+    "R:MORPH",
+    "R:ADV",
+    "R:CONTR",
+    "R:CONJ",
+    "R:DET",
+    "R:DET:ART",
+    "R:PREP",
+    "R:PRON",
+    "R:VERB:FORM",
+    "R:VERB:TENSE",
+    "R:VERB:SVA",
+    "R:ADJ:FORM",
+    "R:NOUN:INFL",
+    "R:NOUN:NUM",
+    "R:OTHER",
+    "U:PART",
+    "U:PUNCT",
+    "U:ADV",
+    "U:CONTR",
+    "U:CONJ",
+    "U:DET",
+    "U:DET:ART",
+    "U:PREP",
+    "U:PRON",
+    "U:VERB",
+    "U:ADJ",
+    "U:NOUN",
+    "U:NOUN:POSS",
+    "U:OTHER",
+)
+
+# feedback message -> code id (first error type using that message)
+FEEDBACK_IDS: Dict[str, int] = {DEFAULT_FRIENDLY: 0}
+for _i, _code in enumerate(ERROR_CODES[1:], start=1):
+    FEEDBACK_IDS.setdefault(ERROR_FRIENDLY.get(_code, DEFAULT_FRIENDLY), _i)
+
+
+def feedback_for(code_id: int) -> str:
+    code = ERROR_CODES[code_id] if 0 <= code_id < len(ERROR_CODES) else ""
+    return ERROR_FRIENDLY.get(code, DEFAULT_FRIENDLY)
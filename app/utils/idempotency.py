@@ -6,4 +6,9 @@ async def ensure_idempotent(key: str, ttl_seconds: int = 300) -> bool:
     if claimed:
         await redis.expire(f"idem:{key}", ttl_seconds)
         return True
-    return False
\ No newline at end of file
+    return False
+
+
+async def release_idempotent(key: str) -> None:
+    # give the key back so a retry of a request that did not complete is accepted
+    await redis.delete(f"idem:{key}")
@@ -1,6 +1,49 @@
 import re
+from typing import List, Tuple
 
 def normalize_sentence(s: str) -> str:
     s = s.strip()
     s = re.sub(r"\s+", " ", s)
-    return s
\ No newline at end of file
+    return s
+
+
+# Typographic quote variants. Folding these never changes a verdict; dashes,
+# ellipses and other NFKC compatibility forms can, so they are left alone.
+_CHAR_MAP = {
+    "‘": "'", "’": "'", "‚": "'", "‛": "'", "′": "'",
+    "“": '"', "”": '"', "„": '"', "‟": '"', "″": '"',
+}
+
+def canonicalize(s: str) -> Tuple[str, List[Tuple[int, int]]]:
+    """
+    Canonical form used as the grading/cache identity: plain quotes and
+    apostrophes, whitespace collapsed and stripped. Nothing else is
+    rewritten, since this is also the text the backend grades.
+
+    Also returns, per canonical character, the (start, end) span of the
+    submitted string it came from, so offsets can be mapped back.
+    """
+    out: List[str] = []
+    spans: List[Tuple[int, int]] = []
+    for i, c in enumerate(s):
+        c = _CHAR_MAP.get(c, c)
+        if c.isspace():
+            if not out or out[-1] == " ":
+                continue
+            c = " "
+        out.append(c)
+        spans.append((i, i + 1))
+    if out and out[-1] == " ":
+        out.pop()
+        spans.pop()
+    return "".join(out), spans
+
+def remap_span(spans: List[Tuple[int, int]], start: int, end: int, length: int) -> Tuple[int, int]:
+    """Maps a [start, end) range in the canonical string onto the original."""
+    if not spans:
+        return 0, 0
+    if start >= len(spans):
+        return length, length
+    if end <= start:
+        return spans[start][0], spans[start][0]
+    return spans[start][0], spans[min(end, len(spans)) - 1][1]
@@ -0,0 +1,11 @@
+from app.core.redis import redis
+
+async def within_quota(key: str, limit: int, window_seconds: int) -> bool:
+    # fixed-window counter; True while `key` has used fewer than `limit` hits
+    try:
+        n = await redis.incr(f"rl:{key}")
+        if n == 1:
+            await redis.expire(f"rl:{key}", window_seconds)
+    except Exception:
+        return False  # only used for optional traffic; fail closed
+    return n <= limit
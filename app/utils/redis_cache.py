@@ -1,8 +1,16 @@
 # app/utils/redis_cache.py
 from __future__ import annotations
-import json, time, hashlib
-from typing import Optional, Dict, Tuple, TYPE_CHECKING, Any
+import asyncio, json, time, hashlib, secrets
+from functools import lru_cache
+from typing import Optional, Dict, List, Tuple, TYPE_CHECKING, Any
 from app.core.config import settings
+from app.utils.error_codes import FEEDBACK_IDS, feedback_for
+from app.utils.ttl_cache import TTLCache
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None  # fall back to the plain JSON format
 
 if TYPE_CHECKING:
     from redis.asyncio.client import Redis as RedisType
@@ -15,24 +23,54 @@ except Exception:
     redis_from_url = None  # redis not installed/unavailable
 
 _redis: Optional[RedisType] = None
-_fallback: Dict[str, Tuple[float, str]] = {}
+_redis_retry_at = 0.0  # after a failed connect, don't retry on every call
 _TTL_DEFAULT = 30 * 24 * 60 * 60  # 30 days
 
-def _key(sentence: str, kc_id: Optional[int]) -> str:
-    h = hashlib.sha256(sentence.encode("utf-8")).hexdigest()
-    return f"gh:sapling:{kc_id or 0}:{h}"
+# L1: bounded in-process tier in front of Redis (L2). Also the only tier when
+# Redis is unavailable, so it must never grow without bound.
+_l1: TTLCache[bytes] = TTLCache(
+    settings.SENTENCE_CACHE_L1_MAX_ITEMS,
+    max_bytes=settings.SENTENCE_CACHE_L1_MAX_BYTES,
+    sizeof=len,
+)
+_l2_counters: Dict[str, int] = {"hits": 0, "misses": 0, "errors": 0}
+
+# Entry status. Only "ok" entries get the long TTL; backend failures are
+# negative-cached for SENTENCE_CACHE_NEGATIVE_TTL_SECONDS.
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+@lru_cache(maxsize=8)
+def _backend_version(name: str) -> str:
+    # keyed on the backend name, so changing GRAMMAR_BACKEND picks up the
+    # new backend; versions are class attributes, fixed for the process
+    from app.services.grammar_backends import get_backend  # services import this module
+    return f"{name}:{get_backend(name).version}"
+
+def _model_version() -> str:
+    """`backend:version` of GRAMMAR_BACKEND, the only backend whose verdicts are cached."""
+    return _backend_version(settings.GRAMMAR_BACKEND)
+
+def _key(canonical: str, model_version: Optional[str] = None) -> str:
+    # Content-addressed: the verdict only depends on the canonical sentence
+    # (see app.utils.normalize.canonicalize), not on the KC it was submitted
+    # under. The backend and its version are part of the key, so switching
+    # GRAMMAR_BACKEND or rolling out a new version starts on a clean keyspace
+    # and the old entries simply age out.
+    h = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    return f"gh:sapling:{model_version or _model_version()}:{h}"
 
 async def _client() -> Optional[RedisType]:
-    global _redis
+    global _redis, _redis_retry_at
     if _redis is not None:
         return _redis
     url = settings.REDIS_URL
-    if not url or not redis_from_url:
+    if not url or not redis_from_url or time.time() < _redis_retry_at:
         return None
     try:
         _redis = redis_from_url(
             url,
-            decode_responses=True,
+            decode_responses=False,  # values are binary (see _encode)
             socket_connect_timeout=0.5,
             socket_timeout=0.5,
         )
@@ -40,30 +78,198 @@ async def _client() -> Optional[RedisType]:
         return _redis
     except Exception:
         _redis = None
+        _redis_retry_at = time.time() + 5
         return None
 
-async def get_sentence_cache(sentence: str, kc_id: Optional[int]):
-    key = _key(sentence, kc_id)
+# ---------------- Value encoding ----------------
+# v2: version byte + msgpack array of the fields below, feedback as error-code
+# ids (see app.utils.error_codes), plus a dict for any other keys. Without
+# msgpack installed entries are plain JSON (they start with "{"). The model
+# version lives in the key, not the value. Entries from before the
+# content-addressed keys are never read again and just expire.
+# Only the verdict is stored; anything that depends on the submitted string
+# (error_indices, sentence_power, ...) is derived per request.
+_FORMAT_V2 = 2
+_V2_FIELDS = ("is_correct", "spans", "feedback", "scores", "cached_at")
+_STATUS_IDS = {STATUS_OK: 0, STATUS_ERROR: 1}
+_STATUS_NAMES = {v: k for k, v in _STATUS_IDS.items()}
+
+def _encode(entry: dict) -> bytes:
+    if msgpack is None:
+        return json.dumps(entry).encode("utf-8")
+    e = dict(entry)
+    e.pop("from_cache", None)
+    e.pop("model_version", None)
+    e["feedback"] = [FEEDBACK_IDS.get(m, m) for m in e.get("feedback", [])]
+    row = [e.pop(f, None) for f in _V2_FIELDS]
+    row.append(_STATUS_IDS.get(e.pop("status", STATUS_OK), 1))
+    row.append(e)  # whatever is left (degraded, ...)
+    return bytes((_FORMAT_V2,)) + msgpack.packb(row, use_bin_type=True)
+
+def _decode(raw: bytes) -> Optional[dict]:
+    if raw[:1] == b"{":
+        return json.loads(raw)
+    if raw[0] != _FORMAT_V2 or msgpack is None:
+        return None  # unknown format: treat as a miss
+    row = msgpack.unpackb(raw[1:], raw=False)
+    out = dict(zip(_V2_FIELDS, row))
+    out["feedback"] = [feedback_for(m) if isinstance(m, int) else m for m in out["feedback"] or []]
+    out["status"] = _STATUS_NAMES.get(row[len(_V2_FIELDS)], STATUS_ERROR)
+    out["model_version"] = _model_version()
+    out.update(row[len(_V2_FIELDS) + 1])
+    return out
+
+async def get_sentence_cache(canonical: str):
+    key = _key(canonical)
+    now = time.time()
+    val = _l1.get(key, now)
+    if val is not None:
+        return _decode(val)
     client = await _client()
     if client:
         try:
             val = await client.get(key)
-            return json.loads(val) if val else None
         except Exception:
-            pass
-    itm = _fallback.get(key)
-    if itm and itm[0] > time.time():
-        return json.loads(itm[1])
+            _l2_counters["errors"] += 1
+            return None
+        if not val:
+            _l2_counters["misses"] += 1
+            return None
+        _l2_counters["hits"] += 1
+        entry = _decode(val)
+        if entry is None:
+            return None
+        _l1.set(key, val, now + settings.SENTENCE_CACHE_L1_TTL_SECONDS)
+        return entry
     return None
 
-async def set_sentence_cache(sentence: str, kc_id: Optional[int], value: dict, ttl_days: int = 30):
-    key = _key(sentence, kc_id)
-    s = json.dumps(value)
+async def set_sentence_cache(
+    canonical: str,
+    value: dict,
+    ttl_days: int = 30,
+    status: str = STATUS_OK,
+):
+    """Stores `value` tagged with status, model version and cached_at."""
+    mv = _model_version()
+    key = _key(canonical, mv)
+    entry = {**value, "status": status, "model_version": mv, "cached_at": int(time.time())}
+    s = _encode(entry)
+    if status != STATUS_OK:
+        ttl = settings.SENTENCE_CACHE_NEGATIVE_TTL_SECONDS
+    else:
+        ttl = ttl_days * 24 * 60 * 60 if ttl_days else _TTL_DEFAULT
+    _l1.set(key, s, time.time() + min(ttl, settings.SENTENCE_CACHE_L1_TTL_SECONDS))
     client = await _client()
     if client:
         try:
-            await client.set(key, s, ex=ttl_days * 24 * 60 * 60)
-            return
+            await client.set(key, s, ex=ttl)
         except Exception:
-            pass
-    _fallback[key] = (time.time() + _TTL_DEFAULT, s)
\ No newline at end of file
+            _l2_counters["errors"] += 1
+
+async def cached_sentences(canonicals: List[str]) -> List[bool]:
+    """Which of `canonicals` already have an entry (L1, then one MGET)."""
+    now = time.time()
+    mv = _model_version()
+    found = [_l1.get(_key(c, mv), now) is not None for c in canonicals]
+    missing = [i for i, hit in enumerate(found) if not hit]
+    client = await _client()
+    if client and missing:
+        try:
+            vals = await client.mget([_key(canonicals[i], mv) for i in missing])
+        except Exception:
+            _l2_counters["errors"] += 1
+            return found
+        for i, v in zip(missing, vals):
+            found[i] = bool(v)
+    return found
+
+async def set_sentence_cache_many(
+    items: List[Tuple[str, dict, str]], ttl_days: int = 30
+) -> int:
+    """Bulk write of (canonical, value, status) in one pipelined round trip."""
+    if not items:
+        return 0
+    now = int(time.time())
+    ok_ttl = ttl_days * 24 * 60 * 60 if ttl_days else _TTL_DEFAULT
+    mv = _model_version()
+    client = await _client()
+    pipe = client.pipeline(transaction=False) if client else None
+    for canonical, value, status in items:
+        key = _key(canonical, mv)
+        s = _encode({**value, "status": status, "model_version": mv, "cached_at": now})
+        ttl = settings.SENTENCE_CACHE_NEGATIVE_TTL_SECONDS if status != STATUS_OK else ok_ttl
+        _l1.set(key, s, now + min(ttl, settings.SENTENCE_CACHE_L1_TTL_SECONDS))
+        if pipe is not None:
+            pipe.set(key, s, ex=ttl)
+    if pipe is not None:
+        try:
+            await pipe.execute()
+        except Exception:
+            _l2_counters["errors"] += 1
+            return 0
+    return len(items)
+
+def sentence_cache_stats() -> Dict[str, Any]:
+    return {"l1": _l1.stats(), "l2": dict(_l2_counters)}
+
+
+# ---------------- Cross-worker single-flight ----------------
+_UNLOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+def _lock_key(canonical: str) -> str:
+    return "gh:lock:" + _key(canonical)
+
+async def acquire_sentence_lock(canonical: str, ttl_seconds: float) -> Optional[str]:
+    """
+    Claims the right to grade `canonical` across workers. Returns a token to
+    pass to `release_sentence_lock`, or None if another worker holds it.
+    Without Redis every caller gets a (no-op) token.
+    """
+    client = await _client()
+    if not client:
+        return "local"
+    token = secrets.token_hex(8)
+    try:
+        ok = await client.set(_lock_key(canonical), token, nx=True, px=int(ttl_seconds * 1000))
+    except Exception:
+        return "local"
+    return token if ok else None
+
+async def release_sentence_lock(canonical: str, token: str) -> None:
+    if token == "local":
+        return
+    client = await _client()
+    if not client:
+        return
+    try:
+        await client.eval(_UNLOCK_SCRIPT, 1, _lock_key(canonical), token)
+    except Exception:
+        pass
+
+async def wait_for_sentence_cache(canonical: str, timeout: float):
+    """
+    Polls for the result another worker is computing. Returns it, or None if
+    the lock went away without a result or `timeout` passed.
+    """
+    client = await _client()
+    if not client:
+        return None
+    deadline = time.monotonic() + timeout
+    delay = 0.02
+    while time.monotonic() < deadline:
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.2)
+        hit = await get_sentence_cache(canonical)
+        if hit:
+            return hit
+        try:
+            if not await client.exists(_lock_key(canonical)):
+                return await get_sentence_cache(canonical)
+        except Exception:
+            return None
+    return None
@@ -0,0 +1,79 @@
+# app/utils/ttl_cache.py
+from __future__ import annotations
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """
+    Small in-process LRU where every entry carries its own absolute expiry
+    (a ``time.time()`` timestamp). Not thread-safe; meant for use from the
+    event loop only.
+
+    With ``max_bytes`` set, ``sizeof(value)`` is charged per entry and least
+    recently used entries are evicted until the total fits.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[V], int]] = None,
+    ):
+        self.maxsize = max(1, int(maxsize))
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda _: 0)
+        self._data: "OrderedDict[Hashable, Tuple[float, V, int]]" = OrderedDict()
+        self.bytes = 0
+        self.counters: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _drop(self, key: Hashable) -> Optional[Tuple[float, V, int]]:
+        itm = self._data.pop(key, None)
+        if itm is not None:
+            self.bytes -= itm[2]
+        return itm
+
+    def get(self, key: Hashable, now: Optional[float] = None) -> Optional[V]:
+        itm = self._data.get(key)
+        if itm is None:
+            self.counters["misses"] += 1
+            return None
+        if itm[0] <= (now if now is not None else time.time()):
+            self._drop(key)
+            self.counters["expired"] += 1
+            self.counters["misses"] += 1
+            return None
+        self._data.move_to_end(key)
+        self.counters["hits"] += 1
+        return itm[1]
+
+    def set(self, key: Hashable, value: V, expires_at: float) -> None:
+        size = self._sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # never admit something that would flush the whole cache
+        self._drop(key)
+        self._data[key] = (expires_at, value, size)
+        self.bytes += size
+        while len(self._data) > self.maxsize or (
+            self.max_bytes is not None and self.bytes > self.max_bytes
+        ):
+            _, (_, _, old_size) = self._data.popitem(last=False)
+            self.bytes -= old_size
+            self.counters["evictions"] += 1
+
+    def pop(self, key: Hashable) -> Any:
+        itm = self._drop(key)
+        return itm[1] if itm else None
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "items": len(self._data), "bytes": self.bytes}
@@ -0,0 +1,148 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.batching import BatchQueueFull, MicroBatcher
+
+
+class FakeBatchEndpoint:
+    """A local batch endpoint: records each batch and echoes items back."""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.batches = []
+        self.delay = delay
+        self.fail = fail
+
+    async def __call__(self, items):
+        self.batches.append(list(items))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("backend down")
+        return [f"graded:{i}" for i in items]
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_results_come_back_to_their_callers_in_order():
+    async def main():
+        endpoint = FakeBatchEndpoint()
+        b = MicroBatcher(endpoint, name="t", max_batch=8, window_ms=20)
+        out = await asyncio.gather(*(b.submit(i) for i in range(5)))
+        await b.close()
+        return endpoint, out
+
+    endpoint, out = _run(main())
+    assert out == [f"graded:{i}" for i in range(5)]
+    assert endpoint.batches == [[0, 1, 2, 3, 4]]
+
+
+def test_items_are_split_into_batches_of_max_batch():
+    async def main():
+        endpoint = FakeBatchEndpoint()
+        b = MicroBatcher(endpoint, name="t", max_batch=3, window_ms=20)
+        out = await asyncio.gather(*(b.submit(i) for i in range(7)))
+        await b.close()
+        return endpoint, out, b.stats()
+
+    endpoint, out, stats = _run(main())
+    assert out == [f"graded:{i}" for i in range(7)]
+    assert endpoint.batches == [[0, 1, 2], [3, 4, 5], [6]]
+    assert stats["batches"] == 3 and stats["items"] == 7
+
+
+def test_full_batch_is_sent_without_waiting_for_the_window():
+    async def main():
+        b = MicroBatcher(FakeBatchEndpoint(), name="t", max_batch=3, window_ms=1000)
+        start = time.monotonic()
+        await asyncio.gather(*(b.submit(i) for i in range(3)))
+        elapsed = time.monotonic() - start
+        await b.close()
+        return elapsed
+
+    assert _run(main()) < 0.5
+
+
+def test_lone_item_waits_for_the_window():
+    async def main():
+        b = MicroBatcher(FakeBatchEndpoint(), name="t", max_batch=8, window_ms=50)
+        start = time.monotonic()
+        await b.submit("x")
+        elapsed = time.monotonic() - start
+        await b.close()
+        return elapsed
+
+    assert 0.04 <= _run(main()) < 0.5
+
+
+def test_full_queue_rejects_instead_of_growing():
+    async def main():
+        b = MicroBatcher(FakeBatchEndpoint(delay=0.2), name="t", max_batch=1, window_ms=0,
+                         max_queue=2, max_inflight=1)
+        tasks = [asyncio.ensure_future(b.submit(i)) for i in range(6)]
+        out = await asyncio.gather(*tasks, return_exceptions=True)
+        await b.close()
+        return out, b.stats()
+
+    out, stats = _run(main())
+    rejected = [r for r in out if isinstance(r, BatchQueueFull)]
+    assert rejected and stats["rejected"] == len(rejected)
+
+
+def test_item_timeout():
+    async def main():
+        b = MicroBatcher(FakeBatchEndpoint(delay=0.5), name="t", window_ms=0, item_timeout=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await b.submit("slow")
+        stats = b.stats()
+        await b.close()
+        return stats
+
+    assert _run(main())["timeouts"] == 1
+
+
+def test_failed_batch_fails_every_caller():
+    async def main():
+        b = MicroBatcher(FakeBatchEndpoint(fail=True), name="t", max_batch=4, window_ms=10)
+        out = await asyncio.gather(*(b.submit(i) for i in range(3)), return_exceptions=True)
+        await b.close()
+        return out, b.stats()
+
+    out, stats = _run(main())
+    assert all(isinstance(r, RuntimeError) for r in out)
+    assert stats["failed_batches"] == 1
+
+
+def test_low_priority_items_only_fill_leftover_room():
+    async def main():
+        endpoint = FakeBatchEndpoint()
+        b = MicroBatcher(endpoint, name="t", max_batch=3, window_ms=20, max_low_queue=1)
+        low = [asyncio.ensure_future(b.submit(f"low{i}", low_priority=True)) for i in range(2)]
+        high = [asyncio.ensure_future(b.submit(i)) for i in range(4)]
+        out = await asyncio.gather(*high, *low, return_exceptions=True)
+        await b.close()
+        return endpoint, out
+
+    endpoint, out = _run(main())
+    assert endpoint.batches == [[0, 1, 2], [3, "low0"]]
+    assert isinstance(out[-1], BatchQueueFull)  # low lane holds one item
+
+
+def test_close_fails_callers_waiting_for_a_slot():
+    async def main():
+        b = MicroBatcher(FakeBatchEndpoint(delay=0.2), name="t", max_batch=2, window_ms=1,
+                         max_inflight=1, item_timeout=5)
+        tasks = [asyncio.ensure_future(b.submit(i)) for i in range(6)]
+        await asyncio.sleep(0.05)
+        start = time.monotonic()
+        await b.close()
+        out = await asyncio.gather(*tasks, return_exceptions=True)
+        return out, time.monotonic() - start
+
+    out, elapsed = _run(main())
+    assert out[:2] == ["graded:0", "graded:1"]  # the batch already in flight completes
+    assert all(isinstance(r, BatchQueueFull) for r in out[2:])
+    assert elapsed < 1
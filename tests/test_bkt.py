@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from app.core import bkt
+from app.core.config import settings
+from app.services.bkt_service import update_pknow
+
+_rng = random.Random(7)
+PARAM_SETS = [bkt.default_params()] + [
+    bkt.BKTParams(
+        slip=round(_rng.uniform(0.01, 0.4), 3),
+        guess=round(_rng.uniform(0.01, 0.4), 3),
+        transit=round(_rng.uniform(0.01, 0.5), 3),
+    )
+    for _ in range(25)
+]
+
+
+def _float_step(state: int, is_correct: bool, p: bkt.BKTParams) -> int:
+    return int(round(update_pknow(state / 100.0, is_correct, p.slip, p.guess, p.transit) * 100))
+
+
+def _float_apply(state: int, outcomes, p: bkt.BKTParams) -> int:
+    for o in outcomes:
+        state = _float_step(state, o, p)
+    return state
+
+
+def _streaky(rng: random.Random, n: int):
+    outcomes, o = [], rng.random() < 0.5
+    for _ in range(n):
+        if rng.random() < 0.3:
+            o = not o
+        outcomes.append(o)
+    return outcomes
+
+
+@pytest.mark.parametrize("p", PARAM_SETS, ids=str)
+def test_table_matches_one_float_step(p):
+    incorrect, correct = bkt.table(p)
+    assert list(incorrect) == [_float_step(s, False, p) for s in range(bkt.STATES)]
+    assert list(correct) == [_float_step(s, True, p) for s in range(bkt.STATES)]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_apply_outcomes_and_compose_match_float_stepping(seed):
+    rng = random.Random(seed)
+    for _ in range(50):
+        p = rng.choice(PARAM_SETS)
+        start = rng.randrange(bkt.STATES)
+        outcomes = _streaky(rng, rng.randint(0, 60))
+        expect = _float_apply(start, outcomes, p)
+        assert bkt.apply_outcomes(start, outcomes, p) == expect
+        assert bkt.compose(outcomes, p)[start] == expect
+
+
+@pytest.mark.parametrize("is_correct", [False, True])
+def test_long_streak_is_one_hop_with_the_same_result(is_correct):
+    p = bkt.default_params()
+    for k in (1, 2, 3, 64, 65, 1000):
+        for start in (0, 37, 100):
+            assert bkt.apply_outcomes(start, [is_correct] * k, p) == _float_apply(start, [is_correct] * k, p)
+
+
+def test_out_of_range_states_are_clamped():
+    p = bkt.default_params()
+    assert bkt.step(-5, True, p) == bkt.step(0, True, p)
+    assert bkt.step(140, False, p) == bkt.step(100, False, p)
+    assert bkt.step(41.6, True, p) == bkt.step(42, True, p)
+
+
+def test_first_state_steps_from_the_prior():
+    p = bkt.default_params()
+    assert bkt.first_state(True, p) == _float_step(settings.BKT_PRIOR, True, p)
+    assert bkt.first_state(False, p) == _float_step(settings.BKT_PRIOR, False, p)
+
+
+def test_kc_override_beats_defaults(monkeypatch):
+    monkeypatch.setattr(settings, "BKT_KC_PARAMS", {3: {"slip": 0.05}})
+    monkeypatch.setattr(bkt, "_fitted", {})
+    assert bkt.params_for_kc(3) == bkt.BKTParams(0.05, settings.BKT_GUESS, settings.BKT_TRANSIT)
+    assert bkt.params_for_kc(4) == bkt.default_params()
@@ -0,0 +1,191 @@
+import asyncio
+import datetime
+import time
+from types import SimpleNamespace
+
+import httpx
+import jwt
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from fastapi import HTTPException
+
+from app.core import firebase
+from app.core.config import settings
+from app.utils.ttl_cache import TTLCache
+
+PROJECT = "grammar-heroes-test"
+
+
+def _keypair():
+    """(private key, PEM certificate) standing in for one of Google's keys."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return key, cert.public_bytes(serialization.Encoding.PEM).decode("utf-8")
+
+
+OLD_KEY, OLD_PEM = _keypair()
+NEW_KEY, NEW_PEM = _keypair()
+
+
+def _token(key=OLD_KEY, kid="old", uid="user-1", **claims) -> str:
+    now = int(time.time())
+    payload = {
+        "iss": f"https://securetoken.google.com/{PROJECT}",
+        "aud": PROJECT,
+        "sub": uid,
+        "iat": now - 10,
+        "auth_time": now - 10,
+        "exp": now + 3600,
+        **claims,
+    }
+    return jwt.encode(payload, key, algorithm="RS256", headers={"kid": kid})
+
+
+class _Users:
+    """Stands in for firebase_admin.auth.get_user."""
+
+    def __init__(self):
+        self.calls = 0
+        self.valid_after_ms = 0
+        self.disabled = False
+
+    def __call__(self, uid):
+        self.calls += 1
+        return SimpleNamespace(tokens_valid_after_timestamp=self.valid_after_ms, disabled=self.disabled)
+
+
+@pytest.fixture
+def users(monkeypatch):
+    users = _Users()
+    monkeypatch.setattr(firebase, "init_firebase", lambda: None)
+    monkeypatch.setattr(firebase, "_project_id", PROJECT)
+    monkeypatch.setattr(firebase, "_claims_cache", TTLCache(100))
+    monkeypatch.setattr(firebase, "_revocation_cache", TTLCache(100))
+    monkeypatch.setattr(firebase, "_keys_last_forced", 0.0)
+    monkeypatch.setattr(firebase.auth, "get_user", users)
+    firebase.set_signing_keys({"old": OLD_PEM})
+    return users
+
+
+@pytest.fixture
+def google_certs(monkeypatch):
+    """Serves the rotated key set from the certs URL; returns the fetch count."""
+    fetches = []
+    real_client = httpx.AsyncClient
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        fetches.append(request.url)
+        return httpx.Response(
+            200,
+            json={"old": OLD_PEM, "new": NEW_PEM},
+            headers={"cache-control": "public, max-age=600"},
+        )
+
+    monkeypatch.setattr(
+        firebase.httpx, "AsyncClient",
+        lambda **kw: real_client(transport=httpx.MockTransport(handler), **kw),
+    )
+    return fetches
+
+
+def _verify(token: str) -> dict:
+    return asyncio.run(firebase.verify_id_token(token))
+
+
+def test_valid_token_is_verified_once_and_cached(users):
+    token = _token()
+    assert _verify(token)["uid"] == "user-1"
+    assert _verify(token)["uid"] == "user-1"
+    assert len(firebase._claims_cache) == 1
+    assert users.calls == 1  # revocation state is cached too
+
+
+def test_unknown_kid_refetches_rotated_keys(users, google_certs):
+    assert _verify(_token(NEW_KEY, kid="new"))["uid"] == "user-1"
+    assert len(google_certs) == 1
+    assert firebase._keys_expire_at > time.time() + 500  # honours max-age
+
+
+def test_forced_key_refresh_is_throttled(users, google_certs):
+    with pytest.raises(HTTPException) as exc:
+        _verify(_token(NEW_KEY, kid="unknown"))
+    assert exc.value.status_code == 401
+    with pytest.raises(HTTPException):
+        _verify(_token(NEW_KEY, kid="unknown", uid="user-2"))
+    assert len(google_certs) == 1
+
+
+def test_expired_key_set_is_refreshed(users, google_certs):
+    firebase.set_signing_keys({"old": OLD_PEM}, max_age=0)
+    assert _verify(_token())["uid"] == "user-1"
+    assert len(google_certs) == 1
+
+
+@pytest.mark.parametrize(
+    "claims",
+    [
+        {"exp": int(time.time()) - 60},
+        {"aud": "some-other-project"},
+        {"iss": "https://securetoken.google.com/some-other-project"},
+        {"sub": ""},
+    ],
+    ids=["expired", "wrong-audience", "wrong-issuer", "empty-subject"],
+)
+def test_invalid_claims_are_rejected(users, claims):
+    with pytest.raises(HTTPException) as exc:
+        _verify(_token(**claims))
+    assert exc.value.status_code == 401
+    assert exc.value.detail == "Invalid Firebase token"
+    assert len(firebase._claims_cache) == 0
+
+
+def test_token_signed_by_another_key_is_rejected(users):
+    with pytest.raises(HTTPException):
+        _verify(_token(NEW_KEY, kid="old"))
+
+
+def test_non_rs256_token_is_rejected(users):
+    token = jwt.encode({"sub": "user-1"}, "secret", algorithm="HS256", headers={"kid": "old"})
+    with pytest.raises(HTTPException):
+        _verify(token)
+
+
+def test_revoked_token_is_rejected_and_evicted(users):
+    users.valid_after_ms = int(time.time() * 1000)  # revoked after the token's iat
+    token = _token()
+    with pytest.raises(HTTPException) as exc:
+        _verify(token)
+    assert exc.value.detail == "SESSION_TERMINATED"
+    assert len(firebase._claims_cache) == 0
+
+
+def test_disabled_user_is_rejected(users):
+    users.disabled = True
+    with pytest.raises(HTTPException) as exc:
+        _verify(_token())
+    assert exc.value.detail == "Invalid Firebase token"
+
+
+def test_revocation_state_expires_after_ttl(users, monkeypatch):
+    monkeypatch.setattr(settings, "FIREBASE_REVOCATION_TTL_SECONDS", 0)
+    token = _token()
+    _verify(token)
+    users.valid_after_ms = int(time.time() * 1000)
+    with pytest.raises(HTTPException) as exc:
+        _verify(token)
+    assert exc.value.detail == "SESSION_TERMINATED"
+    assert users.calls == 2
@@ -0,0 +1,178 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.services import grammar_service, resilience
+from app.services.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, LatencyTracker, hedged
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def _breaker(**kw):
+    opts = dict(failure_rate=0.5, slow_call_seconds=1.0, min_calls=4, window=10, open_seconds=30)
+    opts.update(kw)
+    return CircuitBreaker("test", **opts)
+
+
+# ---------------- CircuitBreaker ----------------
+
+def test_breaker_needs_min_calls_before_opening(clock):
+    b = _breaker()
+    for _ in range(3):
+        b.record(False, 0.1)
+    assert b.state == CLOSED
+    b.record(False, 0.1)
+    assert b.state == OPEN
+
+
+def test_slow_calls_count_as_failures(clock):
+    b = _breaker()
+    for _ in range(4):
+        b.record(True, 2.0)
+    assert b.state == OPEN
+
+
+def test_open_breaker_fails_fast_then_lets_one_trial_through(clock):
+    b = _breaker()
+    for _ in range(4):
+        b.record(False, 0.1)
+    assert not b.allow()
+    clock[0] += 30
+    assert b.allow() and b.state == HALF_OPEN
+    assert not b.allow()  # only one trial at a time
+    b.record(True, 0.1)
+    assert b.state == CLOSED
+    assert b.stats()["transitions"] == {"closed->open": 1, "open->half_open": 1, "half_open->closed": 1}
+
+
+def test_failed_trial_reopens(clock):
+    b = _breaker()
+    for _ in range(4):
+        b.record(False, 0.1)
+    clock[0] += 30
+    assert b.allow()
+    b.record(False, 0.1)
+    assert b.state == OPEN
+    clock[0] += 29
+    assert not b.allow()
+
+
+def test_latency_tracker_percentiles():
+    t = LatencyTracker(size=100)
+    assert t.percentile(95) is None
+    for ms in range(1, 101):
+        t.add(ms / 1000)
+    assert t.percentile(50) == pytest.approx(0.050, abs=0.001)
+    assert t.percentile(95) == pytest.approx(0.095, abs=0.001)
+
+
+# ---------------- hedged() ----------------
+
+def _ok(r):
+    return "error" not in r
+
+
+def test_fast_call_is_not_hedged():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return {"edits": []}
+
+    result, was_hedged = asyncio.run(hedged(call, 0.05, _ok))
+    assert result == {"edits": []} and not was_hedged and len(calls) == 1
+
+
+def test_slow_call_is_hedged_and_the_faster_answer_wins():
+    delays = iter([1.0, 0.01])
+
+    async def call():
+        d = next(delays)
+        await asyncio.sleep(d)
+        return {"edits": [], "delay": d}
+
+    async def main():
+        start = time.monotonic()
+        out = await hedged(call, 0.02, _ok)
+        return out, time.monotonic() - start
+
+    (result, was_hedged), elapsed = asyncio.run(main())
+    assert was_hedged and result["delay"] == 0.01
+    assert elapsed < 0.5
+
+
+def test_hedge_skips_an_error_and_waits_for_a_success():
+    results = iter([(0.05, {"edits": []}), (0.0, {"error": "boom"})])
+
+    async def call():
+        d, r = next(results)
+        await asyncio.sleep(d)
+        return r
+
+    result, was_hedged = asyncio.run(hedged(call, 0.01, _ok))
+    assert was_hedged and result == {"edits": []}
+
+
+# ---------------- budget in grammar_service ----------------
+
+class _SlowBackend:
+    name = "fake"
+    version = "1"
+
+    def __init__(self, delay, result=None):
+        self.delay = delay
+        self.result = result or {"edits": []}
+
+    async def check(self, sentence, low_priority=False):
+        await asyncio.sleep(self.delay)
+        return self.result
+
+
+@pytest.fixture
+def guarded(monkeypatch):
+    def install(backend, **breaker_kw):
+        monkeypatch.setattr(grammar_service, "_backend", backend)
+        monkeypatch.setattr(grammar_service, "_breaker", _breaker(**breaker_kw))
+        monkeypatch.setattr(grammar_service, "_latency", LatencyTracker())
+        monkeypatch.setattr(settings, "T5_HEDGE_ENABLED", False)
+        return grammar_service._backend_guarded
+    return install
+
+
+def test_budget_bounds_a_slow_backend(guarded, monkeypatch):
+    monkeypatch.setattr(settings, "GRAMMAR_BUDGET_SECONDS", 0.05)
+    call = guarded(_SlowBackend(1.0))
+
+    async def main():
+        start = time.monotonic()
+        out = await call("x")
+        return out, time.monotonic() - start
+
+    out, elapsed = asyncio.run(main())
+    assert out == grammar_service.DEGRADED_RESULT
+    assert elapsed < 0.5
+    assert grammar_service._breaker.stats()["window_bad"] == 1
+
+
+def test_open_breaker_short_circuits_without_calling_the_backend(guarded):
+    backend = _SlowBackend(0.0)
+    call = guarded(backend, min_calls=1)
+    grammar_service._breaker.record(False, 0.1)
+    backend.check = None  # would blow up if called
+    assert asyncio.run(call("x")) == grammar_service.DEGRADED_RESULT
+    assert grammar_service._breaker.rejected == 1
+
+
+def test_successful_call_records_latency(guarded):
+    call = guarded(_SlowBackend(0.0))
+    assert asyncio.run(call("x")) == {"edits": []}
+    assert len(grammar_service._latency) == 1
+    assert grammar_service._breaker.stats()["window_bad"] == 0